@@ -0,0 +1,305 @@
+"""
+Offline benchmark of the agent loop.
+
+Runs the real ReActAgent against a simulated device (recorded or synthetic
+Portal dumps served with a configurable ADB latency, see simulation.py) and
+a scripted LLM, and reports where the time of a step goes: ADB calls,
+parsing, prompt building, waiting for the LLM, sleeps, and everything else.
+It also reports the cost per call of get_clickables, _create_user_prompt
+and execute_tool, so regressions in them show up without a phone or an API
+key.
+
+Usage:
+    python benchmarks/bench_agent_loop.py                         # synthetic screens
+    python benchmarks/bench_agent_loop.py --dumps dumps/          # recorded Portal dumps
+    python benchmarks/bench_agent_loop.py --no-latency --save-baseline loop.json
+    python benchmarks/bench_agent_loop.py --no-latency --baseline loop.json --tolerance 0.3
+
+Recorded dumps are read as in bench_flatten.py and replayed in file name
+order; a PNG next to a dump (same name) is served as its screenshot. By
+default the LLM reads each screen and taps its first tappable element, then
+completes on the last screen; --responses replays a JSON list of responses
+instead. Exits with status 1 if a timing exceeds the baseline by more than
+the tolerance.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_flatten import load_dumps, synthetic_dump  # noqa: E402
+from simulation import DEFAULT_LATENCY_MS, ScriptedProvider, SimulatedADB, load_screenshots, tap_script  # noqa: E402
+
+from droidrun.adb import DeviceManager, set_shared_device_manager  # noqa: E402
+from droidrun.agent import react_agent  # noqa: E402
+from droidrun.agent.llm_reasoning import LLMReasoner  # noqa: E402
+from droidrun.agent.react_agent import ReActAgent  # noqa: E402
+from droidrun.tools import actions, portal  # noqa: E402
+
+# Time categories of a step, in report order ("other" is the remainder)
+CATEGORIES = ["adb", "parsing", "prompt", "llm", "sleep", "other"]
+
+# Functions timed as parsing and prompt building: (owner, attribute, category)
+TIMED_FUNCTIONS = [
+    (portal.PortalBackend, "_parse_payload", "parsing"),
+    (actions, "flatten_ui_tree", "parsing"),
+    (react_agent, "encode_elements", "parsing"),
+    (react_agent, "diff_screens", "parsing"),
+    (react_agent, "encode_diff", "parsing"),
+    (LLMReasoner, "_parse_response", "parsing"),
+    (LLMReasoner, "_create_system_prompt", "prompt"),
+    (LLMReasoner, "_create_user_prompt", "prompt"),
+]
+
+# Functions whose cost per call is reported and checked against the baseline
+HOT_FUNCTIONS = [
+    (react_agent, "get_clickables"),
+    (LLMReasoner, "_create_user_prompt"),
+    (ReActAgent, "execute_tool"),
+]
+
+def _wrap(function: Callable, record: Callable[[float], None]) -> Callable:
+    """Wrap a sync or async function so that record gets the duration of each call."""
+    if inspect.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def timed_async(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                record(time.perf_counter() - start)
+        return timed_async
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(time.perf_counter() - start)
+    return timed
+
+class Instruments:
+    """Time spent per category and per hot function while patched in."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {category: 0.0 for category in CATEGORIES}
+        self.calls: Dict[str, List[float]] = {name: [] for _, name in HOT_FUNCTIONS}
+
+    def add(self, category: str) -> Callable[[float], None]:
+        def record(seconds: float) -> None:
+            self.seconds[category] += seconds
+        return record
+
+    @contextlib.contextmanager
+    def patched(self) -> Iterator[None]:
+        """Patch the timed functions and asyncio.sleep, and restore them afterwards."""
+        patches: List[Tuple[Any, str, Any]] = []
+
+        def patch(owner: Any, name: str, record: Callable[[float], None]) -> None:
+            original = owner.__dict__[name] if isinstance(owner, type) else getattr(owner, name)
+            if isinstance(original, staticmethod):
+                replacement = staticmethod(_wrap(original.__func__, record))
+            else:
+                replacement = _wrap(original, record)
+            patches.append((owner, name, original))
+            setattr(owner, name, replacement)
+
+        for owner, name, category in TIMED_FUNCTIONS:
+            patch(owner, name, self.add(category))
+        for owner, name in HOT_FUNCTIONS:
+            patch(owner, name, self.calls[name].append)
+        patch(asyncio, "sleep", self.add("sleep"))
+        try:
+            yield
+        finally:
+            for owner, name, original in reversed(patches):
+                setattr(owner, name, original)
+
+async def run_once(
+    adb: SimulatedADB,
+    goal: str,
+    max_steps: int,
+    instruments: Instruments
+) -> Dict[str, Any]:
+    """Run the agent once against the simulated device from its first screen."""
+    adb.reset()
+    llm = LLMReasoner(llm_provider="scripted", temperature=0.0)
+    start = time.perf_counter()
+    with instruments.patched():
+        # Created while patched, so that its tool table uses the timed get_clickables
+        agent = ReActAgent(
+            task=goal,
+            llm=llm,
+            device_serial=adb.serial,
+            max_steps=max_steps,
+            print_report=False
+        )
+        await agent.run()
+    elapsed = time.perf_counter() - start
+
+    instruments.seconds["adb"] += adb.busy_s
+    instruments.seconds["llm"] += llm.provider.wait_s
+    return {
+        "seconds": elapsed,
+        "steps": len(agent.step_times),
+        "goal_achieved": agent.goal_achieved,
+        "adb_calls": dict(adb.calls),
+    }
+
+def summarize(runs: List[Dict[str, Any]], instruments: Instruments) -> Dict[str, Any]:
+    """Get the mean time per step by category and the mean time per hot function call."""
+    steps = sum(run["steps"] for run in runs) or 1
+    total = sum(run["seconds"] for run in runs)
+    seconds = dict(instruments.seconds)
+    seconds["other"] = max(0.0, total - sum(value for category, value in seconds.items() if category != "other"))
+    return {
+        "runs": len(runs),
+        "steps_per_run": steps / len(runs),
+        "goal_achieved": all(run["goal_achieved"] for run in runs),
+        "step_ms": total * 1000 / steps,
+        "breakdown_ms": {category: seconds[category] * 1000 / steps for category in CATEGORIES},
+        "functions": {
+            name: {
+                "calls": len(durations),
+                "mean_ms": sum(durations) * 1000 / len(durations) if durations else 0.0,
+            }
+            for name, durations in instruments.calls.items()
+        },
+        "adb_calls_per_run": {
+            kind: sum(run["adb_calls"][kind] for run in runs) / len(runs) for kind in runs[0]["adb_calls"]
+        },
+    }
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """List the timings that exceed the baseline by more than the tolerance."""
+    current = {f"step.{name}": value for name, value in summary["breakdown_ms"].items()}
+    current.update({f"call.{name}": stats["mean_ms"] for name, stats in summary["functions"].items()})
+    previous = {f"step.{name}": value for name, value in baseline["breakdown_ms"].items()}
+    previous.update({f"call.{name}": stats["mean_ms"] for name, stats in baseline["functions"].items()})
+
+    regressions = []
+    for name, value in current.items():
+        reference = previous.get(name)
+        if reference is None:
+            continue
+        if value > reference * (1 + tolerance) and value - reference > min_delta_ms:
+            regressions.append(f"{name}: {value:.2f} ms (baseline {reference:.2f} ms)")
+    return regressions
+
+def input_signature(data: Any) -> str:
+    """Hash benchmark inputs (screens or LLM responses) so that equal inputs compare equal."""
+    payload = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dumps", help="Directory of recorded Portal JSON dumps, one per screen")
+    parser.add_argument("--screens", type=int, default=4, help="Number of synthetic screens")
+    parser.add_argument("--rows", type=int, default=30, help="Rows per synthetic screen")
+    parser.add_argument("--responses", help="JSON file with the list of LLM responses to replay")
+    parser.add_argument("--goal", default="Open the last screen", help="Goal given to the agent")
+    parser.add_argument("--steps", type=int, default=30, help="Maximum steps per run")
+    parser.add_argument("--runs", type=int, default=3, help="Number of runs")
+    parser.add_argument("--no-latency", action="store_true", help="Simulate ADB and LLM calls without latency")
+    parser.add_argument("--adb-latency-ms", type=float, default=DEFAULT_LATENCY_MS["shell"])
+    parser.add_argument("--dump-latency-ms", type=float, default=DEFAULT_LATENCY_MS["ui_dump"])
+    parser.add_argument("--screencap-latency-ms", type=float, default=DEFAULT_LATENCY_MS["screencap"])
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--json", action="store_true", help="Print one JSON line instead of a table")
+    parser.add_argument("--save-baseline", help="Write the results to this file")
+    parser.add_argument("--baseline", help="Compare against results written with --save-baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown against the baseline (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    # The agent configures INFO logging otherwise, which would be timed too
+    logging.basicConfig(level=logging.WARNING)
+
+    if args.dumps:
+        dumps = load_dumps(args.dumps)
+        names = sorted(dumps)
+        screens = [dumps[name] for name in names]
+        screenshots = load_screenshots(args.dumps, names)
+    else:
+        screens = [synthetic_dump(args.rows, seed=seed) for seed in range(args.screens)]
+        screenshots = None
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as f:
+            responses = json.load(f)
+    else:
+        responses = tap_script(screens)
+
+    latency_ms = {
+        "shell": args.adb_latency_ms,
+        "ui_dump": args.dump_latency_ms,
+        "screencap": args.screencap_latency_ms,
+    }
+    llm_latency_ms = args.llm_latency_ms
+    if args.no_latency:
+        latency_ms = {kind: 0.0 for kind in latency_ms}
+        llm_latency_ms = 0.0
+    # Signatures of the inputs, so that a baseline is only compared with the same run
+    config = {
+        "screens": input_signature(screens),
+        "responses": input_signature(responses),
+        "latency_ms": latency_ms,
+        "llm_latency_ms": llm_latency_ms,
+    }
+
+    adb = SimulatedADB(screens, screenshots, latency_ms=latency_ms)
+    set_shared_device_manager(DeviceManager(adb=adb))
+    ScriptedProvider.configure(responses, llm_latency_ms)
+
+    instruments = Instruments()
+    runs = [
+        asyncio.run(run_once(adb, args.goal, args.steps, instruments))
+        for _ in range(max(1, args.runs))
+    ]
+    summary = {"config": config, **summarize(runs, instruments)}
+
+    if args.json:
+        print(json.dumps({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), **summary}))
+    else:
+        print(f"{summary['runs']} runs of {summary['steps_per_run']:.1f} steps over {len(screens)} screens"
+              f" (goal {'achieved' if summary['goal_achieved'] else 'NOT achieved'})")
+        print(f"{'time per step':<32}{summary['step_ms']:>10.2f} ms")
+        for category, value in summary["breakdown_ms"].items():
+            share = value / summary["step_ms"] * 100 if summary["step_ms"] else 0.0
+            print(f"  {category:<30}{value:>10.2f} ms {share:>5.1f}%")
+        print("Per call:")
+        for name, stats in summary["functions"].items():
+            print(f"  {name:<30}{stats['mean_ms']:>10.2f} ms ({stats['calls']} calls)")
+        calls = ", ".join(f"{kind} {count:.0f}" for kind, count in summary["adb_calls_per_run"].items())
+        print(f"ADB calls per run: {calls}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+    failed = not summary["goal_achieved"]
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("Baseline was recorded with other screens, responses or latencies", file=sys.stderr)
+            sys.exit(1)
+        regressions = compare(summary, baseline, args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Microbenchmark for the get_clickables flattening and summary stage.
+
+Compares the single-pass flatten_ui_tree() with the previous nested-scan
+implementation on Portal JSON dumps.
+
+Usage:
+    python benchmarks/bench_flatten.py                   # synthetic dense screens
+    python benchmarks/bench_flatten.py --dumps dumps/    # recorded Portal dumps (*.json)
+
+Recorded dumps are the raw JSON returned by the Portal, i.e. the first
+element of droidrun.tools.portal.fetch_ui_data(device), one file per screen.
+"""
+
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import timeit
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from droidrun.tools.ui_tree import flatten_ui_tree  # noqa: E402
+
+CLASS_NAMES = [
+    "android.widget.TextView",
+    "android.widget.ImageView",
+    "android.widget.Button",
+    "android.widget.LinearLayout",
+    "androidx.recyclerview.widget.RecyclerView",
+]
+
+def synthetic_dump(rows: int, children_per_row: int = 4, seed: int = 0) -> List[Dict[str, Any]]:
+    """Build a feed-like screen: clickable rows, each with text and nested children."""
+    rng = random.Random(seed)
+    next_index = 0
+
+    def new_index() -> int:
+        nonlocal next_index
+        next_index += 1
+        return next_index
+
+    dump = []
+    for row in range(rows):
+        top = row * 120
+        children = []
+        for _ in range(children_per_row):
+            child = {
+                "index": new_index(),
+                "type": rng.choice(["text", "text", "clickable"]),
+                "text": f"Item {row} label {rng.randint(0, 9999)}",
+                "className": rng.choice(CLASS_NAMES),
+                "bounds": f"0,{top},1080,{top + 120}",
+                "children": [
+                    {
+                        "index": new_index(),
+                        "type": "text",
+                        "text": f"Detail {rng.randint(0, 9999)}",
+                        "className": "android.widget.TextView",
+                        "bounds": "",
+                    }
+                ],
+            }
+            children.append(child)
+        dump.append({
+            "index": new_index(),
+            "type": "clickable",
+            "text": "",
+            "className": "android.widget.LinearLayout",
+            "bounds": f"0,{top},1080,{top + 120}",
+            "children": children,
+        })
+    return dump
+
+def legacy_flatten(ui_data: Any) -> Dict[str, Any]:
+    """The flattening and summary code get_clickables used before flatten_ui_tree()."""
+    flattened_elements = []
+    if isinstance(ui_data, list):
+        for parent in ui_data:
+            if parent.get('type') == 'clickable' and parent.get('index', -1) != -1:
+                parent_copy = {k: v for k, v in parent.items() if k != 'children'}
+                parent_copy['isParent'] = True
+                flattened_elements.append(parent_copy)
+            for child in parent.get('children', []):
+                if child.get('index', -1) != -1:
+                    child_copy = child.copy()
+                    child_copy['isParent'] = False
+                    child_copy['parentIndex'] = parent.get('index')
+                    flattened_elements.append(child_copy)
+                    for nested_child in child.get('children', []):
+                        if nested_child.get('index', -1) != -1:
+                            nested_copy = nested_child.copy()
+                            nested_copy['isParent'] = False
+                            nested_copy['parentIndex'] = child.get('index')
+                            nested_copy['grandparentIndex'] = parent.get('index')
+                            flattened_elements.append(nested_copy)
+    flattened_elements.sort(key=lambda x: x.get('index', 0))
+
+    text_summary = []
+    parent_texts = {}
+    tappable_elements = []
+    for elem in flattened_elements:
+        if elem.get('bounds') and (elem.get('type') == 'clickable' or elem.get('isParent')):
+            tappable_elements.append(elem.get('index'))
+        if elem.get('type') == 'text' and elem.get('text'):
+            parent_id = elem.get('parentIndex')
+            if parent_id is not None:
+                parent_texts.setdefault(parent_id, []).append(elem.get('text'))
+    for parent_id, texts in parent_texts.items():
+        parent = None
+        for elem in flattened_elements:
+            if elem.get('index') == parent_id:
+                parent = elem
+                break
+        if parent:
+            tappable_marker = "🔘" if parent_id in tappable_elements else "📄"
+            text_summary.append(
+                f"{tappable_marker} Element {parent_id} ({parent.get('className', 'Unknown')}): " + " | ".join(texts)
+            )
+    text_summary.sort()
+    return {"elements": flattened_elements, "text_summary": text_summary}
+
+def load_dumps(directory: str) -> Dict[str, Any]:
+    """Load recorded Portal dumps from a directory."""
+    dumps = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            dumps[os.path.basename(path)] = json.load(f)
+    return dumps
+
+def count_nodes(ui_data: Any) -> int:
+    """Count nodes in a dump, at any depth."""
+    if isinstance(ui_data, dict):
+        return len(ui_data.get("clickable_elements", []))
+    total = 0
+    stack = list(ui_data)
+    while stack:
+        node = stack.pop()
+        total += 1
+        stack.extend(node.get("children", []))
+    return total
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dumps", help="Directory with recorded Portal JSON dumps")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    if args.dumps:
+        dumps = load_dumps(args.dumps)
+        if not dumps:
+            parser.error(f"No *.json dumps found in {args.dumps}")
+    else:
+        dumps = {f"synthetic_{rows}_rows": synthetic_dump(rows) for rows in (10, 50, 200, 500)}
+
+    print(f"{'dump':<28}{'nodes':>8}{'legacy ms':>12}{'single-pass ms':>16}{'speedup':>10}")
+    for name, ui_data in dumps.items():
+        number = max(1, 2000 // max(1, count_nodes(ui_data)))
+        legacy = min(timeit.repeat(lambda: legacy_flatten(ui_data), number=number, repeat=args.repeat)) / number
+        current = min(timeit.repeat(lambda: flatten_ui_tree(ui_data), number=number, repeat=args.repeat)) / number
+        print(
+            f"{name:<28}{count_nodes(ui_data):>8}{legacy * 1000:>12.3f}"
+            f"{current * 1000:>16.3f}{legacy / current:>9.1f}x"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Import-time benchmark for CLI startup.
+
+The GUI launches the CLI for every device listing and task, so the time
+`droidrun devices` spends importing modules is paid again and again. This
+runs `python -X importtime` on the modules a command loads, reports the
+total and the slowest imports, and checks that the LLM SDKs and other heavy
+packages are not loaded.
+
+Usage:
+    python benchmarks/bench_import.py                      # droidrun devices
+    python benchmarks/bench_import.py --module droidrun.agent --allow-heavy
+    python benchmarks/bench_import.py --max-ms 300 --json >> import_times.jsonl
+
+Exits with status 1 if a forbidden package is imported or the import takes longer
+than --max-ms, so it can guard CLI startup in CI.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Modules imported by `droidrun devices` (its command body only adds droidrun.adb)
+DEVICES_MODULES = ["droidrun.cli.main"]
+
+# Heavy packages (LLM SDKs, tokenizer, image libraries) quick commands must not import
+FORBIDDEN_PACKAGES = ["openai", "anthropic", "tiktoken", "numpy", "PIL"]
+
+_MARKER = "-- droidrun import benchmark --"
+
+def measure(modules: List[str]) -> Tuple[float, List[Tuple[str, int, int, int]]]:
+    """Import modules in a fresh interpreter with -X importtime.
+
+    Returns:
+        Wall time of the process in ms, and (module, self_us, cumulative_us,
+        depth) for every module imported after the interpreter started
+    """
+    code = f"import sys; sys.stderr.write({_MARKER!r} + '\\n'); " + "; ".join(f"import {name}" for name in modules)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, env=env, cwd=ROOT,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    imports = []
+    lines = process.stderr.splitlines()
+    for line in lines[lines.index(_MARKER) + 1:]:
+        if not line.startswith("import time:"):
+            continue
+        head, cumulative_us, name = line.split("|", 2)
+        self_us = head[len("import time:"):].strip()
+        if not self_us.isdigit():
+            continue  # Column headers
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return wall_ms, imports
+
+def summarize(runs: List[Tuple[float, List[Tuple[str, int, int, int]]]]) -> Dict[str, object]:
+    """Get the fastest run's totals and its slowest top-level imports."""
+    wall_ms, imports = min(runs, key=lambda run: sum(item[2] for item in run[1] if item[3] == 0))
+    top_level = [item for item in imports if item[3] == 0]
+    return {
+        "import_ms": sum(item[2] for item in top_level) / 1000,
+        "process_ms": wall_ms,
+        "modules": len(imports),
+        "slowest": sorted(top_level, key=lambda item: -item[2])[:10],
+        "loaded": {item[0] for item in imports},
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to import (repeat; default: what `droidrun devices` loads)")
+    parser.add_argument("--runs", type=int, default=5, help="Number of runs; the fastest is reported")
+    parser.add_argument("--max-ms", type=float, default=None, help="Fail if importing takes longer than this")
+    parser.add_argument("--allow-heavy", action="store_true", help="Do not fail when a forbidden package is imported")
+    parser.add_argument("--json", action="store_true", help="Print one JSON line instead of a table")
+    args = parser.parse_args()
+
+    modules = args.module or DEVICES_MODULES
+    summary = summarize([measure(modules) for _ in range(max(1, args.runs))])
+    baseline_ms = min(measure([])[0] for _ in range(max(1, args.runs)))
+    forbidden = sorted(
+        package for package in FORBIDDEN_PACKAGES
+        if any(name == package or name.startswith(package + ".") for name in summary["loaded"])
+    )
+
+    if args.json:
+        print(json.dumps({
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "modules": modules,
+            "import_ms": round(summary["import_ms"], 1),
+            "process_ms": round(summary["process_ms"], 1),
+            "interpreter_ms": round(baseline_ms, 1),
+            "imported_modules": summary["modules"],
+            "forbidden": forbidden,
+        }))
+    else:
+        print(f"Importing {', '.join(modules)} (fastest of {args.runs} runs)")
+        print(f"{'import time':<32}{summary['import_ms']:>10.1f} ms ({summary['modules']} modules)")
+        print(f"{'process time':<32}{summary['process_ms']:>10.1f} ms")
+        print(f"{'bare interpreter':<32}{baseline_ms:>10.1f} ms")
+        print("Slowest top-level imports:")
+        for name, _, cumulative_us, _ in summary["slowest"]:
+            print(f"  {name:<30}{cumulative_us / 1000:>10.1f} ms")
+        print(f"Forbidden packages imported: {', '.join(forbidden) if forbidden else 'none'}")
+
+    failed = bool(forbidden) and not args.allow_heavy
+    if args.max_ms is not None and summary["import_ms"] > args.max_ms:
+        print(f"Import time {summary['import_ms']:.1f} ms exceeds {args.max_ms:.1f} ms", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Tokens-per-screen benchmark for the get_clickables observation.
+
+Compares the size of the observation the LLM used to receive (the repr of
+the clickable element list) with the compact outline from encode_elements().
+
+Usage:
+    python benchmarks/bench_ui_encoder.py                   # synthetic dense screens
+    python benchmarks/bench_ui_encoder.py --dumps dumps/    # recorded Portal dumps (*.json)
+    python benchmarks/bench_ui_encoder.py --provider anthropic --show
+
+Token counts use droidrun's per-provider TokenCounter (tiktoken for OpenAI
+models when available, otherwise the calibrated heuristic).
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_flatten import load_dumps, synthetic_dump  # noqa: E402
+from droidrun.agent.tokens import get_token_counter  # noqa: E402
+from droidrun.tools.ui_encoder import encode_elements  # noqa: E402
+from droidrun.tools.ui_tree import flatten_ui_tree  # noqa: E402
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dumps", help="Directory with recorded Portal JSON dumps")
+    parser.add_argument("--provider", default="openai", help="Provider whose token counter is used")
+    parser.add_argument("--model", default=None, help="Model name for the token counter")
+    parser.add_argument("--show", action="store_true", help="Print the encoded outline of the first screen")
+    args = parser.parse_args()
+
+    if args.dumps:
+        dumps = load_dumps(args.dumps)
+        if not dumps:
+            parser.error(f"No *.json dumps found in {args.dumps}")
+    else:
+        dumps = {f"synthetic_{rows}_rows": synthetic_dump(rows) for rows in (10, 50, 200)}
+
+    counter = get_token_counter(args.provider, args.model)
+    print(f"Token counter: {args.provider} ({counter.name})")
+    print(f"{'dump':<28}{'elements':>10}{'repr tokens':>13}{'encoded tokens':>16}{'ratio':>8}")
+
+    total_repr = total_encoded = 0
+    for position, (name, ui_data) in enumerate(dumps.items()):
+        tree = flatten_ui_tree(ui_data)
+        encoded = encode_elements(tree["elements"], tree["tappable_indices"])
+        if args.show and position == 0:
+            print(encoded)
+        repr_tokens = counter.count(str(tree["elements"]))
+        encoded_tokens = counter.count(encoded)
+        total_repr += repr_tokens
+        total_encoded += encoded_tokens
+        print(
+            f"{name:<28}{len(tree['elements']):>10}{repr_tokens:>13}"
+            f"{encoded_tokens:>16}{repr_tokens / max(1, encoded_tokens):>7.1f}x"
+        )
+
+    screens = len(dumps)
+    print(f"{'tokens per screen (mean)':<38}{total_repr / screens:>13.0f}{total_encoded / screens:>16.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Simulated device and scripted LLM for offline agent benchmarks.
+
+SimulatedADB stands in for the ADB wrapper: it answers the shell and
+exec-out calls the agent makes from recorded Portal dumps and screenshots,
+with a configurable latency per kind of call, and moves to the next screen
+after every tap, swipe, key press or app start. ScriptedProvider is an
+LLMProvider that replays canned responses instead of calling an API.
+Together they run the real agent loop without a phone or an API key.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+from asyncio import sleep as _sleep  # Not affected when benchmarks time asyncio.sleep
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from droidrun.adb import ADBWrapper
+from droidrun.agent.llm_provider import LLMProvider
+from droidrun.agent.providers import register_provider
+
+# Default simulated latency per kind of ADB call in milliseconds
+DEFAULT_LATENCY_MS = {
+    "shell": 15.0,       # input, getprop, pm, dumpsys, screencap | md5sum
+    "ui_dump": 120.0,    # Portal content provider query
+    "screencap": 150.0,  # screencap -p over exec-out
+}
+
+# Shell commands that lead to the next recorded screen
+SCREEN_CHANGING_COMMANDS = ("input tap", "input swipe", "input keyevent", "am start", "monkey ")
+
+def placeholder_png(width: int = 108, height: int = 240) -> bytes:
+    """Build a small grey PNG used when a screen has no recorded screenshot."""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    rows = b"".join(b"\x00" + b"\x80" * width for _ in range(height))
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(rows))
+        + chunk(b"IEND", b"")
+    )
+
+class SimulatedADB(ADBWrapper):
+    """ADB wrapper that serves recorded screens instead of talking to a device."""
+
+    def __init__(
+        self,
+        screens: Sequence[Any],
+        screenshots: Optional[Sequence[Optional[bytes]]] = None,
+        serial: str = "sim-0001",
+        latency_ms: Optional[Dict[str, float]] = None,
+        properties: Optional[Dict[str, str]] = None
+    ):
+        """Initialize the simulated device.
+
+        Args:
+            screens: Portal JSON dumps, in the order the device shows them
+            screenshots: PNG data per screen (a placeholder where None)
+            serial: Serial the device is listed under
+            latency_ms: Latency per kind of call, see DEFAULT_LATENCY_MS
+            properties: Device properties returned by getprop
+        """
+        super().__init__(transport="subprocess")
+        if not screens:
+            raise ValueError("At least one screen is required")
+        self.serial = serial
+        self.screens = list(screens)
+        self.screenshots = list(screenshots or [])
+        self.latency_ms = {**DEFAULT_LATENCY_MS, **(latency_ms or {})}
+        self.properties = properties or {
+            "ro.product.model": "Simulated",
+            "ro.product.brand": "droidrun",
+            "ro.build.version.release": "14",
+            "ro.build.version.sdk": "34",
+        }
+        self.position = 0
+        self.calls: Dict[str, int] = {kind: 0 for kind in self.latency_ms}
+        self.busy_s = 0.0
+        self.commands: List[str] = []
+
+    def reset(self) -> None:
+        """Go back to the first screen and clear the call statistics."""
+        self.position = 0
+        self.calls = {kind: 0 for kind in self.latency_ms}
+        self.busy_s = 0.0
+        self.commands = []
+
+    async def _call(self, kind: str, command: str) -> None:
+        """Account for one call and wait for its simulated latency."""
+        self.calls[kind] += 1
+        self.commands.append(command)
+        latency = self.latency_ms[kind] / 1000
+        if latency > 0:
+            await _sleep(latency)
+
+    def _screenshot(self) -> bytes:
+        if self.position < len(self.screenshots) and self.screenshots[self.position]:
+            return self.screenshots[self.position]
+        return placeholder_png()
+
+    def _shell_output(self, command: str) -> str:
+        if command.startswith("content query --uri"):
+            return f"Row: 0 result={json.dumps(self.screens[self.position], ensure_ascii=False)}"
+        if command == "screencap | md5sum":
+            return f"{hashlib.md5(str(self.position).encode()).hexdigest()}  -"
+        if command.startswith(SCREEN_CHANGING_COMMANDS):
+            self.position = min(self.position + 1, len(self.screens) - 1)
+            return "Events injected: 1" if command.startswith("monkey ") else ""
+        if command == "getprop":
+            return "\n".join(f"[{key}]: [{value}]" for key, value in self.properties.items())
+        if command.startswith("dumpsys package"):
+            return "    versionCode=1 minSdk=24 targetSdk=34\n    versionName=1.0"
+        return ""
+
+    async def get_devices(self) -> List[Dict[str, str]]:
+        return [{"serial": self.serial, "status": "device"}]
+
+    async def shell(self, serial: str, command: str, timeout: Optional[float] = None) -> str:
+        start = time.perf_counter()
+        await self._call("ui_dump" if command.startswith("content query") else "shell", command)
+        output = self._shell_output(command)
+        self.busy_s += time.perf_counter() - start
+        return output
+
+    async def session_shell(self, serial: str, command: str, timeout: Optional[float] = None) -> str:
+        return await self.shell(serial, command, timeout)
+
+    async def exec_out(self, serial: str, command: str, timeout: Optional[float] = None) -> bytes:
+        start = time.perf_counter()
+        if command.startswith("screencap"):
+            await self._call("screencap", command)
+            output = self._screenshot()
+        else:
+            await self._call("shell", command)
+            output = self._shell_output(command).encode("utf-8")
+        self.busy_s += time.perf_counter() - start
+        return output
+
+    async def _run_device_command(
+        self,
+        serial: str,
+        args: List[str],
+        timeout: Optional[float] = None,
+        check: bool = True
+    ) -> Tuple[str, str]:
+        start = time.perf_counter()
+        await self._call("shell", " ".join(args))
+        self.busy_s += time.perf_counter() - start
+        return "", ""
+
+    async def close_sessions(self, serial: Optional[str] = None) -> None:
+        pass
+
+class ScriptedProvider(LLMProvider):
+    """LLM provider that replays canned responses.
+
+    Set the class attributes before creating reasoners (see configure); every
+    provider instance starts from the first response and repeats the last
+    one once the script is exhausted.
+    """
+
+    responses: List[str] = []
+    latency_ms: float = 0.0
+
+    @classmethod
+    def configure(cls, responses: Sequence[Any], latency_ms: float = 0.0) -> None:
+        """Set the responses to replay (strings or JSON-serializable objects)."""
+        cls.responses = [item if isinstance(item, str) else json.dumps(item, ensure_ascii=False) for item in responses]
+        cls.latency_ms = latency_ms
+
+    def _initialize_client(self) -> None:
+        self.model_name = self.model_name or "scripted"
+        self.position = 0
+        self.wait_s = 0.0
+
+    async def generate_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> str:
+        if not self.responses:
+            raise ValueError("ScriptedProvider has no responses, call ScriptedProvider.configure first")
+        start = time.perf_counter()
+        if self.latency_ms > 0:
+            await _sleep(self.latency_ms / 1000)
+        response = self.responses[min(self.position, len(self.responses) - 1)]
+        self.position += 1
+        # No usage is reported, so token counters are not recalibrated between runs
+        self.update_token_usage(0, 0)
+        self.wait_s += time.perf_counter() - start
+        return response
+
+register_provider("scripted", ScriptedProvider, default_model="scripted")
+
+def tap_script(screens: Sequence[Any], goal_result: str = "Done") -> List[Dict[str, Any]]:
+    """Build responses that read each screen and tap its first tappable element.
+
+    The last screen is read and the task completed.
+    """
+    from droidrun.tools.ui_tree import flatten_ui_tree
+
+    responses = []
+    for position, screen in enumerate(screens):
+        responses.append({
+            "thought": f"I need to see screen {position + 1}.",
+            "action": "get_clickables",
+            "parameters": {},
+        })
+        if position == len(screens) - 1:
+            break
+        tappable = flatten_ui_tree(screen)["tappable_indices"]
+        if not tappable:
+            raise ValueError(f"Screen {position + 1} has no tappable element to move on")
+        responses.append({
+            "thought": f"Element {tappable[0]} leads to the next screen.",
+            "action": "tap",
+            "parameters": {"index": tappable[0]},
+        })
+    responses.append({
+        "thought": "The goal is achieved.",
+        "action": "complete",
+        "parameters": {"result": goal_result},
+    })
+    return responses
+
+def load_screenshots(directory: str, names: Sequence[str]) -> List[Optional[bytes]]:
+    """Load the screenshot recorded next to each dump (same name, .png), if any."""
+    screenshots = []
+    for name in names:
+        path = os.path.join(directory, os.path.splitext(name)[0] + ".png")
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                screenshots.append(f.read())
+        else:
+            screenshots.append(None)
+    return screenshots
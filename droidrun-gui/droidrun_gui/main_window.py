@@ -4,7 +4,8 @@ from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                             QPushButton, QLabel, QTextEdit, QComboBox, 
                             QMessageBox, QProgressBar, QTabWidget, QHBoxLayout,
                             QListWidget, QListWidgetItem, QDialog, QLineEdit,
-                            QFormLayout, QGroupBox, QSplitter, QSpinBox)
+                            QFormLayout, QGroupBox, QSplitter, QSpinBox,
+                            QCheckBox)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt6.QtGui import QIcon, QFont
 import subprocess
@@ -203,6 +204,10 @@ class DroidRunGUI(QMainWindow):
         self.steps_spin.setValue(15)
         steps_layout.addWidget(self.steps_label)
         steps_layout.addWidget(self.steps_spin)
+        # 回放同一任务之前成功的操作序列（默认关闭）
+        self.replay_check = QCheckBox("回放已保存的成功操作")
+        self.replay_check.setChecked(False)
+        steps_layout.addWidget(self.replay_check)
         steps_layout.addStretch()
         task_layout.addLayout(steps_layout)
         
@@ -473,7 +478,8 @@ class DroidRunGUI(QMainWindow):
             task,
             self.model_combo.currentText(),
             self.device_combo.currentText(),
-            steps
+            steps,
+            replay=self.replay_check.isChecked()
         )
         
     def update_progress(self, value):
@@ -1,4 +1,6 @@
 import asyncio
+import http.client
+import json
 import os
 import subprocess
 import sys
@@ -19,15 +21,42 @@ def get_droidrun_cli_path():
         return "droidrun"
 DROIDRUN_CLI_PATH = get_droidrun_cli_path()
 
+# droidrun serve 守护进程的地址，未运行时回退到 CLI 子进程
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = int(os.environ.get("DROIDRUN_SERVE_PORT", "7770"))
+# droidrun serve 默认生成的令牌，仅当前用户可读
+DAEMON_TOKEN_PATH = os.path.expanduser("~/.droidrun/serve_token")
+
+def get_daemon_token():
+    token = os.environ.get("DROIDRUN_SERVE_TOKEN")
+    if token:
+        return token
+    try:
+        with open(DAEMON_TOKEN_PATH, encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def daemon_request(method, path, body=None, timeout=2):
+    conn = http.client.HTTPConnection(DAEMON_HOST, DAEMON_PORT, timeout=timeout)
+    headers = {"Content-Type": "application/json"}
+    token = get_daemon_token()
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    conn.request(method, path, json.dumps(body) if body is not None else None, headers)
+    return conn.getresponse()
+
 class TaskWorker(QThread):
     output_signal = pyqtSignal(str)
     finished_signal = pyqtSignal(bool, str, int)
-    def __init__(self, cmd, env, device_id):
+    def __init__(self, cmd, env, device_id, request=None):
         super().__init__()
         self.cmd = cmd
         self.env = env
         self.device_id = device_id
+        self.request = request
         self.process = None
+        self.daemon_task_id = None
     def run(self):
         # 检查并安装portal apk
         portal_flag_file = os.path.expanduser(f"~/.droidrun-gui/portal_{self.device_id}.flag")
@@ -52,6 +81,8 @@ class TaskWorker(QThread):
                 self.output_signal.emit(f"Portal 安装错误: {str(e)}")
                 self.finished_signal.emit(False, str(e), 0)
                 return
+        if self.request is not None and self.run_with_daemon():
+            return
         self.output_signal.emit(f"执行命令: {' '.join(self.cmd)}")
         try:
             if self.cmd[0] == "droidrun":
@@ -65,7 +96,52 @@ class TaskWorker(QThread):
         except Exception as e:
             self.output_signal.emit(f"错误: {str(e)}")
             self.finished_signal.emit(False, str(e), 0)
+    def run_with_daemon(self):
+        """在 droidrun serve 守护进程中执行任务，守护进程未运行时返回 False"""
+        try:
+            response = daemon_request("POST", "/tasks", self.request)
+        except ConnectionRefusedError:
+            return False
+        except OSError as e:
+            # 请求可能已送达守护进程，回退到 CLI 会重复执行任务
+            self.output_signal.emit(f"提交任务到守护进程失败: {str(e)}")
+            self.finished_signal.emit(False, str(e), 0)
+            return True
+        try:
+            data = json.loads(response.read() or b"{}")
+        except (OSError, ValueError) as e:
+            self.output_signal.emit(f"无法读取守护进程的响应: {str(e)}")
+            self.finished_signal.emit(False, str(e), 0)
+            return True
+        if response.status != 202:
+            error = data.get("error", f"HTTP {response.status}")
+            self.output_signal.emit(f"守护进程拒绝任务: {error}")
+            self.finished_signal.emit(False, error, 0)
+            return True
+        self.daemon_task_id = data["id"]
+        self.output_signal.emit(f"已提交到守护进程: 任务 {data['id']}，设备 {data['serial']}")
+        status = "failed"
+        try:
+            response = daemon_request("GET", f"/tasks/{self.daemon_task_id}/events", timeout=None)
+            for line in response:
+                event = json.loads(line)
+                if event["event"] == "step":
+                    self.output_signal.emit(f"[{event['type']}] {event['content']}")
+                elif event["event"] == "finished":
+                    status = event["status"]
+                    if event.get("error"):
+                        self.output_signal.emit(f"错误: {event['error']}")
+        except (OSError, ValueError) as e:
+            self.output_signal.emit(f"与守护进程的连接中断: {str(e)}")
+        self.finished_signal.emit(status == "done", f"守护进程执行完成 ({status})", 0)
+        return True
     def stop(self):
+        if self.daemon_task_id:
+            try:
+                daemon_request("DELETE", f"/tasks/{self.daemon_task_id}").read()
+                self.output_signal.emit("[中断] 已取消守护进程中的任务。")
+            except OSError as e:
+                self.output_signal.emit(f"取消任务失败: {str(e)}")
         if self.process and self.process.poll() is None:
             self.process.terminate()
             self.output_signal.emit("[中断] 已终止子进程。")
@@ -88,7 +164,7 @@ class TaskExecutor(QObject):
         else:
             return "gemini", "gemini-2.0-flash"
 
-    def start_task(self, task_description, model_name, device_id, steps=15):
+    def start_task(self, task_description, model_name, device_id, steps=15, replay=False):
         provider, model = self.get_llm_provider(model_name)
         api_key = self.apikey_manager.get_key(provider)
         env = os.environ.copy()
@@ -102,7 +178,18 @@ class TaskExecutor(QObject):
             "--model", model,
             "--steps", str(steps)
         ]
-        self.worker = TaskWorker(cmd, env, device_id)
+        if replay:
+            cmd.append("--replay")
+        request = {
+            "task": task_description,
+            "device": device_id,
+            "provider": provider,
+            "model": model,
+            "api_key": api_key,
+            "steps": steps,
+            "replay": replay,
+        }
+        self.worker = TaskWorker(cmd, env, device_id, request)
         self.worker.output_signal.connect(self.output_signal.emit)
         self.worker.finished_signal.connect(self.finished_signal.emit)
         self.worker.start() 
\ No newline at end of file
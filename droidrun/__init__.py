@@ -4,13 +4,23 @@ DroidRun - A framework for controlling Android devices through LLM agents.
 
 __version__ = "0.1.0"
 
-# Import main classes for easier access
-from droidrun.agent.react_agent import ReActAgent as Agent
-from droidrun.agent.react_agent import ReActStep, ReActStepType
+# Main classes for easier access, imported on first use so that the CLI
+# starts without loading the agent
+_EXPORTS = {
+    "Agent": "ReActAgent",
+    "ReActStep": "ReActStep",
+    "ReActStepType": "ReActStepType",
+}
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        from droidrun.agent import react_agent
+        return getattr(react_agent, _EXPORTS[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Make main components available at package level
 __all__ = [
     "Agent",
     "ReActStep",
     "ReActStepType"
-] 
\ No newline at end of file
+] 
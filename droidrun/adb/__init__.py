@@ -3,11 +3,14 @@ ADB Package - Android Debug Bridge functionality.
 """
 
 from .device import Device
-from .manager import DeviceManager
-from .wrapper import ADBWrapper
+from .manager import DeviceManager, get_shared_device_manager, set_shared_device_manager
+from .wrapper import ADBWrapper, ADBServerClient
 
 __all__ = [
     'Device',
     'DeviceManager',
+    'get_shared_device_manager',
+    'set_shared_device_manager',
     'ADBWrapper',
+    'ADBServerClient',
 ] 
\ No newline at end of file
@@ -2,13 +2,20 @@
 Device - High-level representation of an Android device.
 """
 
+import io
 import os
+import asyncio
+import logging
 import tempfile
 import time
 import random
 import string
-from typing import Dict, Optional, Tuple, List
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, List
 from .wrapper import ADBWrapper
+from .screencap import decode_raw_frame, downscale, parse_raw_screencap, png_dimensions
+
+# Set up logger
+logger = logging.getLogger("droidrun")
 
 class Device:
     """High-level representation of an Android device."""
@@ -23,6 +30,7 @@ class Device:
         self._serial = serial
         self._adb = adb
         self._properties_cache: Dict[str, str] = {}
+        self.idle_stats: Dict[str, float] = {"waits": 0, "timeouts": 0, "total_ms": 0.0}
 
     @property
     def serial(self) -> str:
@@ -67,7 +75,7 @@ class Device:
             x: X coordinate
             y: Y coordinate
         """
-        await self._adb.shell(self._serial, f"input tap {x} {y}")
+        await self._adb.session_shell(self._serial, f"input tap {x} {y}")
 
     async def swipe(
         self,
@@ -86,7 +94,7 @@ class Device:
             end_y: Ending Y coordinate
             duration_ms: Swipe duration in milliseconds
         """
-        await self._adb.shell(
+        await self._adb.session_shell(
             self._serial,
             f"input swipe {start_x} {start_y} {end_x} {end_y} {duration_ms}"
         )
@@ -105,7 +113,7 @@ class Device:
         Args:
             keycode: Android keycode to press
         """
-        await self._adb.shell(self._serial, f"input keyevent {keycode}")
+        await self._adb.session_shell(self._serial, f"input keyevent {keycode}")
 
     async def start_activity(
         self,
@@ -207,15 +215,197 @@ class Device:
         result = await self._adb.shell(self._serial, " ".join(cmd))
         return result.strip()
         
-    async def take_screenshot(self, quality: int = 75) -> Tuple[str, bytes]:
+    async def capture_screen(self, raw: bool = False) -> Dict[str, Any]:
+        """Capture the screen straight into memory using exec-out.
+        
+        Nothing is written to the device's storage or to the local disk.
+        
+        Args:
+            raw: Capture the raw framebuffer instead of a PNG. Raw captures skip
+                 the PNG encoding on the device, which is usually the slowest
+                 part of a screencap, at the cost of a larger transfer.
+        
+        Returns:
+            Dictionary with:
+            - data: PNG bytes, or the pixel data (header stripped) for raw captures
+            - format: 'png' or 'raw'
+            - width, height: Screen size in pixels
+            - pixel_format, bytes_per_pixel: Layout of raw captures (None for PNG)
+            - timing: Dictionary with 'capture_ms' (device + transfer) and
+              'parse_ms' (header parsing) for this capture
+        """
+        start = time.perf_counter()
+        output = await self._adb.exec_out(self._serial, "screencap" if raw else "screencap -p")
+        captured = time.perf_counter()
+
+        if raw:
+            frame = parse_raw_screencap(output)
+            result = {
+                "data": frame["pixels"],
+                "format": "raw",
+                "width": frame["width"],
+                "height": frame["height"],
+                "pixel_format": frame["pixel_format"],
+                "bytes_per_pixel": frame["bytes_per_pixel"],
+            }
+        else:
+            width, height = png_dimensions(output)
+            result = {
+                "data": output,
+                "format": "png",
+                "width": width,
+                "height": height,
+                "pixel_format": None,
+                "bytes_per_pixel": None,
+            }
+
+        result["timing"] = {
+            "capture_ms": (captured - start) * 1000,
+            "parse_ms": (time.perf_counter() - captured) * 1000,
+            "bytes": len(output),
+        }
+        logger.debug(
+            f"Screen captured in memory ({result['format']}, {result['width']}x{result['height']}, "
+            f"{len(output) / 1024:.1f}KB) in {result['timing']['capture_ms']:.1f}ms"
+        )
+        return result
+
+    async def get_screenshot(
+        self,
+        max_dimension: Optional[int] = None,
+        image_format: str = "JPEG",
+        quality: int = 75,
+        raw: bool = True
+    ) -> Dict[str, Any]:
+        """Capture, downscale and encode a screenshot for the LLM.
+        
+        With NumPy available the raw framebuffer is captured, decoded as an
+        array and downscaled in a vectorized way, so the image is encoded only
+        once (no PNG encode on the device and no PNG decode on the host).
+        Without NumPy the PNG capture is resized and re-encoded with PIL.
+        
+        Args:
+            max_dimension: Maximum size of the longest side (None keeps full size)
+            image_format: Output format, 'JPEG', 'WEBP' or 'PNG'
+            quality: Encoder quality for JPEG/WebP (1-100)
+            raw: Prefer the raw framebuffer capture when NumPy is available
+        
+        Returns:
+            Dictionary with:
+            - data: Encoded image bytes
+            - format: Image format of data
+            - width, height: Size of the returned image
+            - original_width, original_height: Device screen size
+            - scale: Factor applied to the screen size; divide image coordinates
+              by it to get device coordinates
+            - timing: Per-stage timing in milliseconds
+        """
+        image_format = image_format.upper()
+        if image_format == "JPG":
+            image_format = "JPEG"
+        if image_format not in ("JPEG", "WEBP", "PNG"):
+            raise ValueError(f"Unsupported screenshot format: {image_format}")
+
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = None
+
+        use_raw = raw and Image is not None
+        if use_raw:
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                use_raw = False
+
+        capture = await self.capture_screen(raw=use_raw)
+        timing = dict(capture["timing"])
+        original_size = (capture["width"], capture["height"])
+
+        if Image is None:
+            logger.warning("PIL not available, returning uncompressed PNG screenshot")
+            return {
+                "data": capture["data"],
+                "format": "PNG",
+                "width": original_size[0],
+                "height": original_size[1],
+                "original_width": original_size[0],
+                "original_height": original_size[1],
+                "scale": 1.0,
+                "timing": timing,
+            }
+
+        decode_start = time.perf_counter()
+        if use_raw:
+            frame = dict(capture, pixels=capture["data"])
+            pixels, scale = downscale(decode_raw_frame(frame), max_dimension)
+            image = Image.fromarray(pixels)
+        else:
+            with Image.open(io.BytesIO(capture["data"])) as png:
+                image = png.convert("RGB")
+            scale = 1.0
+            if max_dimension and max(image.size) > max_dimension:
+                scale = max_dimension / max(image.size)
+                size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+                image = image.resize(size, Image.Resampling.BILINEAR)
+                scale = image.width / original_size[0]
+        timing["decode_ms"] = (time.perf_counter() - decode_start) * 1000
+
+        encode_start = time.perf_counter()
+        buffer = io.BytesIO()
+        if image_format == "PNG":
+            image.save(buffer, format="PNG", optimize=False)
+        else:
+            image.save(buffer, format=image_format, quality=quality)
+        data = buffer.getvalue()
+        timing["encode_ms"] = (time.perf_counter() - encode_start) * 1000
+
+        logger.info(
+            f"Screenshot {original_size[0]}x{original_size[1]} → {image.width}x{image.height} "
+            f"{image_format} ({len(data) / 1024:.1f}KB, scale {scale:.3f}) in "
+            f"{timing['capture_ms']:.1f}ms capture + {timing['decode_ms']:.1f}ms decode + "
+            f"{timing['encode_ms']:.1f}ms encode"
+        )
+
+        return {
+            "data": data,
+            "format": image_format,
+            "width": image.width,
+            "height": image.height,
+            "original_width": original_size[0],
+            "original_height": original_size[1],
+            "scale": scale,
+            "timing": timing,
+        }
+
+    async def take_screenshot(
+        self,
+        quality: int = 75,
+        in_memory: bool = True,
+        max_dimension: Optional[int] = None,
+        image_format: str = "JPEG"
+    ) -> Tuple[str, bytes]:
         """Take a screenshot of the device and compress it.
         
         Args:
             quality: JPEG quality (1-100, lower means smaller file size)
+            in_memory: Stream the screenshot over exec-out instead of writing it
+                       to /sdcard and pulling it through a temporary file
+            max_dimension: Maximum size of the longest side (in-memory only)
+            image_format: Output format, 'JPEG', 'WEBP' or 'PNG' (in-memory only)
         
         Returns:
-            Tuple of (local file path, screenshot data as bytes)
+            Tuple of (local file path, screenshot data as bytes). The path is an
+            empty string for in-memory captures. Use get_screenshot() to also
+            get the scale factor and timing.
         """
+        if in_memory:
+            try:
+                screenshot = await self.get_screenshot(max_dimension, image_format, quality)
+            except Exception as e:
+                raise RuntimeError(f"Screenshot capture failed: {str(e)}")
+            return "", screenshot["data"]
+
         # Create a temporary file for the screenshot
         with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp:
             screenshot_path = temp.name
@@ -242,41 +432,7 @@ class Device:
             with open(screenshot_path, "rb") as f:
                 screenshot_data = f.read()
 
-            # Convert and compress the image
-            try:
-                from PIL import Image
-                import io
-
-                # Create buffer for the compressed image
-                buffer = io.BytesIO()
-                
-                # Load the PNG data into a PIL Image
-                with Image.open(io.BytesIO(screenshot_data)) as img:
-                    # Convert to RGB (removing alpha channel if present) and save as JPEG
-                    converted_img = img.convert("RGB") if img.mode == "RGBA" else img
-                    converted_img.save(buffer, format="JPEG", quality=quality, optimize=True)
-                    compressed_data = buffer.getvalue()
-
-                # Get size reduction info for logging
-                png_size = len(screenshot_data) / 1024
-                jpg_size = len(compressed_data) / 1024
-                reduction = 100 - (jpg_size / png_size * 100) if png_size > 0 else 0
-
-                import logging
-                logger = logging.getLogger("droidrun")
-                logger.info(
-                    f"Screenshot compressed successfully: {png_size:.1f}KB → {jpg_size:.1f}KB ({reduction:.1f}% reduction)"
-                )
-
-                return screenshot_path, compressed_data
-            except ImportError:
-                # If PIL is not available, return the original PNG data
-                logger.warning("PIL not available, returning uncompressed screenshot")
-                return screenshot_path, screenshot_data
-            except Exception as e:
-                # If compression fails, return the original PNG data
-                logger.warning(f"Screenshot compression failed: {e}, returning uncompressed")
-                return screenshot_path, screenshot_data
+            return screenshot_path, self._compress_screenshot(screenshot_data, quality)
             
         except Exception as e:
             # Clean up in case of error
@@ -285,7 +441,112 @@ class Device:
             except OSError:
                 pass
             raise RuntimeError(f"Screenshot capture failed: {str(e)}")
+
+    def _compress_screenshot(self, screenshot_data: bytes, quality: int) -> bytes:
+        """Re-encode a PNG screenshot as JPEG.
+        
+        Args:
+            screenshot_data: PNG data
+            quality: JPEG quality (1-100)
+            
+        Returns:
+            JPEG data, or the original PNG data if compression is not possible
+        """
+        try:
+            from PIL import Image
+
+            # Create buffer for the compressed image
+            buffer = io.BytesIO()
+            
+            # Load the PNG data into a PIL Image
+            with Image.open(io.BytesIO(screenshot_data)) as img:
+                # Convert to RGB (removing alpha channel if present) and save as JPEG
+                converted_img = img.convert("RGB") if img.mode == "RGBA" else img
+                converted_img.save(buffer, format="JPEG", quality=quality, optimize=True)
+                compressed_data = buffer.getvalue()
+
+            # Get size reduction info for logging
+            png_size = len(screenshot_data) / 1024
+            jpg_size = len(compressed_data) / 1024
+            reduction = 100 - (jpg_size / png_size * 100) if png_size > 0 else 0
+
+            logger.info(
+                f"Screenshot compressed successfully: {png_size:.1f}KB → {jpg_size:.1f}KB ({reduction:.1f}% reduction)"
+            )
+
+            return compressed_data
+        except ImportError:
+            # If PIL is not available, return the original PNG data
+            logger.warning("PIL not available, returning uncompressed screenshot")
+            return screenshot_data
+        except Exception as e:
+            # If compression fails, return the original PNG data
+            logger.warning(f"Screenshot compression failed: {e}, returning uncompressed")
+            return screenshot_data
             
+    async def frame_signature(self) -> str:
+        """Get a cheap signature of the current frame.
+        
+        The framebuffer is hashed on the device, so only the digest crosses
+        the ADB connection.
+        
+        Returns:
+            Hex digest of the current raw framebuffer
+        """
+        output = await self._adb.session_shell(self._serial, "screencap | md5sum")
+        return output.split()[0] if output else ""
+
+    async def wait_for_idle(
+        self,
+        max_wait: float = 3.0,
+        interval: float = 0.1,
+        probe: Optional[Callable[[], Awaitable[str]]] = None
+    ) -> Dict[str, Any]:
+        """Wait until the UI stops changing.
+        
+        Samples a signature of the screen until two consecutive samples are
+        equal or max_wait elapses.
+        
+        Args:
+            max_wait: Maximum time to wait in seconds
+            interval: Delay between samples in seconds
+            probe: Coroutine function returning a signature of the current UI
+                   state (defaults to a hash of the framebuffer)
+        
+        Returns:
+            Dictionary with 'idle' (False if max_wait elapsed first),
+            'waited_ms', 'samples' and the last 'signature'
+        """
+        probe = probe or self.frame_signature
+        start = time.perf_counter()
+        previous = await probe()
+        samples = 1
+        idle = False
+
+        while time.perf_counter() - start < max_wait:
+            if interval:
+                await asyncio.sleep(interval)
+            current = await probe()
+            samples += 1
+            if current == previous:
+                idle = True
+                break
+            previous = current
+
+        waited_ms = (time.perf_counter() - start) * 1000
+        self.idle_stats["waits"] += 1
+        self.idle_stats["total_ms"] += waited_ms
+        if not idle:
+            self.idle_stats["timeouts"] += 1
+            logger.debug(f"UI on {self._serial} still changing after {waited_ms:.0f}ms")
+
+        return {
+            "idle": idle,
+            "waited_ms": waited_ms,
+            "samples": samples,
+            "signature": previous,
+        }
+
     async def list_packages(self, include_system_apps: bool = False) -> List[Dict[str, str]]:
         """List installed packages on the device.
         
@@ -312,4 +573,28 @@ class Device:
                         "path": path
                     })
                     
-        return packages 
\ No newline at end of file
+        return packages
+
+    async def get_package_version(self, package: str) -> str:
+        """Get the installed version of a package.
+        
+        Args:
+            package: Package name
+            
+        Returns:
+            The package's versionName (with versionCode when available), or
+            an empty string if it is not installed
+        """
+        output = await self._adb.session_shell(
+            self._serial, f"dumpsys package {package} | grep -E 'versionName=|versionCode=' || true"
+        )
+        
+        version_name = version_code = ""
+        for token in output.split():
+            if token.startswith("versionName=") and not version_name:
+                version_name = token.split("=", 1)[1]
+            elif token.startswith("versionCode=") and not version_code:
+                version_code = token.split("=", 1)[1]
+        if version_name and version_code:
+            return f"{version_name} ({version_code})"
+        return version_name or version_code 
\ No newline at end of file
@@ -2,29 +2,66 @@
 Device Manager - Manages Android device connections.
 """
 
+import time
 from typing import Dict, List, Optional
 from .wrapper import ADBWrapper
 from .device import Device
 
+# Default lifetime of the cached device list in seconds
+DEFAULT_DEVICE_LIST_TTL = 5.0
+
 class DeviceManager:
     """Manages Android device connections."""
 
-    def __init__(self, adb_path: Optional[str] = None):
+    def __init__(
+        self,
+        adb_path: Optional[str] = None,
+        device_list_ttl: float = DEFAULT_DEVICE_LIST_TTL,
+        adb: Optional[ADBWrapper] = None
+    ):
         """Initialize device manager.
         
         Args:
             adb_path: Path to ADB binary
+            device_list_ttl: How long list_devices() and get_device() may answer
+                             from the cached device list, in seconds
+            adb: ADB wrapper to use instead of a new one (e.g. a simulated
+                 device backend in benchmarks)
         """
-        self._adb = ADBWrapper(adb_path)
+        self._adb = adb or ADBWrapper(adb_path)
         self._devices: Dict[str, Device] = {}
+        self.device_list_ttl = device_list_ttl
+        self._listed_at: Optional[float] = None
+
+    def invalidate(self, serial: Optional[str] = None) -> None:
+        """Invalidate cached device state.
+        
+        Args:
+            serial: Forget only this device (its Device object and cached
+                    properties); if None, only the device list cache expires
+        """
+        self._listed_at = None
+        if serial is not None:
+            self._devices.pop(serial, None)
+
+    def _list_is_fresh(self) -> bool:
+        """Whether the cached device list is younger than device_list_ttl."""
+        return self._listed_at is not None and time.monotonic() - self._listed_at < self.device_list_ttl
 
-    async def list_devices(self) -> List[Device]:
+    async def list_devices(self, refresh: bool = False) -> List[Device]:
         """List connected devices.
         
+        Args:
+            refresh: Query adb even if the cached list is still fresh
+        
         Returns:
             List of connected devices
         """
+        if not refresh and self._list_is_fresh():
+            return list(self._devices.values())
+
         devices_info = await self._adb.get_devices()
+        self._listed_at = time.monotonic()
         
         # Update device cache
         current_serials = set()
@@ -39,6 +76,7 @@ class DeviceManager:
         for serial in list(self._devices.keys()):
             if serial not in current_serials:
                 del self._devices[serial]
+                await self._adb.close_sessions(serial)
                 
         return list(self._devices.values())
 
@@ -51,11 +89,13 @@ class DeviceManager:
         Returns:
             Device instance if found, None otherwise
         """
-        if serial in self._devices:
+        # Known devices are returned without any ADB round trip while the
+        # device list is fresh; after that, unplugged devices are dropped
+        if serial in self._devices and self._list_is_fresh():
             return self._devices[serial]
             
         # Try to find the device
-        devices = await self.list_devices()
+        devices = await self.list_devices(refresh=True)
         for device in devices:
             if device.serial == serial:
                 return device
@@ -74,6 +114,7 @@ class DeviceManager:
         """
         try:
             serial = await self._adb.connect(host, port)
+            self.invalidate()
             return await self.get_device(serial)
         except Exception:
             return None
@@ -88,6 +129,34 @@ class DeviceManager:
             True if disconnected successfully
         """
         success = await self._adb.disconnect(serial)
-        if success and serial in self._devices:
-            del self._devices[serial]
-        return success 
\ No newline at end of file
+        await self._adb.close_sessions(serial)
+        if success:
+            self.invalidate(serial)
+        return success
+
+# Process-wide manager shared by the agent and the tool functions
+_shared_manager: Optional[DeviceManager] = None
+
+def get_shared_device_manager() -> DeviceManager:
+    """Get the process-wide device manager, creating it on first use.
+    
+    Sharing one manager (and its ADB wrapper) keeps Device objects, their
+    cached properties and shell sessions alive between tool calls, so an
+    action only costs the ADB calls it actually needs.
+    
+    Returns:
+        The shared DeviceManager
+    """
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = DeviceManager()
+    return _shared_manager
+
+def set_shared_device_manager(manager: Optional[DeviceManager]) -> None:
+    """Replace the process-wide device manager.
+    
+    Args:
+        manager: Manager used from now on (None creates a new one on next use)
+    """
+    global _shared_manager
+    _shared_manager = manager
@@ -0,0 +1,144 @@
+"""
+Screencap - Helpers for parsing `screencap` output captured in memory.
+"""
+
+import struct
+from typing import Any, Dict, Tuple
+
+# Android PixelFormat values written in the raw screencap header
+PIXEL_FORMAT_RGBA_8888 = 1
+PIXEL_FORMAT_RGBX_8888 = 2
+PIXEL_FORMAT_RGB_888 = 3
+PIXEL_FORMAT_RGB_565 = 4
+PIXEL_FORMAT_BGRA_8888 = 5
+
+# Bytes per pixel for the formats screencap can produce
+BYTES_PER_PIXEL = {
+    PIXEL_FORMAT_RGBA_8888: 4,
+    PIXEL_FORMAT_RGBX_8888: 4,
+    PIXEL_FORMAT_RGB_888: 3,
+    PIXEL_FORMAT_RGB_565: 2,
+    PIXEL_FORMAT_BGRA_8888: 4,
+}
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def parse_raw_screencap(data: bytes) -> Dict[str, Any]:
+    """Parse the output of `screencap` without `-p`.
+
+    The raw format is a header of little-endian uint32 values (width,
+    height, pixel format and, since Android 8, a color space) followed
+    by the pixel data.
+
+    Args:
+        data: Raw screencap output
+
+    Returns:
+        Dictionary with 'width', 'height', 'pixel_format', 'bytes_per_pixel'
+        and 'pixels' (memoryview over the pixel data, header excluded)
+    """
+    if len(data) < 12:
+        raise ValueError(f"Raw screencap output too short ({len(data)} bytes)")
+
+    width, height, pixel_format = struct.unpack_from("<III", data, 0)
+    bytes_per_pixel = BYTES_PER_PIXEL.get(pixel_format)
+    if bytes_per_pixel is None:
+        raise ValueError(f"Unsupported screencap pixel format: {pixel_format}")
+
+    # The header grew a color space field, find it from the payload size
+    pixel_bytes = width * height * bytes_per_pixel
+    header_size = len(data) - pixel_bytes
+    if header_size not in (12, 16):
+        raise ValueError(
+            f"Raw screencap size mismatch: {len(data)} bytes for {width}x{height} "
+            f"at {bytes_per_pixel} bytes per pixel"
+        )
+
+    return {
+        "width": width,
+        "height": height,
+        "pixel_format": pixel_format,
+        "bytes_per_pixel": bytes_per_pixel,
+        "pixels": memoryview(data)[header_size:],
+    }
+
+def png_dimensions(data: bytes) -> Tuple[int, int]:
+    """Read the image size from a PNG's IHDR chunk without decoding it.
+
+    Args:
+        data: PNG file contents
+
+    Returns:
+        Tuple of (width, height)
+    """
+    if len(data) < 24 or not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Screencap output is not a PNG image")
+    return struct.unpack(">II", data[16:24])
+
+def decode_raw_frame(frame: Dict[str, Any]):
+    """Convert a parsed raw screencap into an RGB NumPy array.
+
+    Args:
+        frame: Result of parse_raw_screencap()
+
+    Returns:
+        uint8 array of shape (height, width, 3)
+    """
+    import numpy as np
+
+    width, height = frame["width"], frame["height"]
+    pixel_format = frame["pixel_format"]
+    pixels = np.frombuffer(frame["pixels"], dtype=np.uint8)
+
+    if pixel_format == PIXEL_FORMAT_RGB_565:
+        packed = pixels.view("<u2").reshape(height, width)
+        rgb = np.empty((height, width, 3), dtype=np.uint8)
+        rgb[..., 0] = ((packed >> 11) & 0x1F) << 3
+        rgb[..., 1] = ((packed >> 5) & 0x3F) << 2
+        rgb[..., 2] = (packed & 0x1F) << 3
+        return rgb
+
+    channels = frame["bytes_per_pixel"]
+    image = pixels.reshape(height, width, channels)
+    if pixel_format == PIXEL_FORMAT_BGRA_8888:
+        return image[..., 2::-1]
+    return image[..., :3]
+
+def downscale(image, max_dimension: int) -> Tuple[Any, float]:
+    """Shrink an image so that its longest side is at most max_dimension.
+
+    Integer factors are reduced with a vectorized box filter (block mean),
+    which averages out UI text instead of dropping pixels; any remaining
+    fractional factor is applied with nearest-neighbour sampling.
+
+    Args:
+        image: uint8 array of shape (height, width, channels)
+        max_dimension: Maximum size of the longest side in pixels
+
+    Returns:
+        Tuple of (downscaled array, scale factor applied to both axes)
+    """
+    import numpy as np
+
+    height, width = image.shape[:2]
+    longest = max(height, width)
+    if not max_dimension or longest <= max_dimension:
+        return image, 1.0
+
+    scale = max_dimension / longest
+    factor = int(1 / scale)
+    if factor > 1:
+        cropped = image[:height - height % factor, :width - width % factor]
+        blocks = cropped.reshape(
+            cropped.shape[0] // factor, factor, cropped.shape[1] // factor, factor, -1
+        )
+        image = blocks.mean(axis=(1, 3), dtype=np.float32).astype(np.uint8)
+
+    target_height = max(1, round(height * scale))
+    target_width = max(1, round(width * scale))
+    if image.shape[0] != target_height or image.shape[1] != target_width:
+        rows = (np.arange(target_height) * image.shape[0] // target_height)
+        cols = (np.arange(target_width) * image.shape[1] // target_width)
+        image = image[rows[:, None], cols]
+
+    return image, target_width / width
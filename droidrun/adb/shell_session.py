@@ -0,0 +1,183 @@
+"""
+Shell Session - Long-lived interactive shell on an Android device.
+"""
+
+import asyncio
+import socket
+import uuid
+from typing import Awaitable, Callable, Optional, Tuple
+
+# Opens the underlying stream: returns (reader, writer, process or None)
+StreamOpener = Callable[
+    [], Awaitable[Tuple[asyncio.StreamReader, asyncio.StreamWriter, Optional[asyncio.subprocess.Process]]]
+]
+
+class ShellSessionUnavailable(ConnectionError):
+    """Raised when a command could not be sent to the shell; it has not run."""
+
+class ShellSession:
+    """A single `sh` process kept open on the device.
+
+    Commands are written to the shell's stdin and framed with a unique
+    sentinel line that carries the exit code, so their output can be told
+    apart on the shared stdout stream. Concurrent callers are queued and run
+    one after another over the same connection.
+    """
+
+    def __init__(self, serial: str, opener: StreamOpener):
+        """Initialize the session (must be called from the event loop that will use it).
+
+        Args:
+            serial: Device serial number
+            opener: Coroutine function opening the shell stream
+        """
+        self.serial = serial
+        self._opener = opener
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+        self.loop = asyncio.get_running_loop()
+        self.commands_run = 0
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the underlying shell is connected."""
+        if self._writer is None or self._writer.is_closing():
+            return False
+        if self._process is not None and self._process.returncode is not None:
+            return False
+        # The device side may have ended the shell since the last command
+        if self._reader is None or self._reader.at_eof():
+            return False
+        return True
+
+    async def _ensure_open(self) -> None:
+        """Open the shell if it is not connected yet."""
+        if not self.is_open:
+            await self._close()
+            self._reader, self._writer, self._process = await self._opener()
+
+    async def run(self, command: str, timeout: Optional[float] = None) -> Tuple[str, int]:
+        """Run a command in the session.
+
+        Args:
+            command: Shell command to run
+            timeout: Command timeout in seconds
+
+        Returns:
+            Tuple of (combined stdout/stderr, exit code)
+
+        Raises:
+            ShellSessionUnavailable: If the shell could not be opened or the
+                command could not be written (safe to run it another way)
+            ConnectionError: If the shell closed after the command was written,
+                in which case the command may have run
+        """
+        async with self._lock:
+            try:
+                await self._ensure_open()
+            except (OSError, asyncio.IncompleteReadError) as e:
+                await self._close()
+                raise ShellSessionUnavailable(f"Cannot open a shell session on {self.serial}: {e}") from e
+            try:
+                if timeout is not None:
+                    result = await asyncio.wait_for(self._run_locked(command), timeout)
+                else:
+                    result = await self._run_locked(command)
+            except asyncio.TimeoutError:
+                # The shell is now in an unknown state, start over next time
+                await self._close()
+                raise TimeoutError(f"Shell session command timed out: {command}")
+            except BaseException:
+                await self._close()
+                raise
+            self.commands_run += 1
+            return result
+
+    async def _run_locked(self, command: str) -> Tuple[str, int]:
+        """Write a framed command and read its output up to the sentinel."""
+        sentinel = f"__DROIDRUN_{uuid.uuid4().hex}__"
+        script = (
+            f"{{ {command}\n}} </dev/null 2>&1; __droidrun_rc=$?; "
+            f"echo; echo {sentinel} $__droidrun_rc\n"
+        )
+        try:
+            self._writer.write(script.encode("utf-8"))
+            await self._writer.drain()
+        except OSError as e:
+            raise ShellSessionUnavailable(f"Shell session on {self.serial} is closed: {e}") from e
+
+        marker = f"\n{sentinel} ".encode("ascii")
+        buffer = bytearray()
+        search_from = 0
+        while True:
+            chunk = await self._reader.read(65536)
+            if not chunk:
+                raise ConnectionError(f"Shell session on {self.serial} closed unexpectedly")
+            buffer += chunk
+
+            start = buffer.find(marker, search_from)
+            if start != -1:
+                end = buffer.find(b"\n", start + len(marker))
+                if end != -1:
+                    exit_code = int(buffer[start + len(marker):end].strip() or 0)
+                    output = bytes(buffer[:start]).decode("utf-8", errors="replace")
+                    return output, exit_code
+                search_from = start
+            else:
+                search_from = max(0, len(buffer) - len(marker))
+
+    async def _close(self) -> None:
+        """Close the stream and terminate the local adb process, if any."""
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        if self._process is not None and self._process.returncode is None:
+            try:
+                self._process.kill()
+                await self._process.wait()
+            except ProcessLookupError:
+                pass
+        self._reader = None
+        self._writer = None
+        self._process = None
+
+    async def close(self) -> None:
+        """Close the session."""
+        async with self._lock:
+            await self._close()
+
+    def discard(self) -> None:
+        """Close the session from outside its event loop.
+
+        Used when the session is replaced by one for another event loop. If
+        its own loop still runs (in another thread), the session is closed
+        there; otherwise the connection is shut down and the local adb
+        process, if any, is killed right away.
+        """
+        if self.loop.is_running() and not self.loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self.close(), self.loop)
+            return
+        if self._writer is not None:
+            transport = self._writer.transport
+            try:
+                transport.close()
+            except RuntimeError:
+                # The loop is closed and cannot run the transport's callbacks
+                sock = transport.get_extra_info("socket")
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+        if self._process is not None and self._process.returncode is None:
+            try:
+                self._process.kill()
+            except ProcessLookupError:
+                pass
+        self._reader = None
+        self._writer = None
+        self._process = None
@@ -5,27 +5,331 @@ ADB Wrapper - Lightweight wrapper around ADB for Android device control.
 import asyncio
 import os
 import shlex
+import struct
 from typing import Dict, List, Optional, Tuple
+from .shell_session import ShellSession, ShellSessionUnavailable
+
+# Default location of the local adb server
+DEFAULT_ADB_SERVER_HOST = "127.0.0.1"
+DEFAULT_ADB_SERVER_PORT = 5037
+
+# Shell protocol v2 packet ids
+SHELL_V2_STDIN = 0
+SHELL_V2_STDOUT = 1
+SHELL_V2_STDERR = 2
+SHELL_V2_EXIT = 3
+
+
+class ADBProtocolError(RuntimeError):
+    """Raised when the adb server answers a request with FAIL."""
+
+
+class ADBServerUnavailable(ConnectionError):
+    """Raised when the adb server cannot be reached or drops the transport handshake.
+
+    Nothing has been sent to the device at that point, so the request can be
+    retried with the adb binary.
+    """
+
+
+class ADBServerClient:
+    """Minimal client for the adb host protocol spoken by the local adb server.
+
+    Every request opens a short-lived TCP connection to the server (usually
+    127.0.0.1:5037), which is what the adb binary does internally, minus the
+    cost of starting a new process.
+    """
+
+    def __init__(
+        self,
+        host: Optional[str] = None,
+        port: Optional[int] = None,
+        connect_timeout: float = 2.0
+    ):
+        """Initialize the server client.
+        
+        Args:
+            host: adb server host (defaults to ANDROID_ADB_SERVER_ADDRESS or 127.0.0.1)
+            port: adb server port (defaults to ANDROID_ADB_SERVER_PORT or 5037)
+            connect_timeout: Timeout for establishing the TCP connection
+        """
+        self.host = host or os.environ.get("ANDROID_ADB_SERVER_ADDRESS", DEFAULT_ADB_SERVER_HOST)
+        self.port = int(port or os.environ.get("ANDROID_ADB_SERVER_PORT", DEFAULT_ADB_SERVER_PORT))
+        self.connect_timeout = connect_timeout
+        self._features: Dict[str, frozenset] = {}
+
+    async def _open(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Open a new connection to the adb server."""
+        try:
+            return await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port),
+                self.connect_timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            raise ADBServerUnavailable(f"Cannot reach the adb server at {self.host}:{self.port}: {e}") from e
+
+    @staticmethod
+    def _close(writer: asyncio.StreamWriter) -> None:
+        """Close a connection without waiting for the peer."""
+        try:
+            writer.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    async def _send_request(
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+        request: str
+    ) -> None:
+        """Send a length-prefixed request and wait for OKAY.
+        
+        Raises:
+            ADBProtocolError: If the server answers with FAIL
+        """
+        payload = request.encode("utf-8")
+        writer.write(f"{len(payload):04x}".encode("ascii") + payload)
+        await writer.drain()
+
+        status = await reader.readexactly(4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            message = await ADBServerClient._read_length_prefixed(reader)
+            raise ADBProtocolError(message.decode("utf-8", errors="replace"))
+        raise ADBProtocolError(f"Unexpected adb server response: {status!r}")
+
+    @staticmethod
+    async def _read_length_prefixed(reader: asyncio.StreamReader) -> bytes:
+        """Read a payload prefixed with a 4-digit hex length."""
+        length = int((await reader.readexactly(4)).decode("ascii"), 16)
+        return await reader.readexactly(length)
+
+    async def host_request(self, request: str) -> str:
+        """Run a host service that replies with a single length-prefixed payload.
+        
+        Args:
+            request: Host service, e.g. 'host:devices-l' or 'host:version'
+            
+        Returns:
+            Decoded reply payload
+        """
+        reader, writer = await self._open()
+        try:
+            await self._send_request(reader, writer, request)
+            reply = await self._read_length_prefixed(reader)
+            return reply.decode("utf-8", errors="replace")
+        finally:
+            self._close(writer)
+
+    async def features(self, serial: str) -> frozenset:
+        """Get the feature set shared by the adb server and a device (cached per serial).
+        
+        Args:
+            serial: Device serial number
+            
+        Returns:
+            Set of feature names such as 'shell_v2'
+        """
+        if serial not in self._features:
+            reply = await self.host_request(f"host-serial:{serial}:features")
+            self._features[serial] = frozenset(f for f in reply.strip().split(",") if f)
+        return self._features[serial]
+
+    async def open_service(
+        self,
+        serial: str,
+        service: str
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        """Switch a new connection to a device transport and open a service on it.
+        
+        Args:
+            serial: Device serial number
+            service: Device service, e.g. 'shell:ls' or 'sync:'
+            
+        Returns:
+            Tuple of (reader, writer) connected to the service
+        """
+        reader, writer = await self._open()
+        try:
+            try:
+                await self._send_request(reader, writer, f"host:transport:{serial}")
+            except (OSError, asyncio.IncompleteReadError) as e:
+                raise ADBServerUnavailable(f"adb server dropped the connection: {e!r}") from e
+            # From here on the service may have started on the device
+            await self._send_request(reader, writer, service)
+        except BaseException:
+            self._close(writer)
+            raise
+        return reader, writer
+
+    async def shell(self, serial: str, command: str) -> Tuple[bytes, bytes, Optional[int]]:
+        """Run a shell command on the device.
+        
+        Uses the shell v2 protocol when the device supports it, which keeps
+        stdout and stderr apart and reports the exit code. Older devices fall
+        back to the legacy 'shell:' service, which merges both streams and
+        does not report an exit code.
+        
+        Args:
+            serial: Device serial number
+            command: Shell command to run
+            
+        Returns:
+            Tuple of (stdout, stderr, exit code or None if unknown)
+        """
+        if "shell_v2" not in await self.features(serial):
+            return await self._legacy_shell(serial, command)
+
+        reader, writer = await self.open_service(serial, f"shell,v2,raw:{command}")
+        stdout = bytearray()
+        stderr = bytearray()
+        exit_code: Optional[int] = None
+        try:
+            while True:
+                try:
+                    header = await reader.readexactly(5)
+                except asyncio.IncompleteReadError:
+                    break
+                packet_id, length = struct.unpack("<BI", header)
+                data = await reader.readexactly(length)
+                if packet_id == SHELL_V2_STDOUT:
+                    stdout += data
+                elif packet_id == SHELL_V2_STDERR:
+                    stderr += data
+                elif packet_id == SHELL_V2_EXIT:
+                    exit_code = data[0] if data else 0
+                    break
+        finally:
+            self._close(writer)
+        return bytes(stdout), bytes(stderr), exit_code
+
+    async def _legacy_shell(self, serial: str, command: str) -> Tuple[bytes, bytes, Optional[int]]:
+        """Run a command through the legacy 'shell:' service."""
+        reader, writer = await self.open_service(serial, f"shell:{command}")
+        try:
+            output = await reader.read()
+        finally:
+            self._close(writer)
+        return output, b"", None
+
+    async def exec_out(self, serial: str, command: str) -> bytes:
+        """Run a command through the 'exec:' service and return its raw stdout.
+        
+        Args:
+            serial: Device serial number
+            command: Command to run
+            
+        Returns:
+            Command stdout as bytes
+        """
+        reader, writer = await self.open_service(serial, f"exec:{command}")
+        try:
+            return await reader.read()
+        finally:
+            self._close(writer)
+
+    async def pull(self, serial: str, device_path: str) -> bytes:
+        """Read a file from the device using the sync protocol.
+        
+        Args:
+            serial: Device serial number
+            device_path: Path on the device
+            
+        Returns:
+            File contents
+        """
+        reader, writer = await self.open_service(serial, "sync:")
+        try:
+            path = device_path.encode("utf-8")
+            writer.write(b"RECV" + struct.pack("<I", len(path)) + path)
+            await writer.drain()
+
+            content = bytearray()
+            while True:
+                header = await reader.readexactly(8)
+                tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+                if tag == b"DATA":
+                    content += await reader.readexactly(length)
+                elif tag == b"DONE":
+                    break
+                elif tag == b"FAIL":
+                    message = await reader.readexactly(length)
+                    raise ADBProtocolError(message.decode("utf-8", errors="replace"))
+                else:
+                    raise ADBProtocolError(f"Unexpected sync response: {tag!r}")
+
+            writer.write(b"QUIT" + struct.pack("<I", 0))
+            await writer.drain()
+            return bytes(content)
+        finally:
+            self._close(writer)
+
 
 class ADBWrapper:
     """Lightweight wrapper around ADB for Android device control."""
 
-    def __init__(self, adb_path: Optional[str] = None):
+    def __init__(
+        self,
+        adb_path: Optional[str] = None,
+        transport: Optional[str] = None,
+        server_host: Optional[str] = None,
+        server_port: Optional[int] = None
+    ):
         """Initialize ADB wrapper.
         
         Args:
             adb_path: Path to ADB binary (defaults to 'adb' in PATH)
+            transport: 'socket' to talk to the adb server directly, 'subprocess' to
+                       spawn the adb binary for every command, or 'auto' (default) to
+                       use the socket and fall back to the binary when the server
+                       cannot be reached. Defaults to DROIDRUN_ADB_TRANSPORT.
+            server_host: adb server host for the socket transport
+            server_port: adb server port for the socket transport
         """
         self.adb_path = adb_path or "adb"
         self._devices_cache: List[Dict[str, str]] = []
 
-    async def _run_command(
+        self.transport = (transport or os.environ.get("DROIDRUN_ADB_TRANSPORT", "auto")).lower()
+        if self.transport not in ("auto", "socket", "subprocess"):
+            raise ValueError(f"Unsupported ADB transport: {self.transport}")
+        self._server: Optional[ADBServerClient] = None
+        if self.transport != "subprocess":
+            self._server = ADBServerClient(server_host, server_port)
+        self._shell_sessions: Dict[str, ShellSession] = {}
+
+    async def _via_server(self, operation, timeout: Optional[float], description: str):
+        """Run an adb server operation, translating errors like _run_command does.
+        
+        Returns:
+            The operation result, or None if the subprocess fallback should be used
+        """
+        if self._server is None:
+            return None
+
+        try:
+            if timeout is not None:
+                return await asyncio.wait_for(operation(), timeout)
+            return await operation()
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"ADB command timed out: {description}")
+        except ADBProtocolError as e:
+            raise RuntimeError(f"ADB command failed: {e}")
+        except ADBServerUnavailable:
+            # The adb server is not reachable; the adb binary will start it.
+            # Errors after the service was opened are raised instead, since
+            # running the command again could repeat an input event.
+            if self.transport == "socket":
+                raise
+            return None
+
+    async def _run_command_raw(
         self, 
         args: List[str], 
         timeout: Optional[float] = None,
         check: bool = True
-    ) -> Tuple[str, str]:
-        """Run an ADB command.
+    ) -> Tuple[bytes, bytes]:
+        """Run an ADB command and return its undecoded output.
         
         Args:
             args: Command arguments
@@ -33,7 +337,7 @@ class ADBWrapper:
             check: Whether to check return code
             
         Returns:
-            Tuple of (stdout, stderr)
+            Tuple of (stdout, stderr) as bytes
         """
         cmd = [self.adb_path, *args]
         
@@ -51,19 +355,39 @@ class ADBWrapper:
             else:
                 stdout_bytes, stderr_bytes = await process.communicate()
 
-            stdout = stdout_bytes.decode("utf-8", errors="replace").strip()
-            stderr = stderr_bytes.decode("utf-8", errors="replace").strip()
-
             if check and process.returncode != 0:
+                stdout = stdout_bytes.decode("utf-8", errors="replace").strip()
+                stderr = stderr_bytes.decode("utf-8", errors="replace").strip()
                 raise RuntimeError(f"ADB command failed: {stderr or stdout}")
 
-            return stdout, stderr
+            return stdout_bytes, stderr_bytes
 
         except asyncio.TimeoutError:
             raise TimeoutError(f"ADB command timed out: {' '.join(cmd)}")
         except FileNotFoundError:
             raise FileNotFoundError(f"ADB not found at {self.adb_path}")
 
+    async def _run_command(
+        self, 
+        args: List[str], 
+        timeout: Optional[float] = None,
+        check: bool = True
+    ) -> Tuple[str, str]:
+        """Run an ADB command.
+        
+        Args:
+            args: Command arguments
+            timeout: Command timeout in seconds
+            check: Whether to check return code
+            
+        Returns:
+            Tuple of (stdout, stderr)
+        """
+        stdout_bytes, stderr_bytes = await self._run_command_raw(args, timeout, check)
+        stdout = stdout_bytes.decode("utf-8", errors="replace").strip()
+        stderr = stderr_bytes.decode("utf-8", errors="replace").strip()
+        return stdout, stderr
+
     async def _run_device_command(
         self, 
         serial: str, 
@@ -80,11 +404,17 @@ class ADBWrapper:
         Returns:
             List of device info dictionaries with 'serial' and 'status' keys
         """
-        stdout, _ = await self._run_command(["devices", "-l"])
+        stdout = await self._via_server(
+            lambda: self._server.host_request("host:devices-l"), None, "devices -l"
+        )
+        if stdout is None:
+            stdout, _ = await self._run_command(["devices", "-l"])
+            # Skip the "List of devices attached" header
+            stdout = "\n".join(stdout.splitlines()[1:])
         
         devices = []
-        for line in stdout.splitlines()[1:]:  # Skip first line (header)
-            if not line.strip():
+        for line in stdout.splitlines():
+            if not line.strip() or line.startswith("*"):
                 continue
                 
             parts = line.split()
@@ -152,9 +482,123 @@ class ADBWrapper:
         Returns:
             Command output
         """
-        stdout, _ = await self._run_device_command(serial, ["shell", command], timeout=timeout)
+        result = await self._via_server(
+            lambda: self._server.shell(serial, command), timeout, f"-s {serial} shell {command}"
+        )
+        if result is None:
+            stdout, _ = await self._run_device_command(serial, ["shell", command], timeout=timeout)
+            return stdout
+
+        stdout_bytes, stderr_bytes, exit_code = result
+        stdout = stdout_bytes.decode("utf-8", errors="replace").strip()
+        stderr = stderr_bytes.decode("utf-8", errors="replace").strip()
+        if exit_code:
+            raise RuntimeError(f"ADB command failed: {stderr or stdout}")
         return stdout
 
+    async def exec_out(self, serial: str, command: str, timeout: Optional[float] = None) -> bytes:
+        """Run a command on the device and return its raw, binary-safe stdout.
+        
+        Unlike shell(), the output is neither decoded nor stripped and no pty
+        is involved, so it can carry binary data such as screencap output.
+        
+        Args:
+            serial: Device serial number
+            command: Command to run
+            timeout: Command timeout in seconds
+            
+        Returns:
+            Command stdout as bytes
+        """
+        output = await self._via_server(
+            lambda: self._server.exec_out(serial, command), timeout, f"-s {serial} exec-out {command}"
+        )
+        if output is None:
+            output, _ = await self._run_command_raw(
+                ["-s", serial, "exec-out", command], timeout=timeout
+            )
+        return output
+
+    async def _open_shell_stream(self, serial: str):
+        """Open a stream to a `sh` process on the device for a ShellSession."""
+        if self._server is not None:
+            try:
+                reader, writer = await self._server.open_service(serial, "shell:sh")
+                return reader, writer, None
+            except ADBProtocolError as e:
+                raise RuntimeError(f"ADB command failed: {e}")
+            except (ConnectionError, OSError):
+                if self.transport == "socket":
+                    raise
+
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.adb_path, "-s", serial, "shell", "sh",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+            )
+        except FileNotFoundError:
+            raise FileNotFoundError(f"ADB not found at {self.adb_path}")
+        return process.stdout, process.stdin, process
+
+    def get_shell_session(self, serial: str) -> ShellSession:
+        """Get the persistent shell session for a device, creating it if needed.
+        
+        Args:
+            serial: Device serial number
+            
+        Returns:
+            Shell session bound to the device
+        """
+        session = self._shell_sessions.get(serial)
+        # Sessions are bound to the event loop they were created in
+        if session is None or session.loop is not asyncio.get_running_loop():
+            if session is not None:
+                session.discard()
+            session = ShellSession(serial, lambda: self._open_shell_stream(serial))
+            self._shell_sessions[serial] = session
+        return session
+
+    async def session_shell(self, serial: str, command: str, timeout: Optional[float] = None) -> str:
+        """Run a shell command through the device's persistent shell session.
+        
+        Avoids per-command process and transport setup. Falls back to a
+        one-off shell() call if the session cannot be opened or the command
+        cannot be sent; if the session breaks after that, the error is raised
+        rather than running the command a second time.
+        
+        Args:
+            serial: Device serial number
+            command: Shell command to run
+            timeout: Command timeout in seconds
+            
+        Returns:
+            Command output
+        """
+        session = self.get_shell_session(serial)
+        try:
+            output, exit_code = await session.run(command, timeout=timeout)
+        except ShellSessionUnavailable:
+            return await self.shell(serial, command, timeout=timeout)
+
+        output = output.strip()
+        if exit_code != 0:
+            raise RuntimeError(f"ADB command failed: {output}")
+        return output
+
+    async def close_sessions(self, serial: Optional[str] = None) -> None:
+        """Close persistent shell sessions.
+        
+        Args:
+            serial: Only close the session of this device (all sessions if None)
+        """
+        serials = [serial] if serial else list(self._shell_sessions.keys())
+        for key in serials:
+            session = self._shell_sessions.pop(key, None)
+            if session is not None:
+                await session.close()
+
     async def get_properties(self, serial: str) -> Dict[str, str]:
         """Get device properties.
         
@@ -222,5 +666,13 @@ class ADBWrapper:
         local_dir = os.path.dirname(local_path)
         if local_dir and not os.path.exists(local_dir):
             os.makedirs(local_dir)
-            
-        return await self._run_device_command(serial, ["pull", device_path, local_path], timeout=60.0) 
\ No newline at end of file
+
+        content = await self._via_server(
+            lambda: self._server.pull(serial, device_path), 60.0, f"-s {serial} pull {device_path}"
+        )
+        if content is None:
+            return await self._run_device_command(serial, ["pull", device_path, local_path], timeout=60.0)
+
+        with open(local_path, "wb") as f:
+            f.write(content)
+        return f"{device_path}: 1 file pulled ({len(content)} bytes)", "" 
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+History Compaction - Compact digests of old UI observations.
+
+Only the latest UI observation is kept in full in the prompt history. Older
+ones are replaced by a short digest (screen signature, tapped elements and
+key texts), or optionally by a summary from a cheaper model. Diffs sent
+against an observation are compacted with it, to their header line.
+"""
+
+import re
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Iterable, List
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You compress Android screen observations for the history of a UI automation agent. "
+    "Given the element list of a screen, describe in at most 50 words what the screen is "
+    "and its key controls, keeping the element indices of the controls that matter. "
+    'Reply in JSON format: {"summary": "..."}'
+)
+
+def screen_signature(elements: Iterable[Dict[str, Any]]) -> str:
+    """Short hash identifying a screen by its elements' indices, classes and texts.
+
+    Args:
+        elements: Flattened UI elements
+
+    Returns:
+        10-character hex signature
+    """
+    digest = hashlib.sha1()
+    for element in elements:
+        digest.update(
+            f"{element.get('index')}\x1f{element.get('className', '')}\x1f{element.get('text', '')}\x1e".encode("utf-8")
+        )
+    return digest.hexdigest()[:10]
+
+# Header line of an encoded diff (see ui_diff.encode_diff)
+DIFF_HEADER_RE = re.compile(r"^Screen (\w+) changed from \w+ .*: (\+\d+ -\d+ ~\d+)$", re.MULTILINE)
+
+def diff_digest(content: str) -> str:
+    """Build a compact digest of a UI diff observation.
+
+    Args:
+        content: Observation text containing an encoded diff
+
+    Returns:
+        One-line digest with the new screen hash and the change counts
+    """
+    match = DIFF_HEADER_RE.search(content)
+    if match is None:
+        return "[screen update]"
+    return f"[update to screen {match.group(1)}: {match.group(2)}]"
+
+def ui_digest(
+    elements: List[Dict[str, Any]],
+    tapped: Iterable[int] = (),
+    max_texts: int = 8,
+    max_text_length: int = 40
+) -> str:
+    """Build a compact digest of a UI observation.
+
+    Args:
+        elements: Flattened UI elements of the screen
+        tapped: Indices of the elements tapped while the screen was current
+        max_texts: Maximum number of texts to keep
+        max_text_length: Maximum length of each text
+
+    Returns:
+        One-line digest of the screen
+    """
+    by_index = {element.get('index'): element for element in elements}
+
+    texts: List[str] = []
+    seen = set()
+    for element in elements:
+        text = (element.get('text') or '').strip()
+        if not text or text in seen:
+            continue
+        seen.add(text)
+        texts.append(text if len(text) <= max_text_length else text[:max_text_length - 1] + "…")
+        if len(texts) >= max_texts:
+            break
+
+    parts = [f"screen {screen_signature(elements)}", f"{len(elements)} elements"]
+    tapped_parts = []
+    for index in tapped:
+        text = (by_index.get(index) or {}).get('text') or ''
+        tapped_parts.append(f"{index} '{text[:max_text_length]}'" if text else str(index))
+    if tapped_parts:
+        parts.append("tapped " + ", ".join(tapped_parts))
+    if texts:
+        parts.append("texts: " + " | ".join(texts))
+    return "[" + "; ".join(parts) + "]"
+
+async def summarize_observation(provider: Any, content: str, digest: str) -> str:
+    """Summarize a UI observation with an LLM provider.
+
+    Args:
+        provider: LLMProvider (or LLMReasoner) used for summaries
+        content: Full observation text
+        digest: Digest of the observation, kept in front of the summary
+
+    Returns:
+        The digest followed by the model's summary, or only the digest if
+        summarization fails
+    """
+    provider = getattr(provider, "provider", provider)
+    try:
+        response = await provider.generate_response(SUMMARY_SYSTEM_PROMPT, content)
+        summary = json.loads(response).get("summary", "").strip()
+    except Exception as e:
+        logger.debug(f"Observation summary failed, keeping the digest: {e}")
+        return digest
+    return f"{digest} {summary}" if summary else digest
@@ -0,0 +1,188 @@
+"""
+Fleet Runner - Run tasks across many devices in one process.
+
+Every device gets its own ReActAgent, and all of them share one event loop
+and, through the provider client pool, one LLM client per API key. That
+avoids paying interpreter startup, SDK imports and client setup once per
+device, as launching one CLI process per phone does.
+"""
+
+import math
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from droidrun.adb import get_shared_device_manager
+from .react_agent import ReActAgent
+from .llm_reasoning import LLMReasoner
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    """Get a percentile of values by the nearest-rank method.
+
+    Args:
+        values: Samples
+        fraction: Percentile as a fraction, e.g. 0.95
+
+    Returns:
+        The percentile, or 0.0 if there are no samples
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+def summarize_results(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+    """Aggregate task results into a throughput report.
+
+    Args:
+        results: Task results as returned by FleetRunner.run_task
+        wall_time: Time the whole run took in seconds
+
+    Returns:
+        Dictionary with task counts, 'tasks_per_minute', step latency
+        percentiles in seconds and per-device counts in 'devices'
+    """
+    step_times = [step for result in results for step in result["step_times"]]
+    devices: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        device = devices.setdefault(result["serial"], {"tasks": 0, "succeeded": 0, "busy_s": 0.0})
+        device["tasks"] += 1
+        device["succeeded"] += int(result["success"])
+        device["busy_s"] += result["duration_s"]
+
+    finished = len(results)
+    return {
+        "tasks": finished,
+        "succeeded": sum(1 for result in results if result["success"]),
+        "wall_time_s": wall_time,
+        "tasks_per_minute": finished / wall_time * 60 if wall_time > 0 else 0.0,
+        "steps": len(step_times),
+        "step_p50_s": percentile(step_times, 0.50),
+        "step_p95_s": percentile(step_times, 0.95),
+        "devices": devices,
+    }
+
+class FleetRunner:
+    """Runs tasks on many devices concurrently in one event loop."""
+
+    def __init__(
+        self,
+        llm_factory: Callable[[], LLMReasoner],
+        serials: Optional[List[str]] = None,
+        per_device_concurrency: int = 1,
+        max_steps: int = 15,
+        **agent_options: Any
+    ):
+        """Initialize the fleet runner.
+
+        Args:
+            llm_factory: Creates the reasoner of each agent. Reasoners with the
+                         same provider settings share a pooled client.
+            serials: Devices to use (defaults to all connected devices)
+            per_device_concurrency: Maximum number of agents at once per device
+            max_steps: Maximum number of steps per task
+            **agent_options: Further ReActAgent arguments
+        """
+        self.llm_factory = llm_factory
+        self.serials = serials
+        self.per_device_concurrency = max(1, per_device_concurrency)
+        self.max_steps = max_steps
+        self.agent_options = agent_options
+        self._device_slots: Dict[str, asyncio.Semaphore] = {}
+
+    async def get_serials(self) -> List[str]:
+        """Get the serials of the devices to run on."""
+        if self.serials:
+            return list(self.serials)
+        devices = await get_shared_device_manager().list_devices()
+        return [device.serial for device in devices]
+
+    def device_slot(self, serial: str) -> asyncio.Semaphore:
+        """Get the semaphore limiting concurrent agents on a device."""
+        slot = self._device_slots.get(serial)
+        if slot is None:
+            slot = self._device_slots[serial] = asyncio.Semaphore(self.per_device_concurrency)
+        return slot
+
+    async def run_task(self, serial: str, task: str) -> Dict[str, Any]:
+        """Run one task on one device.
+
+        Args:
+            serial: Device serial
+            task: Task description
+
+        Returns:
+            Dictionary with 'serial', 'task', 'success', 'result', 'steps',
+            'llm_calls', 'duration_s', 'step_times' and 'error'
+        """
+        async with self.device_slot(serial):
+            start = time.perf_counter()
+            agent = None
+            error = None
+            try:
+                agent = ReActAgent(
+                    task=task,
+                    llm=self.llm_factory(),
+                    device_serial=serial,
+                    max_steps=self.max_steps,
+                    print_report=False,
+                    **self.agent_options
+                )
+                await agent.run()
+            except Exception as e:
+                logger.error(f"Task '{task}' failed on {serial}: {e}")
+                error = str(e)
+
+            return {
+                "serial": serial,
+                "task": task,
+                "success": bool(agent and agent.goal_achieved),
+                "result": agent.result if agent else None,
+                "steps": len(agent.step_times) if agent else 0,
+                "llm_calls": agent.reasoner.get_token_usage_stats().get("api_calls", 0) if agent else 0,
+                "duration_s": time.perf_counter() - start,
+                "step_times": agent.step_times if agent else [],
+                "error": error,
+            }
+
+    async def run(
+        self,
+        tasks: List[str],
+        on_result: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """Run every task on every device.
+
+        Args:
+            tasks: Task descriptions; each device runs them in order
+            on_result: Called with each task result as soon as it is ready
+
+        Returns:
+            Dictionary with 'results' (per task and device) and 'summary'
+            (see summarize_results)
+        """
+        serials = await self.get_serials()
+        if not serials:
+            raise ValueError("No devices found")
+
+        start = time.perf_counter()
+        results: List[Dict[str, Any]] = []
+
+        async def run_device(serial: str) -> None:
+            # Tasks of one device start in order, up to the device's limit at once
+            pending = [asyncio.ensure_future(self.run_task(serial, task)) for task in tasks]
+            for future in asyncio.as_completed(pending):
+                result = await future
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+
+        await asyncio.gather(*(run_device(serial) for serial in serials))
+        return {
+            "results": results,
+            "summary": summarize_results(results, time.perf_counter() - start),
+        }
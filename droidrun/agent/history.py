@@ -0,0 +1,208 @@
+"""
+History Buffer - Incrementally rendered step history for the LLM prompt.
+"""
+
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+class HistoryEntry:
+    """A rendered step in a HistoryBuffer."""
+
+    __slots__ = ("step_type", "text", "tokens", "compactor", "compacted", "evicted", "attached")
+
+    def __init__(
+        self,
+        step_type: str,
+        text: str,
+        tokens: int,
+        compactor: Optional[Callable[["HistoryEntry"], str]] = None
+    ):
+        self.step_type = step_type
+        self.text = text
+        self.tokens = tokens
+        self.compactor = compactor
+        self.compacted = False
+        self.evicted = False
+        # Compactable steps that extend this one and are compacted with it
+        self.attached: List["HistoryEntry"] = []
+
+class HistoryBuffer:
+    """Rendered agent steps with a running token total.
+
+    Each step is rendered to prompt text and counted once, when it is
+    appended. Trimming to a token budget evicts the oldest steps from the
+    front of a deque, so building a prompt costs the same at step 100 as at
+    step 1.
+
+    Steps appended with a compactor (UI observations) are kept in full only
+    while they are among the most recent ones; older ones are replaced in
+    place by the compactor's digest, which keeps the prompt size per step
+    near-constant. Steps that extend another one (UI diffs against a full
+    observation) are attached to it and compacted together with it.
+    """
+
+    def __init__(self, count_tokens: Callable[[str], int], keep_full: int = 1):
+        """Initialize an empty buffer.
+
+        Args:
+            count_tokens: Function returning the number of tokens in a string
+            keep_full: Number of most recent compactable steps kept in full
+        """
+        self._count_tokens = count_tokens
+        self.keep_full = keep_full
+        self._entries: Deque[HistoryEntry] = deque()
+        self._full: Deque[HistoryEntry] = deque()
+        self._rendered: Optional[str] = None
+        self._revision: Optional[int] = None
+        self.total_tokens = 0
+        self.evicted = 0
+        self.compacted = 0
+
+    @classmethod
+    def from_steps(
+        cls,
+        steps: Iterable[Dict[str, Any]],
+        count_tokens: Callable[[str], int]
+    ) -> "HistoryBuffer":
+        """Build a buffer from step dictionaries (as produced by ReActStep.to_dict).
+
+        Args:
+            steps: Steps with 'type' and 'content'
+            count_tokens: Function returning the number of tokens in a string
+
+        Returns:
+            A new buffer containing the steps
+        """
+        buffer = cls(count_tokens)
+        for step in steps:
+            buffer.append(step.get("type", ""), step.get("content", ""))
+        return buffer
+
+    @staticmethod
+    def _render(step_type: str, content: Any) -> str:
+        return f"{step_type.upper()}: {content}\n"
+
+    def append(
+        self,
+        step_type: str,
+        content: Any,
+        compactor: Optional[Callable[[HistoryEntry], str]] = None,
+        attach_to: Optional[HistoryEntry] = None
+    ) -> HistoryEntry:
+        """Render and append a step.
+
+        Args:
+            step_type: Step type, e.g. 'thought'
+            content: Step content
+            compactor: Called with the entry once the step is no longer among
+                       the most recent compactable ones; returns the compact
+                       content replacing the full one
+            attach_to: Compactable entry this step extends; the step is kept
+                       in full as long as that entry, and compacted with it
+
+        Returns:
+            The history entry of the step
+        """
+        text = self._render(step_type, content)
+        entry = HistoryEntry(step_type, text, self._count_tokens(text), compactor)
+        self._entries.append(entry)
+        self.total_tokens += entry.tokens
+        self._rendered = None
+
+        if compactor is not None and attach_to is not None:
+            attach_to.attached.append(entry)
+            if attach_to.compacted or attach_to.evicted:
+                self._compact(entry)
+        elif compactor is not None:
+            self._full.append(entry)
+            while len(self._full) > self.keep_full:
+                old = self._full.popleft()
+                self._compact(old)
+                for attached in old.attached:
+                    self._compact(attached)
+        return entry
+
+    def _compact(self, entry: HistoryEntry) -> None:
+        """Replace a step by its compactor's digest."""
+        if entry.evicted or entry.compacted:
+            return
+        self.replace(entry, entry.compactor(entry))
+        entry.compacted = True
+        self.compacted += 1
+
+    def replace(self, entry: HistoryEntry, content: Any) -> None:
+        """Replace the content of a step still in the buffer.
+
+        Args:
+            entry: Entry returned by append()
+            content: New step content
+        """
+        if entry.evicted:
+            return
+        text = self._render(entry.step_type, content)
+        tokens = self._count_tokens(text)
+        self.total_tokens += tokens - entry.tokens
+        entry.text = text
+        entry.tokens = tokens
+        self._rendered = None
+
+    def recount(self, revision: Optional[int] = None) -> None:
+        """Count the tokens of all kept steps again.
+
+        Needed when the token counter's scale changed (see
+        TokenCounter.revision); otherwise trim() would compare counts made
+        at different scales.
+
+        Args:
+            revision: Counter revision the counts are made at; if it is the
+                      one of the last recount, nothing is done
+        """
+        if revision is not None and revision == self._revision:
+            return
+        self._revision = revision
+        total = 0
+        for entry in self._entries:
+            entry.tokens = self._count_tokens(entry.text)
+            total += entry.tokens
+        self.total_tokens = total
+
+    def trim(self, token_budget: int) -> int:
+        """Evict the oldest steps until the buffer fits the token budget.
+
+        Args:
+            token_budget: Maximum number of tokens to keep
+
+        Returns:
+            Number of steps evicted by this call
+        """
+        evicted = 0
+        while self._entries and self.total_tokens > token_budget:
+            entry = self._entries.popleft()
+            entry.evicted = True
+            self.total_tokens -= entry.tokens
+            evicted += 1
+        if evicted:
+            self.evicted += evicted
+            self._rendered = None
+        return evicted
+
+    @property
+    def last(self) -> Optional[HistoryEntry]:
+        """The most recently appended step still in the buffer."""
+        return self._entries[-1] if self._entries else None
+
+    def render(self) -> str:
+        """Get the prompt text of all kept steps, oldest first."""
+        if self._rendered is None:
+            self._rendered = "".join(entry.text for entry in self._entries)
+        return self._rendered
+
+    def texts(self) -> List[str]:
+        """Get the rendered text of each kept step, oldest first."""
+        return [entry.text for entry in self._entries]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return bool(self._entries) or self.evicted > 0
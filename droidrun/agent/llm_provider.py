@@ -4,8 +4,56 @@ Base interface for LLM providers.
 This module defines the abstract base class that all LLM providers must implement.
 """
 
+import os
+import asyncio
+import weakref
+import contextlib
 from abc import ABC, abstractmethod
-from typing import Dict, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
+
+# Async SDK clients and concurrency limits, per event loop. Async HTTP
+# clients cannot be shared across event loops, but within one loop a single
+# client (and its connection pool) serves every provider and agent.
+_client_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, Any]]" = weakref.WeakKeyDictionary()
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+
+def get_pooled_client(factory: Callable[..., Any], **options: Any) -> Any:
+    """Get a shared async client for the running event loop.
+    
+    Clients are keyed by factory and options (API key, base URL, ...), so
+    providers with the same configuration reuse one HTTP connection pool.
+    
+    Args:
+        factory: Client class, e.g. openai.AsyncOpenAI
+        **options: Keyword arguments for the client
+    
+    Returns:
+        The pooled client
+    """
+    pool = _client_pools.setdefault(asyncio.get_running_loop(), {})
+    key = (factory, tuple(sorted(options.items())))
+    client = pool.get(key)
+    if client is None:
+        client = factory(**options)
+        pool[key] = client
+    return client
+
+def get_concurrency_limit(key: Tuple, limit: int) -> asyncio.Semaphore:
+    """Get the shared semaphore limiting in-flight requests for a key.
+    
+    Args:
+        key: Identifies the limited resource (provider, base URL)
+        limit: Maximum number of concurrent requests
+    
+    Returns:
+        Semaphore for the running event loop
+    """
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+    semaphore = semaphores.get((key, limit))
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(limit)
+        semaphores[(key, limit)] = semaphore
+    return semaphore
 
 class LLMProvider(ABC):
     """Abstract base class for LLM providers."""
@@ -17,7 +65,8 @@ class LLMProvider(ABC):
         temperature: float = 0.2,
         max_tokens: int = 2000,
         vision: bool = False,
-        base_url: Optional[str] = None
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None
     ):
         """Initialize the LLM provider.
         
@@ -28,6 +77,9 @@ class LLMProvider(ABC):
             max_tokens: Maximum tokens to generate
             vision: Whether vision capabilities are enabled
             base_url: Optional base URL for the API
+            max_concurrency: Maximum in-flight requests to this provider across
+                             all agents in the process (defaults to
+                             DROIDRUN_LLM_MAX_CONCURRENCY; unlimited if unset)
         """
         self.model_name = model_name
         self.api_key = api_key
@@ -35,6 +87,13 @@ class LLMProvider(ABC):
         self.max_tokens = max_tokens
         self.vision = vision
         self.base_url = base_url
+        if max_concurrency is None and os.environ.get("DROIDRUN_LLM_MAX_CONCURRENCY"):
+            max_concurrency = int(os.environ["DROIDRUN_LLM_MAX_CONCURRENCY"])
+        self.max_concurrency = max_concurrency
+        
+        # Async client class and its options, set by _initialize_client
+        self._client_factory: Optional[Callable[..., Any]] = None
+        self._client_options: Dict[str, Any] = {}
         
         # Token usage tracking
         self.total_prompt_tokens = 0
@@ -42,6 +101,10 @@ class LLMProvider(ABC):
         self.total_tokens = 0
         self.api_calls = 0
         
+        # Prompt caching: tokens read from and written to the provider's cache
+        self.total_cached_tokens = 0
+        self.total_cache_write_tokens = 0
+        
         # Initialize the client
         self._initialize_client()
     
@@ -50,6 +113,20 @@ class LLMProvider(ABC):
         """Initialize the API client for this provider."""
         pass
     
+    @property
+    def client(self) -> Any:
+        """Async API client, shared with other providers using the same options."""
+        if self._client_factory is None:
+            raise RuntimeError(f"{type(self).__name__} has no client configured")
+        return get_pooled_client(self._client_factory, **self._client_options)
+    
+    def request_slot(self) -> Any:
+        """Async context manager holding one of the provider's concurrency slots."""
+        if not self.max_concurrency:
+            return contextlib.nullcontext()
+        key = (type(self).__name__, self._client_options.get("base_url"))
+        return get_concurrency_limit(key, self.max_concurrency)
+    
     @abstractmethod
     async def generate_response(
         self,
@@ -69,6 +146,60 @@ class LLMProvider(ABC):
         """
         pass
     
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> AsyncIterator[str]:
+        """Generate a response, yielding text chunks as they arrive.
+        
+        Providers whose API supports streaming override this; the default
+        yields the complete response as a single chunk.
+        
+        Args:
+            system_prompt: System prompt string
+            user_prompt: User prompt string
+            screenshot_data: Optional bytes containing the latest screenshot
+        
+        Yields:
+            Chunks of the generated response
+        """
+        yield await self.generate_response(system_prompt, user_prompt, screenshot_data)
+    
+    @staticmethod
+    def image_media_type(image_data: bytes) -> str:
+        """Detect the MIME type of screenshot data from its magic bytes.
+        
+        Args:
+            image_data: Encoded image bytes
+        
+        Returns:
+            MIME type such as 'image/jpeg'
+        """
+        if image_data.startswith(b"\x89PNG"):
+            return "image/png"
+        if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+            return "image/webp"
+        return "image/jpeg"
+    
+    @staticmethod
+    def cached_prompt_tokens(usage: Any) -> int:
+        """Get the prompt tokens served from cache from OpenAI-style usage.
+        
+        Args:
+            usage: Usage object of a chat completion
+        
+        Returns:
+            Number of cached prompt tokens (0 if not reported)
+        """
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None)
+        if cached is None:
+            # DeepSeek reports cache hits separately
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        return cached or 0
+    
     def get_token_usage_stats(self) -> Dict[str, int]:
         """Get current token usage statistics.
         
@@ -79,17 +210,29 @@ class LLMProvider(ABC):
             "prompt_tokens": self.total_prompt_tokens,
             "completion_tokens": self.total_completion_tokens,
             "total_tokens": self.total_tokens,
-            "api_calls": self.api_calls
+            "api_calls": self.api_calls,
+            "cached_tokens": self.total_cached_tokens,
+            "cache_write_tokens": self.total_cache_write_tokens
         }
     
-    def update_token_usage(self, prompt_tokens: int, completion_tokens: int) -> None:
+    def update_token_usage(
+        self,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cached_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> None:
         """Update token usage statistics.
         
         Args:
-            prompt_tokens: Number of prompt tokens used
+            prompt_tokens: Number of prompt tokens used (including cached ones)
             completion_tokens: Number of completion tokens used
+            cached_tokens: Number of prompt tokens read from the provider's cache
+            cache_write_tokens: Number of prompt tokens written to the provider's cache
         """
         self.total_prompt_tokens += prompt_tokens
         self.total_completion_tokens += completion_tokens
         self.total_tokens += prompt_tokens + completion_tokens
+        self.total_cached_tokens += cached_tokens
+        self.total_cache_write_tokens += cache_write_tokens
         self.api_calls += 1 
\ No newline at end of file
@@ -6,21 +6,20 @@ This module handles the integration with LLM providers to generate reasoning ste
 
 import json
 import re
+import time
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-from .providers import (
-    OpenAIProvider,
-    AnthropicProvider,
-    GeminiProvider,
-    DeepSeekProvider,
-    OllamaProvider
-)
+from .providers import get_provider_class
+from .stream_parser import ActionStreamParser
+from .history import HistoryBuffer
+from .tokens import TokenCounter, get_token_counter
 
 # Set up logger
 logger = logging.getLogger("droidrun")
 
-# Simple token estimator (very rough approximation)
+# Simple token estimator (very rough approximation, kept for compatibility;
+# the reasoner counts with its provider's TokenCounter)
 def estimate_tokens(text: str) -> int:
     """Estimate number of tokens in a string.
     
@@ -48,12 +47,16 @@ class LLMReasoner:
         temperature: float = 0.2,
         max_tokens: int = 2000,
         vision: bool = False,
-        base_url: Optional[str] = None
+        base_url: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        stream: bool = False,
+        max_actions: int = 1
     ):
         """Initialize the LLM reasoner.
         
         Args:
-            llm_provider: LLM provider ('openai', 'anthropic', 'gemini', 'deepseek',or 'ollama').
+            llm_provider: LLM provider ('openai', 'anthropic', 'gemini', 'deepseek', 'ollama',
+                         or one added with providers.register_provider).
                          If model_name starts with 'gemini-', provider will be set to 'gemini' automatically.
             model_name: Model name to use
             api_key: API key for the LLM provider
@@ -61,24 +64,31 @@ class LLMReasoner:
             max_tokens: Maximum tokens to generate
             vision: Whether vision capabilities (screenshot) are enabled
             base_url: Optional base URL for the API (mainly used for Ollama)
+            max_concurrency: Maximum in-flight requests to the provider across all
+                             agents in the process (defaults to DROIDRUN_LLM_MAX_CONCURRENCY)
+            stream: Stream responses and report the action as soon as it is complete
+            max_actions: Maximum number of actions the model may plan per
+                         response (1 disables multi-action plans)
         """
         # Auto-detect Gemini models
         if model_name and model_name.startswith("gemini-"):
             llm_provider = "gemini"
             
         self.llm_provider = llm_provider.lower()
+        self.stream = stream
+        self.max_actions = max(1, max_actions)
         
-        # Initialize the appropriate provider
-        provider_class = {
-            "openai": OpenAIProvider,
-            "anthropic": AnthropicProvider,
-            "gemini": GeminiProvider,
-            "deepseek": DeepSeekProvider,
-            "ollama": OllamaProvider
-        }.get(self.llm_provider)
+        # Response timing (time-to-action is when action and parameters were known)
+        self.timing_stats: Dict[str, float] = {
+            "calls": 0,
+            "total_ms": 0.0,
+            "time_to_action_ms": 0.0,
+            "time_to_first_token_ms": 0.0,
+        }
+        self.last_timing: Dict[str, Optional[float]] = {}
         
-        if not provider_class:
-            raise ValueError(f"Unsupported LLM provider: {llm_provider}")
+        # Initialize the appropriate provider (imported on first use)
+        provider_class = get_provider_class(self.llm_provider)
         
         self.provider = provider_class(
             model_name=model_name,
@@ -86,31 +96,129 @@ class LLMReasoner:
             temperature=temperature,
             max_tokens=max_tokens,
             vision=vision,
-            base_url=base_url
+            base_url=base_url,
+            max_concurrency=max_concurrency
         )
+        
+        # Token counter used for history budgeting and usage estimates
+        self.token_counter: TokenCounter = get_token_counter(self.llm_provider, self.provider.model_name)
+        self.estimated_prompt_tokens = 0
+        self.estimated_completion_tokens = 0
+        self._last_user_prompt_tokens = 0
+        
+        # System prompts by (tool set, vision, streaming, plan length); they never
+        # change within a run, which keeps them byte-identical for prompt caching
+        self._system_prompts: Dict[Tuple[Tuple[str, ...], bool, bool, int], str] = {}
+    
+    def count_tokens(self, text: str) -> int:
+        """Count the tokens of a string with the provider's token counter.
+        
+        Args:
+            text: Input text
+        
+        Returns:
+            Number of tokens
+        """
+        return self.token_counter.count(text)
     
     def get_token_usage_stats(self) -> Dict[str, int]:
         """Get current token usage statistics.
         
         Returns:
-            Dictionary with token usage statistics
+            Dictionary with token usage statistics reported by the provider,
+            plus 'estimated_tokens' counted locally (used when the provider
+            reports no usage)
+        """
+        stats = self.provider.get_token_usage_stats()
+        stats["estimated_tokens"] = self.estimated_prompt_tokens + self.estimated_completion_tokens
+        return stats
+    
+    def get_timing_stats(self) -> Dict[str, float]:
+        """Get average response timings.
+        
+        Returns:
+            Dictionary with the number of calls and the average total time,
+            time-to-action and time-to-first-token in milliseconds
+        """
+        calls = self.timing_stats["calls"]
+        if not calls:
+            return {"calls": 0}
+        return {
+            "calls": calls,
+            "avg_total_ms": self.timing_stats["total_ms"] / calls,
+            "avg_time_to_action_ms": self.timing_stats["time_to_action_ms"] / calls,
+            "avg_time_to_first_token_ms": self.timing_stats["time_to_first_token_ms"] / calls,
+        }
+    
+    def _record_timing(
+        self,
+        start: float,
+        first_token: Optional[float] = None,
+        action_ready: Optional[float] = None
+    ) -> None:
+        """Record the timings of one LLM call (perf_counter timestamps)."""
+        end = time.perf_counter()
+        first_token = first_token or end
+        action_ready = action_ready or end
+        self.last_timing = {
+            "total_ms": (end - start) * 1000,
+            "time_to_action_ms": (action_ready - start) * 1000,
+            "time_to_first_token_ms": (first_token - start) * 1000,
+        }
+        self.timing_stats["calls"] += 1
+        for key, value in self.last_timing.items():
+            self.timing_stats[key] += value
+    
+    async def _stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes],
+        on_action: Optional[Callable[[str, Dict[str, Any]], None]],
+        start: float
+    ) -> str:
+        """Stream a response, reporting the action as soon as it is complete.
+        
+        Returns:
+            The complete response text
         """
-        return self.provider.get_token_usage_stats()
+        parser = ActionStreamParser()
+        chunks = []
+        first_token = None
+        action_ready = None
+        async for chunk in self.provider.stream_response(system_prompt, user_prompt, screenshot_data):
+            if first_token is None:
+                first_token = time.perf_counter()
+            chunks.append(chunk)
+            if action_ready is not None:
+                continue
+            fields = parser.feed(chunk)
+            if parser.has("action", "parameters") and isinstance(fields["parameters"], dict):
+                action_ready = time.perf_counter()
+                logger.debug(f"Action ready after {(action_ready - start) * 1000:.0f} ms: {fields['action']}")
+                if on_action is not None:
+                    on_action(fields["action"], fields["parameters"])
+        self._record_timing(start, first_token, action_ready)
+        return "".join(chunks)
     
     async def reason(
         self,
         goal: str,
-        history: List[Dict[str, Any]],
+        history: Union[HistoryBuffer, List[Dict[str, Any]]],
         available_tools: Optional[List[str]] = None,
-        screenshot_data: Optional[bytes] = None
+        screenshot_data: Optional[bytes] = None,
+        on_action: Optional[Callable[[str, Dict[str, Any]], None]] = None
     ) -> Dict[str, Any]:
         """Generate a reasoning step using the LLM.
         
         Args:
             goal: The automation goal
-            history: List of previous steps as dictionaries
+            history: History buffer, or list of previous steps as dictionaries
             available_tools: Optional list of available tool names
             screenshot_data: Optional bytes containing the latest screenshot
+            on_action: Called with (action, parameters) as soon as both are
+                       complete, while the rest of the response may still be
+                       streaming (only in streaming mode)
         
         Returns:
             Dictionary with next reasoning step, including thought,
@@ -123,13 +231,35 @@ class LLMReasoner:
         system_prompt = self._create_system_prompt(available_tools)
         user_prompt = self._create_user_prompt(goal, history)
         
+        prompt_tokens = self.count_tokens(system_prompt) + self._last_user_prompt_tokens
+        reported_before = self.provider.total_prompt_tokens
+        
         try:
             # Call the provider
-            response = await self.provider.generate_response(
-                system_prompt,
-                user_prompt,
-                screenshot_data
-            )
+            start = time.perf_counter()
+            if self.stream:
+                response = await self._stream_response(
+                    system_prompt,
+                    user_prompt,
+                    screenshot_data,
+                    on_action,
+                    start
+                )
+            else:
+                response = await self.provider.generate_response(
+                    system_prompt,
+                    user_prompt,
+                    screenshot_data
+                )
+                self._record_timing(start)
+            
+            # Track locally counted usage, and calibrate the counter against
+            # the provider's count (screenshots make prompts incomparable)
+            self.estimated_prompt_tokens += prompt_tokens
+            self.estimated_completion_tokens += self.count_tokens(response)
+            reported = self.provider.total_prompt_tokens - reported_before
+            if reported > 0 and not screenshot_data:
+                self.token_counter.calibrate(prompt_tokens, reported)
             
             # Parse the response
             result = self._parse_response(response)
@@ -149,7 +279,23 @@ class LLMReasoner:
             }
     
     def _create_system_prompt(self, available_tools: Optional[List[str]] = None) -> str:
-        """Create the system prompt for the LLM.
+        """Get the system prompt for the LLM, building it once per tool set.
+        
+        Args:
+            available_tools: Optional list of available tool names
+        
+        Returns:
+            System prompt string
+        """
+        key = (tuple(available_tools or ()), self.provider.vision, self.stream, self.max_actions)
+        prompt = self._system_prompts.get(key)
+        if prompt is None:
+            prompt = self._build_system_prompt(available_tools)
+            self._system_prompts[key] = prompt
+        return prompt
+    
+    def _build_system_prompt(self, available_tools: Optional[List[str]] = None) -> str:
+        """Build the system prompt for the LLM.
         
         Args:
             available_tools: Optional list of available tool names
@@ -169,7 +315,7 @@ class LLMReasoner:
         - thought: Your detailed reasoning about the current state and what to do next
         - action: The name of the tool to execute (use EXACT tool name without any parentheses)
         - parameters: A dictionary of parameters to pass to the tool
-
+        {field_order}
         IMPORTANT: When specifying the action field:
         - Never add parentheses to the tool name
         - Common mistakes to avoid:
@@ -180,6 +326,23 @@ class LLMReasoner:
         1. You can get all UI elements to get a better understanding of the current screen including all texts container on the screen. Use this to to analyze the current ui context.
         2. If you want to take action, after you analyzed the context, you can get all the clickable elements for your next interactive step. Only use this tool if you know about your current ui context.
 
+        """
+        if self.stream:
+            # The action can start as soon as action and parameters are streamed
+            prompt = prompt.replace(
+                "{field_order}",
+                "Write the fields in this order: action, parameters, thought.\n"
+            )
+        else:
+            prompt = prompt.replace("{field_order}", "")
+        
+        if self.max_actions > 1:
+            prompt += f"""
+        When you are sure of several consecutive steps on the current screen (e.g. filling in a form),
+        return them at once instead of action and parameters:
+        - actions: An ordered list of up to {self.max_actions} objects with action and parameters
+        They run one after another; the rest is skipped if the screen changes unexpectedly.
+        Nothing after get_clickables, take_screenshot, list_packages or complete is run, so end the list there.
         """
         
         # Add vision-specific instructions if vision is enabled
@@ -206,7 +369,7 @@ class LLMReasoner:
             
             "list_packages": "list_packages(include_system_apps: bool = False) - List installed packages on the device, returns detailed package information",
             
-            "get_clickables": "get_clickables() - Get only the clickable UI elements from the device screen. Returns a dictionary containing interactive elements with their properties",
+            "get_clickables": "get_clickables() - Get only the clickable UI elements from the device screen. Returns one line per element: index (* = tappable), class, text and center coordinates, indented under its parent. If the screen layout did not change, returns only the added (+), removed (-) and changed (~) elements since the previous call",
 
             "complete": "complete(result: str) - IMPORTANT: This tool should ONLY be called after you have ACTUALLY completed all necessary actions for the goal. It does not perform any actions itself - it only signals that you have already achieved the goal through other actions. Include a summary of what was accomplished as the result parameter.",
         }
@@ -231,68 +394,58 @@ class LLMReasoner:
     def _create_user_prompt(
         self,
         goal: str,
-        history: List[Dict[str, Any]],
+        history: Union[HistoryBuffer, List[Dict[str, Any]]],
     ) -> str:
         """Create the user prompt for the LLM.
         
         Args:
             goal: The automation goal
-            history: List of previous steps
+            history: History buffer, or list of previous steps
         
         Returns:
             User prompt string
         """
         prompt = f"Goal: {goal}\n\n"
+        prompt_tokens = self.count_tokens(prompt)
+        
+        if not isinstance(history, HistoryBuffer):
+            history = HistoryBuffer.from_steps(history, self.count_tokens)
         
         # Add truncated history if available
         if history:
-            # Start with a budget for tokens (very rough approximation)
+            # Start with a budget for tokens
             total_budget = 100000  # Conservative limit to leave room for response
             
-            # Estimate tokens for the goal and other parts
-            goal_tokens = estimate_tokens(goal) * 2  # Account for repetition
+            # Count tokens for the goal and other parts
+            goal_tokens = self.count_tokens(goal) * 2  # Account for repetition
             
-            # Calculate remaining budget for history
-            history_budget = total_budget - goal_tokens
-            
-            # Start with most recent history and work backwards
-            truncated_history = []
-            current_size = 0
-            
-            # Copy and reverse history to process most recent first
-            reversed_history = list(reversed(history))
-            
-            for step in reversed_history:
-                step_type = step.get("type", "").upper()
-                content = step.get("content", "")
-                step_text = f"{step_type}: {content}\n"
-                step_tokens = estimate_tokens(step_text)
-                
-                # If this step would exceed our budget, stop adding
-                if current_size + step_tokens > history_budget:
-                    # Add a note about truncation
-                    truncated_history.insert(0, "... (earlier history truncated)")
-                    break
-                
-                # Otherwise, add this step and update our current size
-                truncated_history.insert(0, step_text)
-                current_size += step_tokens
+            # Drop the oldest steps that no longer fit the remaining budget,
+            # with all steps counted at the counter's current calibration
+            history.recount(self.token_counter.revision)
+            history.trim(total_budget - goal_tokens)
             
             # Add the truncated history to the prompt
-            prompt += "History:\n"
-            for step_text in truncated_history:
-                prompt += step_text
+            header = "History:\n"
+            if history.evicted:
+                header += "... (earlier history truncated)"
+            prompt += header
+            prompt += history.render()
             prompt += "\n"
+            prompt_tokens += self.count_tokens(header) + history.total_tokens + 1
         
-        prompt += "Based on the current state, what's your next action? Return your response in JSON format."
+        instructions = "Based on the current state, what's your next action? Return your response in JSON format."
+        prompt += instructions
+        prompt_tokens += self.count_tokens(instructions)
+        self._last_user_prompt_tokens = prompt_tokens
         
         # Final sanity check - if prompt is still too large, truncate aggressively
-        if estimate_tokens(prompt) > 100000:
+        if prompt_tokens > 100000:
             logger.warning("Prompt still too large after normal truncation. Applying emergency truncation.")
             # Keep the beginning (goal) and end (instructions) but truncate the middle
             beginning = prompt[:2000]  # Keep goal
             end = prompt[-1000:]       # Keep final instructions
             prompt = beginning + "\n... (content truncated to fit token limits) ...\n" + end
+            self._last_user_prompt_tokens = self.count_tokens(prompt)
         
         return prompt
     
@@ -312,6 +465,11 @@ class LLMReasoner:
             # Ensure required fields are present
             if "thought" not in data:
                 data["thought"] = "No thought provided"
+            actions = data.get("actions")
+            if "action" not in data and isinstance(actions, list) and actions and isinstance(actions[0], dict):
+                # Multi-action plan, the first action doubles as the action
+                data["action"] = actions[0].get("action", "no_action")
+                data["parameters"] = actions[0].get("parameters", {})
             if "action" not in data:
                 data["action"] = "no_action"
             if "parameters" not in data:
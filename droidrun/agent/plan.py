@@ -0,0 +1,83 @@
+"""
+Action Plans - Several actions per LLM turn.
+
+The model may answer with an ordered list of actions (e.g. tap a field, type,
+tap the next field, type, tap submit), which the agent runs back-to-back
+without an LLM call in between. Guards between the actions stop the plan
+when the screen no longer matches the one the plan was made for.
+"""
+
+from typing import Any, Dict, List, Optional
+
+# Actions whose result the model has to see before deciding on anything else;
+# a plan ends with the first of them
+PLAN_BREAK_ACTIONS = frozenset({"get_clickables", "take_screenshot", "list_packages", "complete"})
+
+def parse_plan(reasoning_result: Dict[str, Any], max_actions: int = 1) -> List[Dict[str, Any]]:
+    """Get the ordered actions of a reasoning result.
+
+    Args:
+        reasoning_result: Parsed LLM response with 'action' and 'parameters',
+                          and optionally 'actions' (a list of objects with
+                          'action' and 'parameters')
+        max_actions: Maximum number of actions to keep
+
+    Returns:
+        List of {"action", "parameters"} dictionaries, at most max_actions
+        long and ending at the first action in PLAN_BREAK_ACTIONS
+    """
+    plan = []
+    actions = reasoning_result.get("actions")
+    if max_actions > 1 and isinstance(actions, list):
+        for item in actions:
+            if isinstance(item, dict) and item.get("action"):
+                parameters = item.get("parameters")
+                plan.append({
+                    "action": item["action"],
+                    "parameters": parameters if isinstance(parameters, dict) else {},
+                })
+    if not plan:
+        plan.append({
+            "action": reasoning_result.get("action", ""),
+            "parameters": reasoning_result.get("parameters", {}),
+        })
+
+    plan = plan[:max(1, max_actions)]
+    for position, item in enumerate(plan):
+        if item["action"] in PLAN_BREAK_ACTIONS:
+            return plan[:position + 1]
+    return plan
+
+def needs_guard(action: str, parameters: Dict[str, Any]) -> bool:
+    """Check whether an action refers to an element of the observed screen."""
+    return action == "tap" and "index" in parameters
+
+def check_element(
+    index: Any,
+    planned: Optional[Dict[str, Any]],
+    current: Optional[Dict[str, Any]]
+) -> Optional[str]:
+    """Check that an element is still the one the plan was made for.
+
+    The element must still exist at the same index with the same class,
+    resource id and bounds; its text may change (e.g. a field typed into).
+
+    Args:
+        index: Element index used by the action
+        planned: Element at the index in the observation the plan was made for
+        current: Element at the index on the current screen
+
+    Returns:
+        None if the element is unchanged, otherwise the reason it is not
+    """
+    if planned is None:
+        return None
+    if current is None:
+        return f"element {index} is no longer on the screen"
+    for field in ("className", "resourceId", "bounds"):
+        if planned.get(field) != current.get(field):
+            return (
+                f"element {index} changed ({field} {planned.get(field)!r} -> "
+                f"{current.get(field)!r})"
+            )
+    return None
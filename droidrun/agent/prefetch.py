@@ -0,0 +1,156 @@
+"""
+UI Prefetcher - Speculative capture of the next UI state.
+
+After an action that changes the screen, the agent almost always asks for
+the element tree (and a screenshot, with vision) next. The prefetcher
+captures them in the background while the LLM is still thinking, and hands
+them out when they are requested if the screen did not change since.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+# Actions after which the screen is captured ahead of time
+MUTATING_ACTIONS = frozenset({"tap", "swipe", "input_text", "press_key", "start_app"})
+
+class UIPrefetcher:
+    """Captures UI observations in the background after mutating actions.
+
+    Each capture takes a frame signature before and after the observations
+    and keeps them only if both match, so a screen that changed during the
+    capture is not stored under the new screen's signature. A prefetched
+    observation is only handed out if the signature of the screen is still
+    the same when it is requested (a hit); otherwise it is dropped and the
+    caller fetches a fresh one (a miss).
+
+    Captures must not change any state the caller relies on: an observation
+    that has side effects (like the element store behind get_clickables) is
+    captured detached, and its committer applies them when it is handed out.
+    """
+
+    def __init__(
+        self,
+        fetchers: Dict[str, Callable[[], Awaitable[Any]]],
+        signature: Callable[[], Awaitable[str]],
+        committers: Optional[Dict[str, Callable[[Any], Any]]] = None
+    ):
+        """Initialize the prefetcher.
+
+        Args:
+            fetchers: Coroutine functions capturing each observation, by tool
+                      name (e.g. 'get_clickables', 'take_screenshot')
+            signature: Coroutine function returning a signature of the
+                       current screen (e.g. Device.frame_signature)
+            committers: Functions applied to an observation when it is handed
+                        out, by tool name; they return the observation to use
+        """
+        self.fetchers = fetchers
+        self.signature = signature
+        self.committers = committers or {}
+        self._task: Optional[asyncio.Task] = None
+        self._results: Dict[str, Any] = {}
+        self._signature: Optional[str] = None
+        self._unsettled = False
+        self.stats: Dict[str, int] = {"prefetches": 0, "hits": 0, "misses": 0}
+
+    def schedule(self) -> None:
+        """Start capturing the observations, dropping any earlier capture."""
+        self.invalidate()
+        self.stats["prefetches"] += 1
+        self._task = asyncio.ensure_future(self._capture())
+
+    async def _capture(self) -> None:
+        before = await self.signature()
+        results = {}
+        for name, fetch in self.fetchers.items():
+            results[name] = await fetch()
+        after = await self.signature()
+        if before != after:
+            # The screen changed while capturing; the observations may mix both screens
+            self._unsettled = True
+            return
+        self._signature = after
+        self._results = results
+
+    def invalidate(self) -> None:
+        """Drop the pending capture and its results."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self._results = {}
+        self._signature = None
+        self._unsettled = False
+
+    async def cancel(self) -> None:
+        """Drop the pending capture and wait until it has stopped.
+
+        Called before an action, so a capture never reads the device while
+        the action changes it.
+        """
+        task = self._task
+        self.invalidate()
+        if task is not None:
+            try:
+                await task
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise
+            except Exception:
+                pass
+
+    async def take(self, name: str) -> Optional[Any]:
+        """Get a prefetched observation if the screen is unchanged.
+
+        Waits for a capture still in progress. Each observation is handed
+        out at most once.
+
+        Args:
+            name: Tool name of the observation
+
+        Returns:
+            The prefetched result, or None if there is none or it is stale
+        """
+        if self._task is None:
+            return None
+        try:
+            await self._task
+            if self._unsettled:
+                self.stats["misses"] += 1
+                self.invalidate()
+                return None
+            if name not in self._results:
+                return None
+            current = await self.signature()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Prefetch of {name} failed: {e}")
+            self.stats["misses"] += 1
+            self.invalidate()
+            return None
+
+        if current != self._signature:
+            self.stats["misses"] += 1
+            self.invalidate()
+            return None
+
+        self.stats["hits"] += 1
+        result = self._results.pop(name)
+        commit = self.committers.get(name)
+        return commit(result) if commit is not None else result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get prefetch statistics including the hit rate."""
+        requests = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / requests if requests else 0.0,
+        }
+
+    def close(self) -> None:
+        """Cancel any capture in progress."""
+        self.invalidate()
@@ -1,12 +1,116 @@
 """
 LLM providers package.
+
+Provider classes are looked up in a registry and imported on first use, so
+that importing droidrun does not load the openai and anthropic SDKs.
 """
 
-from .openai_provider import OpenAIProvider
-from .anthropic_provider import AnthropicProvider
-from .gemini_provider import GeminiProvider
-from .deepseek_provider import DeepSeekProvider
-from .ollama_provider import OllamaProvider
+import os
+import importlib
+from typing import Dict, Optional, Tuple, Type, Union
+
+# Registered providers: "module:Class" path (or the class itself) by name
+PROVIDERS: Dict[str, Union[str, type]] = {
+    'openai': 'droidrun.agent.providers.openai_provider:OpenAIProvider',
+    'anthropic': 'droidrun.agent.providers.anthropic_provider:AnthropicProvider',
+    'gemini': 'droidrun.agent.providers.gemini_provider:GeminiProvider',
+    'deepseek': 'droidrun.agent.providers.deepseek_provider:DeepSeekProvider',
+    'ollama': 'droidrun.agent.providers.ollama_provider:OllamaProvider',
+}
+
+# Environment variable holding the API key and default model of each provider
+PROVIDER_DEFAULTS = {
+    'openai': ('OPENAI_API_KEY', 'gpt-4o-mini'),
+    'anthropic': ('ANTHROPIC_API_KEY', 'claude-3-sonnet-20240229'),
+    'gemini': ('GEMINI_API_KEY', 'gemini-2.0-flash'),
+    'deepseek': ('DeepSeek_API_KEY', 'deepseek-chat'),
+    'ollama': (None, 'llama3.1:8b'),
+}
+
+def register_provider(
+    name: str,
+    provider: Union[str, type],
+    env_var: Optional[str] = None,
+    default_model: Optional[str] = None
+) -> None:
+    """Register an LLM provider under a name.
+
+    Args:
+        name: Provider name used in LLMReasoner(llm_provider=...)
+        provider: LLMProvider subclass, or its "module:Class" path to import
+                  on first use
+        env_var: Environment variable holding the API key (None if the
+                 provider needs no key)
+        default_model: Model used when none is given
+    """
+    name = name.lower()
+    PROVIDERS[name] = provider
+    PROVIDER_DEFAULTS[name] = (env_var, default_model)
+
+def get_provider_class(name: str) -> Type:
+    """Get the class of a registered provider, importing it if needed.
+
+    Raises:
+        ValueError: If no provider is registered under the name
+    """
+    provider = PROVIDERS.get(name.lower())
+    if provider is None:
+        raise ValueError(f"Unsupported LLM provider: {name}")
+    if isinstance(provider, str):
+        module_name, _, class_name = provider.partition(":")
+        provider = PROVIDERS[name.lower()] = getattr(importlib.import_module(module_name), class_name)
+    return provider
+
+def resolve_provider_settings(
+    provider: str,
+    model: Optional[str] = None,
+    api_key: Optional[str] = None,
+    base_url: Optional[str] = None
+) -> Tuple[str, str, Optional[str], Optional[str]]:
+    """Fill in the default model, API key and base URL of a provider.
+
+    Args:
+        provider: Provider name (switched to 'gemini' for 'gemini-' models)
+        model: Model name (defaults to the provider's default model)
+        api_key: API key (defaults to the provider's environment variable)
+        base_url: Base URL of the API
+
+    Returns:
+        Tuple of (provider, model, api_key, base_url)
+
+    Raises:
+        ValueError: If the provider is unsupported or has no API key
+    """
+    # Auto-detect Gemini if model starts with "gemini-"
+    if model and model.startswith("gemini-"):
+        provider = "gemini"
+    provider = provider.lower()
+    if provider not in PROVIDER_DEFAULTS:
+        raise ValueError(f"Unsupported provider: {provider}")
+
+    env_var, default_model = PROVIDER_DEFAULTS[provider]
+    if provider == 'ollama':
+        api_key = "ollama"
+        base_url = base_url or "http://localhost:11434/v1"
+    elif env_var:
+        api_key = api_key or os.environ.get(env_var)
+        if not api_key:
+            raise ValueError(f"{env_var} environment variable not set")
+    return provider, model or default_model, api_key, base_url
+
+# Provider classes that can still be imported from this package
+_CLASS_NAMES = {
+    'OpenAIProvider': 'openai',
+    'AnthropicProvider': 'anthropic',
+    'GeminiProvider': 'gemini',
+    'DeepSeekProvider': 'deepseek',
+    'OllamaProvider': 'ollama',
+}
+
+def __getattr__(name: str):
+    if name in _CLASS_NAMES:
+        return get_provider_class(_CLASS_NAMES[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = [
     'OpenAIProvider',
@@ -14,4 +118,9 @@ __all__ = [
     'GeminiProvider',
     'DeepSeekProvider',
     'OllamaProvider',
-] 
\ No newline at end of file
+    'PROVIDERS',
+    'PROVIDER_DEFAULTS',
+    'register_provider',
+    'get_provider_class',
+    'resolve_provider_settings',
+] 
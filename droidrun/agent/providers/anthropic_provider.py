@@ -3,10 +3,9 @@ Anthropic provider implementation.
 """
 
 import os
-import asyncio
 import base64
 import logging
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 import anthropic
 from ..llm_provider import LLMProvider
@@ -33,10 +32,77 @@ class AnthropicProvider(LLMProvider):
             raise ValueError(f"The selected model '{self.model_name}' does not support vision. "
                            "Please manually specify a Claude 3 model which supports vision capabilities.")
         
-        # Initialize client
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        # Async client, pooled and shared with other providers
+        self._client_factory = anthropic.AsyncAnthropic
+        self._client_options = {"api_key": self.api_key}
         logger.info(f"Initialized Anthropic client with model {self.model_name}")
     
+    @staticmethod
+    def _system_blocks(system_prompt: str) -> List[Dict[str, Any]]:
+        """Wrap the system prompt in a block marked for prompt caching.
+        
+        The system prompt only changes with the tool set, so it is written to
+        the cache once and read from it on later calls.
+        """
+        return [{
+            "type": "text",
+            "text": system_prompt,
+            "cache_control": {"type": "ephemeral"}
+        }]
+    
+    def _record_usage(self, usage: Any, output_tokens: Optional[int] = None) -> None:
+        """Update token usage from an Anthropic usage object.
+        
+        Args:
+            usage: Usage of a message
+            output_tokens: Output token count overriding the one in usage
+        """
+        cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        # input_tokens only counts the tokens after the last cache breakpoint
+        prompt_tokens = (getattr(usage, 'input_tokens', 0) or 0) + cache_read + cache_write
+        self.update_token_usage(
+            prompt_tokens,
+            output_tokens if output_tokens is not None else getattr(usage, 'output_tokens', 0) or 0,
+            cache_read,
+            cache_write
+        )
+    
+    def _build_messages(
+        self,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> List[Dict[str, Any]]:
+        """Build the messages for a request (the system prompt is passed separately)."""
+        messages = []
+
+        # Add the main user prompt first, so that the system prompt, goal and
+        # history form a stable prefix for provider prompt caching
+        messages.append({"role": "user", "content": user_prompt})
+
+        # Add screenshot if provided (after the prompt, it changes every step)
+        if screenshot_data:
+            base64_image = base64.b64encode(screenshot_data).decode('utf-8')
+            messages.append({
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": self.image_media_type(screenshot_data),
+                            "data": base64_image
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": "Here's the current screenshot of the device. Please analyze it to help with the next action."
+                    }
+                ]
+            })
+
+        return messages
+    
     async def generate_response(
         self,
         system_prompt: str,
@@ -45,53 +111,60 @@ class AnthropicProvider(LLMProvider):
     ) -> str:
         """Generate a response using Anthropic."""
         try:
-            messages = []
+            messages = self._build_messages(user_prompt, screenshot_data)
 
-            # Add screenshot if provided
-            if screenshot_data:
-                base64_image = base64.b64encode(screenshot_data).decode('utf-8')
-                messages.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "image/jpeg",
-                                "data": base64_image
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": "Here's the current screenshot of the device. Please analyze it to help with the next action."
-                        }
-                    ]
-                })
-
-            # Add the main user prompt
-            messages.append({"role": "user", "content": user_prompt})
-
-            response = await asyncio.to_thread(
-                self.client.messages.create,
-                model=self.model_name,
-                system=system_prompt,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
+            async with self.request_slot():
+                response = await self.client.messages.create(
+                    model=self.model_name,
+                    system=self._system_blocks(system_prompt),
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
             
             # Update token usage statistics if available
-            # Note: Anthropic might not provide token usage info in the same way
-            # This is a placeholder for when/if they add this feature
             if hasattr(response, 'usage'):
-                usage = response.usage
-                self.update_token_usage(
-                    getattr(usage, 'prompt_tokens', 0),
-                    getattr(usage, 'completion_tokens', 0)
-                )
+                self._record_usage(response.usage)
             
             return response.content[0].text
             
         except Exception as e:
             logger.error(f"Error calling Anthropic API: {e}")
-            raise 
\ No newline at end of file
+            raise
+    
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> AsyncIterator[str]:
+        """Stream a response from Anthropic."""
+        messages = self._build_messages(user_prompt, screenshot_data)
+        usage = None
+        output_tokens = 0
+        try:
+            async with self.request_slot():
+                stream = await self.client.messages.create(
+                    model=self.model_name,
+                    system=self._system_blocks(system_prompt),
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True
+                )
+                async for event in stream:
+                    if event.type == "message_start":
+                        usage = event.message.usage
+                    elif event.type == "message_delta":
+                        output_tokens = getattr(event.usage, 'output_tokens', 0) or 0
+                    elif event.type == "content_block_delta" and getattr(event.delta, 'text', None):
+                        yield event.delta.text
+        except Exception as e:
+            logger.error(f"Error streaming from Anthropic API: {e}")
+            raise
+        finally:
+            if usage is not None:
+                # The final output token count arrives in message_delta
+                self._record_usage(usage, output_tokens)
+            else:
+                self.update_token_usage(0, output_tokens)
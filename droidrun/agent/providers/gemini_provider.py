@@ -3,12 +3,11 @@ Gemini provider implementation.
 """
 
 import os
-import asyncio
 import base64
 import logging
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 from ..llm_provider import LLMProvider
 
 # Set up logger
@@ -28,13 +27,50 @@ class GeminiProvider(LLMProvider):
         if not self.model_name:
             self.model_name = "gemini-2.0-flash"
         
-        # Initialize client with Gemini configuration
-        self.client = OpenAI(
-            api_key=self.api_key,
-            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-        )
+        # Async client with Gemini configuration, pooled and shared with other providers
+        self._client_factory = AsyncOpenAI
+        self._client_options = {
+            "api_key": self.api_key,
+            "base_url": "https://generativelanguage.googleapis.com/v1beta/openai/"
+        }
         logger.info(f"Initialized Gemini client with model {self.model_name}")
     
+    def _build_messages(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> List[Dict[str, Any]]:
+        """Build the chat messages for a request."""
+        messages = [
+            {"role": "system", "content": system_prompt},
+        ]
+
+        # Add the main user prompt first, so that the system prompt, goal and
+        # history form a stable prefix for provider prompt caching
+        messages.append({"role": "user", "content": user_prompt})
+
+        # Add screenshot if provided (after the prompt, it changes every step)
+        if screenshot_data:
+            base64_image = base64.b64encode(screenshot_data).decode('utf-8')
+            messages.append({
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": "Here's the current screenshot of the device. Please analyze it to help with the next action."
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{self.image_media_type(screenshot_data)};base64,{base64_image}"
+                        }
+                    }
+                ]
+            })
+
+        return messages
+    
     async def generate_response(
         self,
         system_prompt: str,
@@ -43,49 +79,29 @@ class GeminiProvider(LLMProvider):
     ) -> str:
         """Generate a response using Gemini."""
         try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-            ]
-
-            # Add screenshot if provided
-            if screenshot_data:
-                base64_image = base64.b64encode(screenshot_data).decode('utf-8')
-                messages.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Here's the current screenshot of the device. Please analyze it to help with the next action."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
-                        }
-                    ]
-                })
+            messages = self._build_messages(system_prompt, user_prompt, screenshot_data)
 
-            # Add the main user prompt
-            messages.append({"role": "user", "content": user_prompt})
-
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=self.model_name,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
-            )
+            async with self.request_slot():
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    response_format={"type": "json_object"}
+                )
             
             # Update token usage statistics
             usage = response.usage
-            self.update_token_usage(usage.prompt_tokens, usage.completion_tokens)
+            self.update_token_usage(
+                usage.prompt_tokens,
+                usage.completion_tokens,
+                self.cached_prompt_tokens(usage)
+            )
             
             # Log token usage
             logger.info("===== Token Usage Statistics =====")
             logger.info(f"API Call #{self.api_calls}")
-            logger.info(f"This call: {usage.prompt_tokens} prompt + {usage.completion_tokens} completion = {usage.total_tokens} tokens")
+            logger.info(f"This call: {usage.prompt_tokens} prompt ({self.cached_prompt_tokens(usage)} cached) + {usage.completion_tokens} completion = {usage.total_tokens} tokens")
             logger.info(f"Cumulative: {self.get_token_usage_stats()}")
             logger.info("=================================")
             
@@ -93,4 +109,38 @@ class GeminiProvider(LLMProvider):
             
         except Exception as e:
             logger.error(f"Error calling Gemini API: {e}")
-            raise 
\ No newline at end of file
+            raise
+    
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> AsyncIterator[str]:
+        """Stream a response from Gemini."""
+        messages = self._build_messages(system_prompt, user_prompt, screenshot_data)
+        usage = None
+        try:
+            async with self.request_slot():
+                stream = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    response_format={"type": "json_object"},
+                    stream=True
+                )
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.error(f"Error streaming from Gemini API: {e}")
+            raise
+        finally:
+            self.update_token_usage(
+                getattr(usage, 'prompt_tokens', 0) or 0,
+                getattr(usage, 'completion_tokens', 0) or 0,
+                self.cached_prompt_tokens(usage)
+            )
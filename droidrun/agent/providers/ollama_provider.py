@@ -2,11 +2,10 @@
 Ollama provider implementation.
 """
 
-import asyncio
 import logging
-from typing import Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI
 from ..llm_provider import LLMProvider
 
 # Set up logger
@@ -29,13 +28,32 @@ class OllamaProvider(LLMProvider):
         if not self.base_url.endswith('/v1'):
             self.base_url += "/v1"
         
-        # Initialize client with Ollama configuration
-        self.client = OpenAI(
-            api_key="ollama",  # Ollama doesn't need an API key
-            base_url=self.base_url
-        )
+        # Async client with Ollama configuration, pooled and shared with other providers
+        self._client_factory = AsyncOpenAI
+        self._client_options = {"api_key": "ollama", "base_url": self.base_url}  # Ollama doesn't need an API key
         logger.info(f"Initialized Ollama client with model {self.model_name} at {self.base_url}")
     
+    def _build_messages(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> List[Dict[str, Any]]:
+        """Build the chat messages for a request."""
+        messages = [
+            {"role": "system", "content": system_prompt},
+        ]
+
+        # Add the main user prompt first, so that the system prompt, goal and
+        # history form a stable prefix for provider prompt caching
+        messages.append({"role": "user", "content": user_prompt})
+
+        # Add screenshot if provided (after the prompt, it changes every step)
+        if screenshot_data:
+            logger.warning("Ollama does not support image inputs. Ignoring screenshot data.")
+
+        return messages
+    
     async def generate_response(
         self,
         system_prompt: str,
@@ -44,25 +62,16 @@ class OllamaProvider(LLMProvider):
     ) -> str:
         """Generate a response using Ollama."""
         try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-            ]
-
-            # Add screenshot if provided
-            if screenshot_data:
-                logger.warning("Ollama does not support image inputs. Ignoring screenshot data.")
+            messages = self._build_messages(system_prompt, user_prompt, screenshot_data)
 
-            # Add the main user prompt
-            messages.append({"role": "user", "content": user_prompt})
-
-            response = await asyncio.to_thread(
-                self.client.chat.completions.create,
-                model=self.model_name,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                response_format={"type": "json_object"}
-            )
+            async with self.request_slot():
+                response = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    response_format={"type": "json_object"}
+                )
             
             # Update token usage statistics if available
             # Note: Ollama might not provide token usage info in the same way
@@ -77,4 +86,38 @@ class OllamaProvider(LLMProvider):
             
         except Exception as e:
             logger.error(f"Error calling Ollama API: {e}")
-            raise 
\ No newline at end of file
+            raise
+    
+    async def stream_response(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        screenshot_data: Optional[bytes] = None
+    ) -> AsyncIterator[str]:
+        """Stream a response from Ollama."""
+        messages = self._build_messages(system_prompt, user_prompt, screenshot_data)
+        usage = None
+        try:
+            async with self.request_slot():
+                stream = await self.client.chat.completions.create(
+                    model=self.model_name,
+                    messages=messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    response_format={"type": "json_object"},
+                    stream=True
+                )
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.error(f"Error streaming from Ollama API: {e}")
+            raise
+        finally:
+            self.update_token_usage(
+                getattr(usage, 'prompt_tokens', 0) or 0,
+                getattr(usage, 'completion_tokens', 0) or 0,
+                self.cached_prompt_tokens(usage)
+            )
@@ -6,9 +6,10 @@ reasoning about the current state and taking appropriate actions.
 """
 
 import time
+import asyncio
 import logging
 from enum import Enum
-from typing import Any, Dict, List, Optional, Callable
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
 
 # Import tools
 from droidrun.tools import (
@@ -26,9 +27,17 @@ from droidrun.tools import (
     complete,
     extract,
 )
+from droidrun.tools.actions import commit_clickables
+from droidrun.tools.ui_encoder import encode_elements
+from droidrun.tools.ui_diff import diff_screens, diff_size, encode_diff, screen_family
 
 # Import LLM reasoning
 from .llm_reasoning import LLMReasoner
+from .history import HistoryBuffer, HistoryEntry
+from .compaction import ui_digest, diff_digest, summarize_observation
+from .prefetch import MUTATING_ACTIONS, UIPrefetcher
+from .plan import check_element, needs_guard, parse_plan
+from .trajectory import OBSERVATION_ACTIONS, TrajectoryStore, element_signature
 
 # Set up logger
 logger = logging.getLogger("droidrun")
@@ -101,7 +110,20 @@ class ReActAgent:
         task: Optional[str] = None,
         llm: LLMReasoner = None,
         device_serial: Optional[str] = None,
-        max_steps: int = 100
+        max_steps: int = 100,
+        screenshot_max_dimension: Optional[int] = 1280,
+        screenshot_format: str = "JPEG",
+        keep_full_observations: int = 1,
+        summarizer: Optional[LLMReasoner] = None,
+        ui_diffs: bool = True,
+        max_diff_chain: int = 5,
+        max_diff_ratio: float = 0.5,
+        prefetch: bool = False,
+        wait_for_idle: bool = True,
+        plan_guards: bool = True,
+        trajectory_store: Optional[TrajectoryStore] = None,
+        print_report: bool = True,
+        on_step: Optional[Callable[[ReActStep], None]] = None
     ):
         """Initialize the ReAct agent.
         
@@ -110,6 +132,36 @@ class ReActAgent:
             llm: Initialized LLMReasoner instance
             device_serial: Serial number of the Android device to control
             max_steps: Maximum number of steps to take
+            screenshot_max_dimension: Longest side of screenshots sent to the LLM
+                                      (None sends them at full device resolution)
+            screenshot_format: Screenshot format sent to the LLM ('JPEG', 'WEBP' or 'PNG')
+            keep_full_observations: Number of most recent UI observations kept in
+                                    full in the prompt history; older ones are
+                                    replaced by a compact digest
+            summarizer: Optional (cheaper) LLM that summarizes compacted UI
+                        observations in the background
+            ui_diffs: Report a get_clickables observation as a diff against
+                      the previous one when the screen layout is the same
+            max_diff_chain: Maximum number of diffs in a row before the full
+                            element list is sent again
+            max_diff_ratio: A diff is only sent if it reports at most this
+                            fraction of the screen's elements
+            prefetch: Capture the element tree (and screenshot, with vision)
+                      in the background after each mutating action, while
+                      the LLM decides on the next step
+            wait_for_idle: Before reading the UI after an action, wait until
+                           the screen stops changing (see Device.wait_for_idle)
+            plan_guards: When the LLM plans several actions in one response
+                         (see LLMReasoner max_actions), check before each tap
+                         that its element is unchanged and skip the rest of
+                         the plan otherwise
+            trajectory_store: Store of successful runs; a stored run of the
+                              same goal on the same device model and app
+                              versions is replayed without the LLM while its
+                              screens match, and successful runs are stored
+            print_report: Print the token usage and performance report when
+                          the goal is completed
+            on_step: Called with every step as soon as it is added
         """
         if llm is None:
             raise ValueError("LLMReasoner instance is required")
@@ -120,12 +172,67 @@ class ReActAgent:
         self.reasoner = llm
         self.use_llm = True
         
-        # Initialize steps list
+        # Initialize steps list and its rendered prompt history
         self.steps: List[ReActStep] = []
+        self.history = HistoryBuffer(llm.count_tokens, keep_full=keep_full_observations)
+        
+        # UI observation compaction
+        self.summarizer = summarizer
+        self._current_screen: Optional[Dict[str, Any]] = None
+        
+        # Summaries and early-dispatched actions running in the background
+        self._background_tasks: Set[asyncio.Task] = set()
+        
+        # Elements of the last get_clickables call, and encoded screen sizes
+        self._last_clickables: Optional[List[Dict[str, Any]]] = None
+        # Element store generation of the screen the LLM's indices refer to
+        self._generation: Optional[int] = None
+        self.observation_stats: Dict[str, int] = {"screens": 0, "tokens": 0, "diffs": 0}
+        
+        # Screen diffing: elements of the previous observation and the
+        # number of diffs sent since the last full one
+        self.ui_diffs = ui_diffs
+        self.max_diff_chain = max_diff_chain
+        self.max_diff_ratio = max_diff_ratio
+        self._previous_clickables: Optional[List[Dict[str, Any]]] = None
+        self._diff_chain = 0
+        self._last_observation_is_diff = False
+        
+        # Speculative UI capture, created once the device is known
+        self.prefetch = prefetch
+        self.prefetcher: Optional[UIPrefetcher] = None
+        
+        # Waits for the screen to settle before UI observations
+        self.wait_for_idle = wait_for_idle
+        self.idle_stats: Dict[str, float] = {"waits": 0, "timeouts": 0, "total_ms": 0.0}
+        
+        # Multi-action plans: LLM calls, actions run and plans cut short
+        self.plan_guards = plan_guards
+        self.plan_stats: Dict[str, int] = {"llm_calls": 0, "actions": 0, "aborted": 0}
+        
+        # Trajectory cache: actions of this run, whether the last UI
+        # observation is still current, and the outcome of a replay
+        self.trajectory_store = trajectory_store
+        self._trajectory: List[Dict[str, Any]] = []
+        self._screen_fresh = False
+        self.replay_stats: Dict[str, Any] = {}
+        
+        # Outcome of the run (with the complete tool's summary) and the duration of each step in seconds
+        self.print_report = print_report
+        self.goal_achieved = False
+        self.result: Optional[str] = None
+        self.step_times: List[float] = []
+        self.on_step = on_step
         
         # Initialize screenshot storage
         self._last_screenshot: Optional[bytes] = None
         
+        # Defaults injected into tools that accept them
+        self.tool_defaults: Dict[str, Any] = {
+            "max_dimension": screenshot_max_dimension,
+            "image_format": screenshot_format,
+        }
+        
         # Configure logging
         logging.basicConfig(level=logging.INFO)
         
@@ -205,12 +312,17 @@ class ReActAgent:
         self, 
         step_type: ReActStepType, 
         content: str,
+        compactor: Optional[Callable[[HistoryEntry], str]] = None,
+        attach_to: Optional[HistoryEntry] = None,
     ) -> ReActStep:
         """Add a step to the agent's reasoning process.
         
         Args:
             step_type: Type of step
             content: Content of the step
+            compactor: Produces the compact history text of the step once it
+                       is no longer recent (see HistoryBuffer.append)
+            attach_to: History entry the step extends and is compacted with
         
         Returns:
             The created ReActStep
@@ -218,14 +330,94 @@ class ReActAgent:
         # Create the step
         step = ReActStep(step_type, content)
         
-        # Add to steps list
+        # Add to steps list and render it once for the prompt history
         self.steps.append(step)
+        self.history.append(step.step_type.value, step.content, compactor, attach_to)
         
         # Log the step
         logger.info(str(step))
+        if self.on_step is not None:
+            self.on_step(step)
         
         return step
     
+    def get_tokens_per_screen(self) -> float:
+        """Get the average number of tokens of an encoded get_clickables observation."""
+        screens = self.observation_stats["screens"]
+        return self.observation_stats["tokens"] / screens if screens else 0.0
+    
+    def _compact_screen(self, screen: Dict[str, Any], entry: HistoryEntry) -> str:
+        """Compact an old UI observation to its digest (see HistoryBuffer)."""
+        digest = ui_digest(screen["elements"], screen["tapped"])
+        if self.summarizer is not None:
+            # Replace the digest with a model summary once it is ready
+            self._start_background(self._summarize_screen(entry, screen["content"], digest))
+        return digest
+    
+    def _start_background(self, coroutine: Awaitable[Any]) -> asyncio.Task:
+        """Run a coroutine as a task that stop_background_tasks cancels."""
+        task = asyncio.ensure_future(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+    
+    async def _summarize_screen(self, entry: HistoryEntry, content: str, digest: str) -> None:
+        """Summarize a compacted UI observation and update its history entry."""
+        summary = await summarize_observation(self.summarizer, content, digest)
+        self.history.replace(entry, summary)
+    
+    def _encode_screen(
+        self,
+        message: str,
+        elements: List[Dict[str, Any]],
+        tappable_indices: Optional[List[int]]
+    ) -> str:
+        """Encode a get_clickables observation, as a diff when possible.
+        
+        A diff against the previous observation is sent when the screen has
+        the same layout family, the diff is small enough and fewer than
+        max_diff_chain diffs were sent since the last full observation (which
+        stays in full in the history while diffs are appended to it).
+        """
+        previous = self._previous_clickables
+        self._previous_clickables = elements
+        self._screen_fresh = True
+        self._last_observation_is_diff = False
+        
+        if self.ui_diffs and previous is not None and self._diff_chain < self.max_diff_chain:
+            diff = diff_screens(previous, elements)
+            if diff["same_family"] and diff_size(diff) <= self.max_diff_ratio * max(1, len(elements)):
+                self._diff_chain += 1
+                self._last_observation_is_diff = True
+                self.observation_stats["diffs"] += 1
+                return f"{message}\n{encode_diff(diff, tappable_indices)}"
+        
+        self._diff_chain = 0
+        return f"{message}\n{encode_elements(elements, tappable_indices)}"
+    
+    def _create_prefetcher(self) -> UIPrefetcher:
+        """Create a prefetcher capturing this agent's observations."""
+        serial = self.device_serial
+        
+        async def signature() -> str:
+            device = await self.device_manager.get_device(serial)
+            if not device:
+                raise ValueError(f"Device {serial} not found")
+            return await device.frame_signature()
+        
+        # The element tree is only stored for taps once the agent uses it
+        fetchers = {"get_clickables": lambda: get_clickables(
+            serial=serial, wait_for_idle=self.wait_for_idle, commit=False
+        )}
+        committers = {"get_clickables": lambda result: commit_clickables(serial, result)}
+        if "take_screenshot" in self.tools:
+            fetchers["take_screenshot"] = lambda: take_screenshot(
+                serial=serial,
+                max_dimension=self.tool_defaults["max_dimension"],
+                image_format=self.tool_defaults["image_format"]
+            )
+        return UIPrefetcher(fetchers, signature, committers)
+    
     async def execute_tool(self, tool_name: str, **kwargs) -> Any:
         """Execute a tool by name with the given arguments.
         
@@ -251,14 +443,38 @@ class ReActAgent:
         
         tool_func = self.tools[tool_name]
         
+        # Only calls with default arguments can use a prefetched observation
+        prefetched = None
+        if self.prefetcher is not None and not kwargs:
+            prefetched = await self.prefetcher.take(tool_name)
+        
         # Add serial number if needed and not provided
         sig = inspect.signature(tool_func)
         if 'serial' in sig.parameters and 'serial' not in kwargs:
             kwargs['serial'] = self.device_serial
+        for name, value in self.tool_defaults.items():
+            if name in sig.parameters and name not in kwargs:
+                kwargs[name] = value
+        # Taps by index are refused if the element store moved on to another screen
+        if 'generation' in sig.parameters and 'generation' not in kwargs:
+            kwargs['generation'] = self._generation
+        # Let the screen settle after an action before reading it
+        if tool_name == "get_clickables" and not self._screen_fresh and 'wait_for_idle' in sig.parameters:
+            kwargs.setdefault('wait_for_idle', self.wait_for_idle)
+            
+        # Stop a capture in progress before changing the screen
+        if tool_name in MUTATING_ACTIONS and self.prefetcher is not None:
+            await self.prefetcher.cancel()
             
         try:
             # Execute the tool and capture the result
-            result = await tool_func(**kwargs)
+            result = prefetched if prefetched is not None else await tool_func(**kwargs)
+            
+            # Capture the next screen while the LLM thinks about it
+            if tool_name in MUTATING_ACTIONS:
+                self._screen_fresh = False
+                if self.prefetcher is not None:
+                    self.prefetcher.schedule()
             
             # Special handling for formatted results
             if tool_name == "list_packages" and isinstance(result, dict):
@@ -269,17 +485,32 @@ class ReActAgent:
                 
                 return f"{message}\n{package_list}"
             elif tool_name == "get_clickables" and isinstance(result, dict):
-                # Format clickable elements for better readability
+                # Encode clickable elements as a compact outline for the LLM
                 message = result.get("message", "")
                 clickable = result.get("clickable_elements", [])
-                return clickable
+                self._last_clickables = clickable
+                self._generation = result.get("generation")
+                self._count_idle_wait(result)
+                encoded = self._encode_screen(message, clickable, result.get('tappable_indices'))
+                self.observation_stats["screens"] += 1
+                self.observation_stats["tokens"] += self.reasoner.count_tokens(encoded)
+                return encoded
                 
 
             elif tool_name == "take_screenshot" and isinstance(result, tuple) and len(result) >= 2:
                 # For screenshots, store the image data for the LLM and return the path
-                path, image_data = result
+                image_data = result[1]
+                info = result[2] if len(result) > 2 else {}
                 # Store the screenshot data for the next LLM call
                 self._last_screenshot = image_data
+                scale = info.get("scale", 1.0)
+                if scale != 1.0:
+                    return (
+                        f"Screenshot captured and available for analysis "
+                        f"({info['width']}x{info['height']}, downscaled from "
+                        f"{info['original_width']}x{info['original_height']}; divide screenshot "
+                        f"coordinates by {scale:.4f} to get device coordinates)"
+                    )
                 return f"Screenshot captured and available for analysis"
             else:
                 return result
@@ -288,6 +519,359 @@ class ReActAgent:
             logger.error(f"Error executing tool {tool_name}: {e}")
             return f"Error: {str(e)}"
     
+    def get_actions_per_call(self) -> float:
+        """Get the average number of actions run per LLM call."""
+        calls = self.plan_stats["llm_calls"]
+        return self.plan_stats["actions"] / calls if calls else 0.0
+    
+    def _count_idle_wait(self, result: Dict[str, Any]) -> None:
+        """Add the idle wait of a get_clickables result to the run's statistics."""
+        if result.get("idle") is None:
+            return
+        self.idle_stats["waits"] += 1
+        self.idle_stats["total_ms"] += result.get("idle_wait_ms", 0.0)
+        if not result["idle"]:
+            self.idle_stats["timeouts"] += 1
+    
+    async def _read_screen(self) -> Dict[str, Any]:
+        """Read the current screen for a check, using a prefetched one if still valid."""
+        result = None
+        if self.prefetcher is not None:
+            result = await self.prefetcher.take("get_clickables")
+        if result is None:
+            result = await get_clickables(serial=self.device_serial, wait_for_idle=self.wait_for_idle)
+        self._count_idle_wait(result)
+        return result
+    
+    def _observed_screen(self) -> Optional[List[Dict[str, Any]]]:
+        """Get the elements of the last UI observation if it is still current."""
+        return self._previous_clickables if self._screen_fresh else None
+    
+    async def _execute_plan(
+        self,
+        plan: List[Dict[str, Any]],
+        screen: Optional[List[Dict[str, Any]]] = None
+    ) -> bool:
+        """Run the actions planned in one LLM turn back-to-back.
+        
+        Before each tap by index after the first action, the target element
+        is checked against the observation the plan was made for; if it
+        changed, the rest of the plan is skipped.
+        
+        Args:
+            plan: Actions from parse_plan; the first may carry the 'task'
+                  already started while streaming
+            screen: Current UI observation when the plan was requested (the
+                    early-started first action may already have run since)
+        
+        Returns:
+            True if the complete tool was called
+        """
+        self.plan_stats["llm_calls"] += 1
+        planned_screen = {element.get('index'): element for element in self._previous_clickables or []}
+        
+        for position, item in enumerate(plan):
+            action, parameters = item["action"], item["parameters"]
+            if position:
+                screen = self._observed_screen()
+            if position and self.plan_guards and planned_screen and needs_guard(action, parameters):
+                reason = await self._check_plan_guard(planned_screen, parameters["index"])
+                if reason:
+                    self.plan_stats["aborted"] += 1
+                    await self.add_step(
+                        ReActStepType.OBSERVATION,
+                        f"Skipped the remaining {len(plan) - position} planned action(s): "
+                        f"the screen changed unexpectedly ({reason})"
+                    )
+                    return False
+            
+            self.plan_stats["actions"] += 1
+            if await self._perform_action(action, parameters, item.get("task"), screen=screen):
+                return True
+        return False
+    
+    async def _check_plan_guard(self, planned_screen: Dict[Any, Dict[str, Any]], index: Any) -> Optional[str]:
+        """Check that an element targeted by a planned tap is unchanged.
+        
+        Returns:
+            None if it is unchanged, otherwise the reason it is not
+        """
+        try:
+            result = await self._read_screen()
+        except Exception as e:
+            return f"could not read the screen: {e}"
+        current = {element.get('index'): element for element in result.get("clickable_elements", [])}
+        reason = check_element(index, planned_screen.get(index), current.get(index))
+        if reason is None:
+            # The element is unchanged, so the planned index holds on the screen just read
+            self._generation = result.get("generation")
+        return reason
+    
+    async def _perform_action(
+        self,
+        action: str,
+        parameters: Dict[str, Any],
+        task: Optional[asyncio.Future] = None,
+        record: bool = True,
+        screen: Optional[List[Dict[str, Any]]] = None
+    ) -> bool:
+        """Execute an action and record it and its observation.
+        
+        Args:
+            action: Tool name
+            parameters: Tool parameters
+            task: The action's execution if it was already started
+            record: Add the action to the trajectory of this run
+            screen: Elements of the current UI observation the action is
+                    taken on, if any (recorded with the action)
+        
+        Returns:
+            True if the complete tool was called
+        """
+        # Add action step
+        action_description = f"{action}({', '.join(f'{k}={v}' for k, v in parameters.items())})"
+        await self.add_step(ReActStepType.ACTION, action_description)
+        
+        # Execute the action if it's a valid tool
+        goal_achieved = False
+        result = "No action taken"
+        if action in self.tools:
+            try:
+                # Execute the tool, or wait for the one started early
+                if task is not None:
+                    result = await task
+                else:
+                    result = await self.execute_tool(action, **parameters)
+                
+                # Check if the complete tool was called
+                if action == "complete":
+                    goal_achieved = True
+                    self.result = str(result)
+                    if self.print_report:
+                        self._print_final_report(result)
+                
+                if isinstance(result, bytes):
+                    result = f"Binary data ({len(result)} bytes)"
+                elif isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], bytes):
+                    # For screenshot which returns (path, bytes)
+                    result = f"Screenshot saved to {result[0]} ({len(result[1])} bytes)"
+            except Exception as e:
+                result = f"Error: {str(e)}"
+        else:
+            result = f"Invalid action: {action}"
+        
+        # UI observations are compacted once a newer one arrives;
+        # taps on the current screen are recorded in its digest.
+        # Diffs extend the current screen, which stays in full,
+        # and are compacted together with it.
+        compactor = None
+        attach_to = None
+        observation = None
+        if action == "get_clickables" and self._last_clickables is not None and self._last_observation_is_diff:
+            if self._current_screen is not None:
+                self._current_screen["elements"] = self._last_clickables
+                attach_to = self._current_screen.get("entry")
+            self._last_clickables = None
+            compactor = lambda entry, content=str(result): diff_digest(content)
+        elif action == "get_clickables" and self._last_clickables is not None:
+            observation = {"elements": self._last_clickables, "tapped": [], "content": str(result)}
+            self._last_clickables = None
+            self._current_screen = observation
+            compactor = lambda entry, observation=observation: self._compact_screen(observation, entry)
+        elif action == "tap" and self._current_screen is not None and "index" in parameters:
+            self._current_screen["tapped"].append(parameters["index"])
+        
+        if record:
+            self._record_action(action, parameters, result, screen)
+        
+        # Add the observation step with the result
+        await self.add_step(
+            ReActStepType.OBSERVATION,
+            str(result),
+            compactor,
+            attach_to
+        )
+        if observation is not None:
+            observation["entry"] = self.history.last
+        return goal_achieved
+    
+    def _record_action(
+        self,
+        action: str,
+        parameters: Dict[str, Any],
+        result: Any,
+        screen: Optional[List[Dict[str, Any]]]
+    ) -> None:
+        """Add an executed action to the trajectory of this run.
+        
+        Observations and failed actions are left out. Actions taken on a
+        current UI observation keep its screen family, and taps the tapped
+        element, so a replay can check it is on the same screen.
+        """
+        if self.trajectory_store is None or action in OBSERVATION_ACTIONS or str(result).startswith("Error"):
+            return
+        item: Dict[str, Any] = {"action": action, "parameters": dict(parameters)}
+        if screen is not None:
+            item["screen"] = screen_family(screen)
+            if needs_guard(action, parameters):
+                for element in screen:
+                    if element.get('index') == parameters["index"]:
+                        item["element"] = element_signature(element)
+                        break
+        self._trajectory.append(item)
+    
+    async def _device_model(self) -> str:
+        """Get the model of the agent's device."""
+        device = await self.device_manager.get_device(self.device_serial)
+        if not device:
+            raise ValueError(f"Device {self.device_serial} not found")
+        return await device.model
+    
+    async def _package_version(self, package: str) -> str:
+        """Get the version of a package installed on the agent's device."""
+        device = await self.device_manager.get_device(self.device_serial)
+        if not device:
+            raise ValueError(f"Device {self.device_serial} not found")
+        return await device.get_package_version(package)
+    
+    async def _check_replay_screen(self, item: Dict[str, Any]) -> Optional[str]:
+        """Check that the screen matches the one a cached action was taken on.
+        
+        Returns:
+            None if it matches, otherwise the reason it does not
+        """
+        try:
+            result = await self._read_screen()
+        except Exception as e:
+            return f"could not read the screen: {e}"
+        elements = result.get("clickable_elements", [])
+        
+        if screen_family(elements) != item["screen"]:
+            return f"the screen before {item['action']} has a different layout"
+        if "element" in item:
+            index = item["parameters"].get("index")
+            current = next((element for element in elements if element.get('index') == index), None)
+            reason = check_element(index, item["element"], current)
+            if reason is None and current.get('text') != item["element"].get('text'):
+                reason = f"element {index} has a different text"
+            if reason:
+                return reason
+        # The replayed action's index refers to the screen just read
+        self._generation = result.get("generation")
+        return None
+    
+    async def _replay_trajectory(self, trajectory: Dict[str, Any]) -> bool:
+        """Replay a cached trajectory until it completes or diverges.
+        
+        Every action is checked against the screen it was recorded on; the
+        replay stops at the first action recorded without one.
+        
+        Returns:
+            True if the goal was achieved by the replay
+        """
+        actions = trajectory["actions"]
+        start = time.perf_counter()
+        reason = None
+        
+        def update_stats(replayed: int, completed: bool) -> None:
+            # The recorded run took this long for the replayed share of actions
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            saved_ms = trajectory.get("duration_ms", 0.0) * replayed / max(1, len(actions)) - elapsed_ms
+            self.replay_stats = {
+                "replayed": replayed,
+                "total": len(actions),
+                "completed": completed,
+                "replay_ms": elapsed_ms,
+                "saved_ms": max(0.0, saved_ms),
+            }
+        
+        update_stats(0, False)
+        for item in actions:
+            if "screen" not in item:
+                reason = f"{item['action']} was taken without looking at the screen"
+                break
+            reason = await self._check_replay_screen(item)
+            if reason:
+                break
+            self._trajectory.append(item)
+            # Counted before running, so that the final report includes it
+            update_stats(self.replay_stats["replayed"] + 1, item["action"] == "complete")
+            if await self._perform_action(item["action"], item.get("parameters", {}), record=False):
+                break
+            if self.steps[-1].content.startswith("Error"):
+                reason = f"{item['action']} failed"
+                break
+        
+        replayed, completed = self.replay_stats["replayed"], self.replay_stats["completed"]
+        update_stats(replayed, completed)
+        self.trajectory_store.record_replay(completed, self.replay_stats["saved_ms"])
+        
+        if completed:
+            logger.info(f"Replayed all {replayed} cached actions in {self.replay_stats['replay_ms']:.0f}ms")
+        else:
+            await self.add_step(
+                ReActStepType.OBSERVATION,
+                f"Replayed {replayed} of {len(actions)} actions from an earlier successful run, "
+                f"then stopped: {reason or 'the cached actions ended'}. Continue from the current screen."
+            )
+        return completed
+    
+    def _print_final_report(self, result: Any) -> None:
+        """Print token usage, cost and performance statistics of the run."""
+        # Get token usage stats
+        stats = self.reasoner.get_token_usage_stats()
+        total_tokens = stats['total_tokens']
+        estimated = not total_tokens
+        if estimated:
+            # The provider reported no usage, use the local count
+            total_tokens = stats['estimated_tokens']
+        cost = (total_tokens / 1_000_000) * 0.10  # $0.10 per 1M tokens
+        
+        print("\n===== Final Token Usage and Cost =====")
+        print(f"Total Tokens Used: {total_tokens:,}{' (estimated)' if estimated else ''}")
+        print(f"Total API Calls: {stats['api_calls']}")
+        if stats.get('cached_tokens'):
+            print(f"Cached Prompt Tokens: {stats['cached_tokens']:,}")
+        if self.observation_stats["screens"]:
+            print(f"Avg Tokens per Screen: {self.get_tokens_per_screen():.0f}")
+        if self.prefetcher is not None and self.prefetcher.stats["prefetches"]:
+            prefetch = self.prefetcher.get_stats()
+            print(
+                f"Prefetch Hits: {prefetch['hits']}/{prefetch['hits'] + prefetch['misses']} "
+                f"({prefetch['hit_rate']:.0%})"
+            )
+        if self.idle_stats["waits"]:
+            print(
+                f"UI Idle Waits: {self.idle_stats['waits']:.0f} "
+                f"(avg {self.idle_stats['total_ms'] / self.idle_stats['waits']:.0f} ms, "
+                f"{self.idle_stats['timeouts']:.0f} still changing)"
+            )
+        if self.observation_stats["diffs"]:
+            print(f"Screens Sent as Diffs: {self.observation_stats['diffs']}/{self.observation_stats['screens']}")
+        if self.plan_stats["llm_calls"]:
+            print(f"Actions per LLM Call: {self.get_actions_per_call():.2f}")
+        if self.replay_stats:
+            print(
+                f"Trajectory Replay: {self.replay_stats['replayed']}/{self.replay_stats['total']} cached actions, "
+                f"~{self.replay_stats['saved_ms'] / 1000:.1f}s saved"
+            )
+        print(f"Estimated Cost: ${cost:.4f}")
+        timing = self.reasoner.get_timing_stats()
+        if timing.get("calls"):
+            print(f"Avg LLM Response Time: {timing['avg_total_ms']:.0f} ms")
+            print(f"Avg Time to Action: {timing['avg_time_to_action_ms']:.0f} ms")
+        print("===================================\n")
+        
+        print(f"Summary: {result}")
+    
+    def stop_background_tasks(self) -> None:
+        """Stop the background prefetches, summaries and early-dispatched actions of the run."""
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+        for task in list(self._background_tasks):
+            task.cancel()
+        self._background_tasks.clear()
+    
     async def run(self) -> List[ReActStep]:
         """Run the ReAct agent to achieve the goal.
         
@@ -305,111 +889,133 @@ class ReActAgent:
             )
             return self.steps
         
-        # Add initial goal step
-        await self.add_step(ReActStepType.GOAL, self.goal)
+        try:
+            if self.prefetch and self.prefetcher is None:
+                self.prefetcher = self._create_prefetcher()
         
-        # Continue with ReAct loop
-        step_count = 0
-        goal_achieved = False
+            # Add initial goal step
+            await self.add_step(ReActStepType.GOAL, self.goal)
+        
+            # Continue with ReAct loop
+            step_count = 0
+            goal_achieved = False
         
-        while step_count < self.max_steps and not goal_achieved:
-            # Generate next step using LLM reasoning
-            if self.use_llm and self.reasoner:
+            # Replay a stored run of the same goal first
+            run_start = time.perf_counter()
+            device_model = None
+            if self.trajectory_store is not None:
                 try:
-                    # Convert steps to dictionaries for the LLM
-                    history = [step.to_dict() for step in self.steps]
+                    device_model = await self._device_model()
+                    trajectory = await self.trajectory_store.lookup(self.goal, device_model, self._package_version)
+                    if trajectory is not None:
+                        goal_achieved = await self._replay_trajectory(trajectory)
+                except Exception as e:
+                    logger.warning(f"Trajectory replay failed, continuing with the LLM: {e}")
+        
+            while step_count < self.max_steps and not goal_achieved:
+                step_start = time.perf_counter()
+                # Generate next step using LLM reasoning
+                if self.use_llm and self.reasoner:
+                    try:
+                        # Get available tool names
+                        available_tools = list(self.tools.keys())
                     
-                    # Get available tool names
-                    available_tools = list(self.tools.keys())
+                        # When streaming, start the action as soon as it is known
+                        # and let the rest of the thought stream in meanwhile
+                        dispatched: Dict[str, Any] = {}
                     
-                    # Get LLM reasoning, passing the last screenshot if available
-                    reasoning_result = await self.reasoner.reason(
-                        goal=self.goal,
-                        history=history,
-                        available_tools=available_tools,
-                        screenshot_data=self._last_screenshot
-                    )
+                        def dispatch(
+                            action: str,
+                            parameters: Dict[str, Any],
+                            dispatched: Dict[str, Any] = dispatched
+                        ) -> None:
+                            if action in self.tools and not dispatched:
+                                dispatched["action"] = action
+                                dispatched["parameters"] = parameters
+                                dispatched["task"] = self._start_background(
+                                    self.execute_tool(action, **parameters)
+                                )
                     
-                    # Clear the screenshot after using it
-                    self._last_screenshot = None
+                        # Screen the first action is taken on; an action started early
+                        # may mark it stale before the plan is executed
+                        screen = self._observed_screen()
                     
-                    # Extract thought, action, and parameters
-                    thought = reasoning_result.get("thought", "")
-                    action = reasoning_result.get("action", "")
-                    parameters = reasoning_result.get("parameters", {})
+                        # Get LLM reasoning, passing the last screenshot if available
+                        reasoning_result = await self.reasoner.reason(
+                            goal=self.goal,
+                            history=self.history,
+                            available_tools=available_tools,
+                            screenshot_data=self._last_screenshot,
+                            on_action=dispatch
+                        )
                     
-                    # Add thought step
-                    thought_step = await self.add_step(
-                        ReActStepType.THOUGHT, 
-                        thought,
-                    )
+                        # Clear the screenshot after using it
+                        self._last_screenshot = None
                     
-                    # Add action step
-                    action_description = f"{action}({', '.join(f'{k}={v}' for k, v in parameters.items())})"
-                    await self.add_step(ReActStepType.ACTION, action_description)
+                        # Extract thought and the planned actions
+                        thought = reasoning_result.get("thought", "")
+                        plan = parse_plan(reasoning_result, self.reasoner.max_actions)
+                        if dispatched:
+                            # The action already running is the one recorded
+                            plan[0] = {
+                                "action": dispatched["action"],
+                                "parameters": dispatched["parameters"],
+                                "task": dispatched["task"],
+                            }
                     
-                    # Execute the action if it's a valid tool
-                    result = "No action taken"
-                    if action in self.tools:
-                        try:
-                            # Execute the tool
-                            result = await self.execute_tool(action, **parameters)
-                            
-                            # Check if the complete tool was called
-                            if action == "complete":
-                                goal_achieved = True
-                                # Get token usage stats
-                                stats = self.reasoner.get_token_usage_stats()
-                                total_tokens = stats['total_tokens']
-                                cost = (total_tokens / 1_000_000) * 0.10  # $0.10 per 1M tokens
-                                
-                                print("\n===== Final Token Usage and Cost =====")
-                                print(f"Total Tokens Used: {total_tokens:,}")
-                                print(f"Total API Calls: {stats['api_calls']}")
-                                print(f"Estimated Cost: ${cost:.4f}")
-                                print("===================================\n")
-
-                                print(f"Summary: {result}")
-                            
-                            if isinstance(result, bytes):
-                                result = f"Binary data ({len(result)} bytes)"
-                            elif isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], bytes):
-                                # For screenshot which returns (path, bytes)
-                                result = f"Screenshot saved to {result[0]} ({len(result[1])} bytes)"
-                        except Exception as e:
-                            result = f"Error: {str(e)}"
-                    else:
-                        result = f"Invalid action: {action}"
+                        # Add thought step
+                        thought_step = await self.add_step(
+                            ReActStepType.THOUGHT, 
+                            thought,
+                        )
                     
-                    # Add the observation step with the result
-                    await self.add_step(
-                        ReActStepType.OBSERVATION,
-                        str(result)
-                    )
+                        # Run the planned actions back-to-back
+                        if await self._execute_plan(plan, screen):
+                            goal_achieved = True
                     
-                    # Check if goal is achieved (let the LLM determine this)
-                    if "goal achieved" in thought.lower() or "goal complete" in thought.lower():
-                        goal_achieved = True
+                        # Check if goal is achieved (let the LLM determine this)
+                        if "goal achieved" in thought.lower() or "goal complete" in thought.lower():
+                            goal_achieved = True
                     
-                except Exception as e:
-                    logger.error(f"Error in LLM reasoning: {e}")
-                    await self.add_step(
-                        ReActStepType.OBSERVATION, 
-                        f"Error in LLM reasoning: {e}"
+                    except Exception as e:
+                        logger.error(f"Error in LLM reasoning: {e}")
+                        await self.add_step(
+                            ReActStepType.OBSERVATION, 
+                            f"Error in LLM reasoning: {e}"
+                        )
+                # Increment step count
+                step_count += 1
+                self.step_times.append(time.perf_counter() - step_start)
+        
+            # Store the run so that it can be replayed next time
+            replayed_all = self.replay_stats.get("completed", False)
+            if goal_achieved and device_model and self._trajectory and not replayed_all:
+                try:
+                    await self.trajectory_store.record(
+                        self.goal,
+                        device_model,
+                        self._trajectory,
+                        (time.perf_counter() - run_start) * 1000,
+                        self._package_version
                     )
-            # Increment step count
-            step_count += 1
-        
-        # Add final step if goal achieved
-        if goal_achieved:
-            await self.add_step(
-                ReActStepType.OBSERVATION, 
-                f"Goal achieved in {step_count} steps."
-            )
-        elif step_count >= self.max_steps:
-            await self.add_step(
-                ReActStepType.OBSERVATION, 
-                f"Maximum steps ({self.max_steps}) reached without achieving goal."
-            )
-        
-        return self.steps 
\ No newline at end of file
+                except Exception as e:
+                    logger.warning(f"Could not store the trajectory: {e}")
+        
+            # Add final step if goal achieved
+            if goal_achieved:
+                await self.add_step(
+                    ReActStepType.OBSERVATION, 
+                    f"Goal achieved in {step_count} steps."
+                )
+            elif step_count >= self.max_steps:
+                await self.add_step(
+                    ReActStepType.OBSERVATION, 
+                    f"Maximum steps ({self.max_steps}) reached without achieving goal."
+                )
+        
+            self.goal_achieved = goal_achieved
+            return self.steps
+        finally:
+            # Summaries and prefetches are only useful while the run goes on,
+            # also when the run is cancelled (e.g. by the fleet scheduler)
+            self.stop_background_tasks() 
\ No newline at end of file
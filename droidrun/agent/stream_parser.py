@@ -0,0 +1,125 @@
+"""
+Stream Parser - Incremental extraction of fields from a streamed JSON response.
+
+Lets the agent act on `action` and `parameters` as soon as they are complete,
+while the rest of the response is still being generated.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+class ActionStreamParser:
+    """Incremental parser for the top-level fields of a JSON object.
+
+    Text is fed chunk by chunk and every character is scanned once. Each
+    top-level value is decoded with json.loads as soon as its closing
+    character arrives, so a field is available before the object ends.
+    Anything before the first '{' (such as a ```json fence) is skipped.
+    """
+
+    def __init__(self):
+        """Initialize an empty parser."""
+        self.fields: Dict[str, Any] = {}
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._key_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self.done = False
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """Feed the next chunk of the response.
+
+        Args:
+            text: Newly received text
+
+        Returns:
+            All fields completed so far
+        """
+        self._buffer += text
+        buffer = self._buffer
+        pos = self._pos
+        while pos < len(buffer) and not self.done:
+            char = buffer[pos]
+
+            if self._depth == 0:
+                # Skip everything before the opening brace
+                if char == "{":
+                    self._depth = 1
+                pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._end_top_level_string(pos)
+                pos += 1
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = pos
+                    elif self._value_start is None:
+                        self._value_start = pos
+            elif char in "{[":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = pos
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    self._store(buffer[self._value_start:pos + 1])
+                elif self._depth == 0:
+                    # End of the object: flush a trailing number or literal
+                    self._flush_scalar(pos)
+                    self.done = True
+            elif self._depth == 1:
+                if char == ",":
+                    self._flush_scalar(pos)
+                elif (
+                    self._key is not None
+                    and self._value_start is None
+                    and char not in " \t\r\n:"
+                ):
+                    # Start of a number or literal
+                    self._value_start = pos
+            pos += 1
+        self._pos = pos
+        return self.fields
+
+    def _end_top_level_string(self, pos: int) -> None:
+        """Handle the closing quote of a key or string value at depth 1."""
+        if self._key is None and self._key_start is not None:
+            self._key = json.loads(self._buffer[self._key_start:pos + 1])
+            self._key_start = None
+        elif self._value_start is not None:
+            self._store(self._buffer[self._value_start:pos + 1])
+
+    def _flush_scalar(self, pos: int) -> None:
+        """Store a pending number or literal value ending before pos."""
+        if self._key is not None and self._value_start is not None:
+            self._store(self._buffer[self._value_start:pos].strip())
+
+    def _store(self, raw: str) -> None:
+        """Decode a complete value and store it under the current key."""
+        try:
+            self.fields[self._key] = json.loads(raw)
+        except json.JSONDecodeError:
+            # Leave malformed values to the full response parser
+            pass
+        self._key = None
+        self._value_start = None
+
+    def has(self, *names: str) -> bool:
+        """Check whether all the given fields are complete."""
+        return all(name in self.fields for name in names)
@@ -0,0 +1,250 @@
+"""
+Token Counting - Per-provider token counters for prompt budgeting and cost reports.
+
+A real BPE tokenizer (tiktoken) is used when it is installed and its
+encoding files are available offline; otherwise a heuristic that counts
+CJK characters separately from Latin text is used, calibrated against the
+token usage the provider reports.
+"""
+
+import os
+import re
+import math
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+# Han, kana, hangul and full-width forms: roughly one token per character or more
+CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+NON_ASCII_RE = re.compile(r"[^\x00-\x7f]")
+
+# Heuristic profiles: (ASCII characters per token, tokens per CJK character,
+# tokens per other non-ASCII character)
+HEURISTIC_PROFILES: Dict[str, Tuple[float, float, float]] = {
+    "default": (4.0, 1.3, 0.5),
+    "openai": (4.0, 1.0, 0.5),
+    "deepseek": (3.6, 0.7, 0.5),
+    "anthropic": (3.5, 1.4, 0.6),
+    "gemini": (4.0, 0.9, 0.5),
+    "ollama": (3.8, 1.3, 0.5),
+}
+
+# Where tiktoken downloads its encoding files from, by encoding name
+TIKTOKEN_FILES: Dict[str, str] = {
+    name: f"https://openaipublic.blob.core.windows.net/encodings/{file}.tiktoken"
+    for name, file in (
+        ("o200k_base", "o200k_base"),
+        ("o200k_harmony", "o200k_base"),
+        ("cl100k_base", "cl100k_base"),
+        ("p50k_base", "p50k_base"),
+        ("p50k_edit", "p50k_base"),
+        ("r50k_base", "r50k_base"),
+    )
+}
+
+class TokenCounter:
+    """Counts tokens in prompt text, caching the count of each string.
+
+    'revision' changes whenever calibration changes the counts, so that
+    counts kept elsewhere (see HistoryBuffer.recount) can be refreshed.
+    """
+
+    name = "base"
+
+    def __init__(self, cache_size: int = 4096):
+        """Initialize the counter.
+
+        Args:
+            cache_size: Number of distinct strings whose counts are cached
+        """
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+        self.revision = 0
+
+    def _count(self, text: str) -> int:
+        """Count the tokens of a string (uncached)."""
+        raise NotImplementedError
+
+    def count(self, text: str) -> int:
+        """Count the tokens of a string.
+
+        Args:
+            text: Input text
+
+        Returns:
+            Number of tokens
+        """
+        if not text:
+            return 0
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+        tokens = self._count(text)
+        self._cache[text] = tokens
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return tokens
+
+    __call__ = count
+
+    def calibrate(self, estimated: int, actual: int) -> None:
+        """Adjust to the token count the provider reported for an estimate.
+
+        Args:
+            estimated: Tokens counted for a request
+            actual: Tokens the provider billed for it
+        """
+
+class TiktokenCounter(TokenCounter):
+    """Exact counts from a tiktoken BPE encoding."""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding, cache_size: int = 4096):
+        """Initialize the counter.
+
+        Args:
+            encoding: tiktoken Encoding instance
+            cache_size: Number of distinct strings whose counts are cached
+        """
+        super().__init__(cache_size)
+        self.encoding = encoding
+
+    def _count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+class HeuristicCounter(TokenCounter):
+    """Character-class heuristic, scaled by the provider's reported usage."""
+
+    name = "heuristic"
+
+    def __init__(self, profile: Tuple[float, float, float] = HEURISTIC_PROFILES["default"], cache_size: int = 4096):
+        """Initialize the counter.
+
+        Args:
+            profile: (ASCII characters per token, tokens per CJK character,
+                     tokens per other non-ASCII character)
+            cache_size: Number of distinct strings whose counts are cached
+        """
+        super().__init__(cache_size)
+        self.chars_per_token, self.cjk_ratio, self.other_ratio = profile
+        self.scale = 1.0
+
+    def _raw_count(self, text: str) -> float:
+        """Unscaled estimate of the tokens in a string."""
+        non_ascii = len(NON_ASCII_RE.findall(text))
+        cjk = len(CJK_RE.findall(text)) if non_ascii else 0
+        ascii_chars = len(text) - non_ascii
+        return (
+            ascii_chars / self.chars_per_token
+            + cjk * self.cjk_ratio
+            + (non_ascii - cjk) * self.other_ratio
+        )
+
+    def _count(self, text: str) -> int:
+        return math.ceil(self._raw_count(text) * self.scale)
+
+    def calibrate(self, estimated: int, actual: int) -> None:
+        if estimated <= 0 or actual <= 0:
+            return
+        # Exponential moving average of the observed ratio, within sane limits
+        ratio = min(2.0, max(0.5, actual / estimated * self.scale))
+        scale = 0.8 * self.scale + 0.2 * ratio
+        if abs(scale - self.scale) > 0.01:
+            self.scale = scale
+            self._cache.clear()
+            self.revision += 1
+
+def _tiktoken_cached(encoding_name: str) -> bool:
+    """Check whether tiktoken can load an encoding without downloading it.
+
+    tiktoken downloads missing encoding files with a blocking request and
+    no timeout, which can stall startup on an offline host. The download is
+    only allowed when DROIDRUN_TIKTOKEN_DOWNLOAD is set.
+    """
+    if os.environ.get("DROIDRUN_TIKTOKEN_DOWNLOAD", "").lower() in ("1", "true", "yes"):
+        return True
+    url = TIKTOKEN_FILES.get(encoding_name)
+    if url is None:
+        return False
+    # Same cache location and key as tiktoken.load.read_file_cached
+    cache_dir = os.environ.get(
+        "TIKTOKEN_CACHE_DIR",
+        os.environ.get("DATA_GYM_CACHE_DIR", os.path.join(tempfile.gettempdir(), "data-gym-cache"))
+    )
+    if not cache_dir:
+        return False
+    return os.path.exists(os.path.join(cache_dir, hashlib.sha1(url.encode()).hexdigest()))
+
+def _load_tiktoken(model_name: Optional[str]) -> Optional[TokenCounter]:
+    """Load a tiktoken counter for a model, or None if unavailable offline."""
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            encoding_name = tiktoken.encoding_name_for_model(model_name or "")
+        except KeyError:
+            encoding_name = "o200k_base"
+        if not _tiktoken_cached(encoding_name):
+            logger.debug(f"tiktoken encoding {encoding_name} is not cached, using heuristic counts")
+            return None
+        return TiktokenCounter(tiktoken.get_encoding(encoding_name))
+    except Exception as e:
+        logger.debug(f"tiktoken encoding unavailable, using heuristic counts: {e}")
+        return None
+
+def _openai_counter(model_name: Optional[str]) -> TokenCounter:
+    return _load_tiktoken(model_name) or HeuristicCounter(HEURISTIC_PROFILES["openai"])
+
+def _heuristic_factory(provider: str) -> Callable[[Optional[str]], TokenCounter]:
+    return lambda model_name: HeuristicCounter(HEURISTIC_PROFILES.get(provider, HEURISTIC_PROFILES["default"]))
+
+# Counter factories per provider, taking the model name
+COUNTER_FACTORIES: Dict[str, Callable[[Optional[str]], TokenCounter]] = {
+    "openai": _openai_counter,
+    "deepseek": _heuristic_factory("deepseek"),
+    "anthropic": _heuristic_factory("anthropic"),
+    "gemini": _heuristic_factory("gemini"),
+    "ollama": _heuristic_factory("ollama"),
+}
+
+# One counter per (provider, model)
+_counters: Dict[Tuple[str, Optional[str]], TokenCounter] = {}
+
+def register_token_counter(provider: str, factory: Callable[[Optional[str]], TokenCounter]) -> None:
+    """Register the token counter factory of a provider.
+
+    Args:
+        provider: Provider name, e.g. 'openai'
+        factory: Function taking the model name and returning a TokenCounter
+    """
+    COUNTER_FACTORIES[provider] = factory
+    for key in [key for key in _counters if key[0] == provider]:
+        del _counters[key]
+
+def get_token_counter(provider: str, model_name: Optional[str] = None) -> TokenCounter:
+    """Get the shared token counter of a provider and model.
+
+    Args:
+        provider: Provider name, e.g. 'openai'
+        model_name: Model name
+
+    Returns:
+        The token counter
+    """
+    key = (provider, model_name)
+    counter = _counters.get(key)
+    if counter is None:
+        factory = COUNTER_FACTORIES.get(provider, _heuristic_factory("default"))
+        counter = factory(model_name)
+        logger.debug(f"Token counter for {provider}/{model_name}: {counter.name}")
+        _counters[key] = counter
+    return counter
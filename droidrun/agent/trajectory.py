@@ -0,0 +1,220 @@
+"""
+Trajectory Cache - Replay of successful action sequences.
+
+Templated tasks (e.g. "检查系统版本") are run again and again with the same
+steps. The actions of a successful run are stored under the normalized goal
+and the device model, together with the versions of the apps they started
+and the screens they acted on. A later run of the same goal replays them
+without the LLM while the screens still match, and hands over to the LLM
+as soon as they diverge.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import unicodedata
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+# Default location of the trajectory store
+DEFAULT_TRAJECTORY_PATH = Path.home() / ".droidrun" / "trajectories.json"
+
+# Actions that only observe the device; they are not replayed
+OBSERVATION_ACTIONS = frozenset({"get_clickables", "take_screenshot", "list_packages", "extract"})
+
+# Element fields compared before replaying a tap
+ELEMENT_FIELDS = ("className", "resourceId", "text", "bounds")
+
+# Trailing punctuation ignored when comparing goals
+_GOAL_PUNCTUATION = " .!?。！？,，;；"
+
+def normalize_goal(goal: str) -> str:
+    """Normalize a goal so that trivially different phrasings share a key.
+
+    Applies NFKC normalization (full-width to half-width forms), lowercases,
+    collapses whitespace and strips trailing punctuation.
+
+    Args:
+        goal: Task description
+
+    Returns:
+        Normalized goal
+    """
+    goal = unicodedata.normalize("NFKC", goal).lower()
+    return " ".join(goal.split()).strip(_GOAL_PUNCTUATION)
+
+def trajectory_key(goal: str, device_model: str) -> str:
+    """Get the store key of a goal on a device model."""
+    return f"{device_model}|{normalize_goal(goal)}"
+
+def app_packages(actions: List[Dict[str, Any]]) -> List[str]:
+    """Get the packages started by a list of actions, in order."""
+    packages = []
+    for item in actions:
+        package = item.get("parameters", {}).get("package")
+        if item.get("action") == "start_app" and package and package not in packages:
+            packages.append(package)
+    return packages
+
+class TrajectoryStore:
+    """JSON file of successful trajectories and replay statistics.
+
+    Each key (device model and normalized goal) holds one trajectory per set
+    of app versions. A trajectory is a list of actions, each with the screen
+    family it was taken on and, for taps, the tapped element.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """Initialize the store.
+
+        Args:
+            path: JSON file to use (defaults to DROIDRUN_TRAJECTORY_CACHE or
+                  ~/.droidrun/trajectories.json)
+        """
+        self.path = Path(path or os.environ.get("DROIDRUN_TRAJECTORY_CACHE") or DEFAULT_TRAJECTORY_PATH)
+        self.trajectories: Dict[str, List[Dict[str, Any]]] = {}
+        self.stats: Dict[str, float] = {
+            "lookups": 0,
+            "hits": 0,
+            "completed": 0,
+            "diverged": 0,
+            "saved_ms": 0.0,
+        }
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable trajectory store {self.path}: {e}")
+            return
+        self.trajectories = data.get("trajectories", {})
+        self.stats.update(data.get("stats", {}))
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # A unique temporary file, so concurrent runs never write to the same one
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=self.path.parent, prefix=f".{self.path.name}.", delete=False
+        ) as f:
+            json.dump({"trajectories": self.trajectories, "stats": self.stats}, f, ensure_ascii=False, indent=2)
+        try:
+            os.replace(f.name, self.path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    async def lookup(
+        self,
+        goal: str,
+        device_model: str,
+        get_version: Callable[[str], Awaitable[str]]
+    ) -> Optional[Dict[str, Any]]:
+        """Find a trajectory for a goal whose app versions match the device.
+
+        The lookup is counted in the statistics, which are written to the
+        file with the next recorded trajectory or replay.
+
+        Args:
+            goal: Task description
+            device_model: Device model (ro.product.model)
+            get_version: Coroutine function returning the installed version
+                         of a package
+
+        Returns:
+            The trajectory, or None if there is no usable one
+        """
+        self.stats["lookups"] += 1
+        trajectory = None
+        versions: Dict[str, str] = {}
+        for candidate in reversed(self.trajectories.get(trajectory_key(goal, device_model), [])):
+            for package, version in candidate.get("app_versions", {}).items():
+                if package not in versions:
+                    versions[package] = await get_version(package)
+                if versions[package] != version:
+                    break
+            else:
+                trajectory = candidate
+                break
+
+        if trajectory is not None:
+            self.stats["hits"] += 1
+        return trajectory
+
+    async def record(
+        self,
+        goal: str,
+        device_model: str,
+        actions: List[Dict[str, Any]],
+        duration_ms: float,
+        get_version: Callable[[str], Awaitable[str]]
+    ) -> Dict[str, Any]:
+        """Store the actions of a successful run.
+
+        Replaces the trajectory of the goal with the same app versions.
+
+        Args:
+            goal: Task description
+            device_model: Device model (ro.product.model)
+            actions: Executed actions with 'action', 'parameters' and the
+                     optional 'screen' and 'element' signatures
+            duration_ms: Duration of the run
+            get_version: Coroutine function returning the installed version
+                         of a package
+
+        Returns:
+            The stored trajectory
+        """
+        app_versions = {package: await get_version(package) for package in app_packages(actions)}
+        trajectory = {
+            "goal": goal,
+            "device_model": device_model,
+            "app_versions": app_versions,
+            "actions": actions,
+            "duration_ms": round(duration_ms, 1),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        key = trajectory_key(goal, device_model)
+        kept = [t for t in self.trajectories.get(key, []) if t.get("app_versions") != app_versions]
+        self.trajectories[key] = kept + [trajectory]
+        self._save()
+        return trajectory
+
+    def record_replay(self, completed: bool, saved_ms: float) -> None:
+        """Count the outcome of a replay.
+
+        Args:
+            completed: True if the whole trajectory was replayed
+            saved_ms: Estimated time saved compared to the recorded run
+        """
+        self.stats["completed" if completed else "diverged"] += 1
+        self.stats["saved_ms"] += max(0.0, saved_ms)
+        self._save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get replay statistics including the hit rate."""
+        lookups = self.stats["lookups"]
+        return {
+            **self.stats,
+            "trajectories": sum(len(items) for items in self.trajectories.values()),
+            "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+        }
+
+    def clear(self) -> None:
+        """Remove all trajectories and statistics."""
+        self.trajectories = {}
+        for key in self.stats:
+            self.stats[key] = 0
+        self._save()
+
+def element_signature(element: Dict[str, Any]) -> Dict[str, Any]:
+    """Get the fields of an element compared before a replayed tap."""
+    return {field: element.get(field) for field in ELEMENT_FIELDS}
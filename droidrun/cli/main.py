@@ -6,16 +6,15 @@ import asyncio
 import click
 import os
 from rich.console import Console
-from droidrun.tools import DeviceManager
-from droidrun.agent import ReActAgent
-from droidrun.agent.llm_reasoning import LLMReasoner
+from droidrun.adb import get_shared_device_manager
 from functools import wraps
 
-# Import the install_app function directly for the setup command
-from droidrun.tools.actions import install_app
+# Commands import the agent, scheduler and server modules they use when they
+# run, so that quick commands such as `devices` start without loading them
+# (see benchmarks/bench_import.py)
 
 console = Console()
-device_manager = DeviceManager()
+device_manager = get_shared_device_manager()
 
 def coro(f):
     @wraps(f)
@@ -23,15 +22,29 @@ def coro(f):
         return asyncio.run(f(*args, **kwargs))
     return wrapper
 
+def resolve_llm_settings(provider: str, model: str | None, base_url: str | None):
+    """Get the API key and default model of an LLM provider.
+    
+    Returns:
+        Tuple of (provider, model, api_key, base_url), or None after printing
+        an error if the provider is unsupported or its API key is not set
+    """
+    from droidrun.agent.providers import resolve_provider_settings
+    
+    try:
+        return resolve_provider_settings(provider, model, base_url=base_url)
+    except ValueError as e:
+        console.print(f"[bold red]Error:[/] {e}")
+        return None
+
 # Define the run command as a standalone function to be used as both a command and default
 @coro
-async def run_command(command: str, device: str | None, provider: str, model: str, steps: int, vision: bool, base_url: str):
+async def run_command(command: str, device: str | None, provider: str, model: str, steps: int, vision: bool, base_url: str, stream: bool = False, prefetch: bool = False, max_actions: int = 1, replay: bool = False):
     """Run a command on your Android device using natural language."""
-    console.print(f"[bold blue]Executing command:[/] {command}")
+    from droidrun.agent import ReActAgent, LLMReasoner
+    from droidrun.agent.trajectory import TrajectoryStore
     
-    # Auto-detect Gemini if model starts with "gemini-"
-    if model and model.startswith("gemini-"):
-        provider = "gemini"
+    console.print(f"[bold blue]Executing command:[/] {command}")
     
     # Print vision status
     if vision:
@@ -40,46 +53,10 @@ async def run_command(command: str, device: str | None, provider: str, model: st
         console.print("[blue]Vision capabilities are disabled.[/]")
     
     # Get API keys from environment variables
-    api_key = None
-    if provider.lower() == 'openai':
-        api_key = os.environ.get('OPENAI_API_KEY')
-        if not api_key:
-            console.print("[bold red]Error:[/] OPENAI_API_KEY environment variable not set")
-            return
-        if not model:
-            model = "gpt-4o-mini"
-    elif provider.lower() == 'anthropic':
-        api_key = os.environ.get('ANTHROPIC_API_KEY')
-        if not api_key:
-            console.print("[bold red]Error:[/] ANTHROPIC_API_KEY environment variable not set")
-            return
-        if not model:
-            model = "claude-3-sonnet-20240229"
-    elif provider.lower() == 'gemini':
-        api_key = os.environ.get('GEMINI_API_KEY')
-        if not api_key:
-            console.print("[bold red]Error:[/] GEMINI_API_KEY environment variable not set")
-            return
-        if not model:
-            model = "gemini-2.0-flash"
-
-    elif provider.lower() == 'deepseek':
-        api_key = os.environ.get('DeepSeek_API_KEY')
-        if not api_key:
-            console.print("[bold red]Error:[/] DeepSeek_API_KEY environment variable not set")
-            return
-        if not model:
-            model = "deepseek-chat"
-
-    elif provider.lower() == 'ollama':
-        api_key = "ollama"
-        if not base_url:
-            base_url = "http://localhost:11434/v1"
-        if not model:
-            model = "llama3.1:8b"
-    else:
-        console.print(f"[bold red]Error:[/] Unsupported provider: {provider}")
+    settings = resolve_llm_settings(provider, model, base_url)
+    if settings is None:
         return
+    provider, model, api_key, base_url = settings
     
     try:
         # Try to find a device if none specified
@@ -105,7 +82,9 @@ async def run_command(command: str, device: str | None, provider: str, model: st
             temperature=0.2,
             max_tokens=2000,
             vision=vision,
-            base_url=base_url
+            base_url=base_url,
+            stream=stream,
+            max_actions=max_actions
         )
         
         # Create and run the agent
@@ -117,7 +96,9 @@ async def run_command(command: str, device: str | None, provider: str, model: st
                 task=command,
                 llm=llm,
                 device_serial=device,
-                max_steps=steps
+                max_steps=steps,
+                prefetch=prefetch,
+                trajectory_store=TrajectoryStore() if replay else None
             )
             steps = await agent.run()
             
@@ -160,10 +141,14 @@ def cli():
 @click.option('--steps', type=int, help='Maximum number of steps', default=15)
 @click.option('--vision', is_flag=True, help='Enable vision capabilities')
 @click.option('--base_url', '-u', help='Base URL for API (e.g., OpenRouter or Ollama)', default=None)
-def run(command: str, device: str | None, provider: str, model: str, steps: int, vision: bool, base_url):
+@click.option('--stream', is_flag=True, help='Stream LLM responses and start each action as soon as it is known')
+@click.option('--prefetch', is_flag=True, help='Capture the next screen in the background while the LLM is thinking')
+@click.option('--max-actions', type=int, help='Maximum number of actions the LLM may plan per step', default=1)
+@click.option('--replay', is_flag=True, help='Replay a stored successful run of the same task, and store this one')
+def run(command: str, device: str | None, provider: str, model: str, steps: int, vision: bool, base_url, stream: bool, prefetch: bool, max_actions: int, replay: bool):
     """Run a command on your Android device using natural language."""
     # Call our standalone function
-    return run_command(command, device, provider, model, steps, vision, base_url)
+    return run_command(command, device, provider, model, steps, vision, base_url, stream, prefetch, max_actions, replay)
 
 @cli.command()
 @coro
@@ -181,6 +166,228 @@ async def devices():
     except Exception as e:
         console.print(f"[red]Error listing devices: {e}[/]")
 
+@cli.command()
+@click.argument('tasks', nargs=-1)
+@click.option('--tasks-file', '-f', type=click.Path(exists=True), help='File with one task per line', default=None)
+@click.option('--device', '-d', 'devices', multiple=True, help='Device serial (repeat for several; defaults to all connected devices)')
+@click.option('--per-device', type=int, help='Maximum number of tasks at once per device', default=1)
+@click.option('--provider', '-p', help='LLM provider (openai, ollama, anthropic, gemini,deepseek)', default='openai')
+@click.option('--model', '-m', help='LLM model name', default=None)
+@click.option('--steps', type=int, help='Maximum number of steps per task', default=15)
+@click.option('--vision', is_flag=True, help='Enable vision capabilities')
+@click.option('--base_url', '-u', help='Base URL for API (e.g., OpenRouter or Ollama)', default=None)
+@click.option('--replay', is_flag=True, help='Replay stored successful runs of the same tasks, and store new ones')
+@coro
+async def fleet(tasks, tasks_file, devices, per_device, provider, model, steps, vision, base_url, replay):
+    """Run tasks on several devices at once in one process."""
+    from droidrun.agent import LLMReasoner
+    from droidrun.agent.fleet import FleetRunner
+    from droidrun.agent.trajectory import TrajectoryStore
+    
+    tasks = list(tasks)
+    if tasks_file:
+        with open(tasks_file, 'r', encoding='utf-8') as f:
+            tasks.extend(line.strip() for line in f if line.strip())
+    if not tasks:
+        console.print("[bold red]Error:[/] No tasks given")
+        return
+    
+    settings = resolve_llm_settings(provider, model, base_url)
+    if settings is None:
+        return
+    provider, model, api_key, base_url = settings
+    
+    def create_llm() -> LLMReasoner:
+        return LLMReasoner(
+            llm_provider=provider,
+            model_name=model,
+            api_key=api_key,
+            temperature=0.2,
+            max_tokens=2000,
+            vision=vision,
+            base_url=base_url
+        )
+    
+    runner = FleetRunner(
+        create_llm,
+        serials=list(devices) or None,
+        per_device_concurrency=per_device,
+        max_steps=steps,
+        trajectory_store=TrajectoryStore() if replay else None
+    )
+    
+    def report(result):
+        status = "[green]✓[/]" if result["success"] else "[red]✗[/]"
+        detail = result["error"] or result["result"] or ""
+        console.print(
+            f"{status} [bold]{result['serial']}[/] {result['task']} "
+            f"({result['steps']} steps, {result['duration_s']:.1f}s) {detail}"
+        )
+    
+    try:
+        outcome = await runner.run(tasks, on_result=report)
+    except Exception as e:
+        console.print(f"[bold red]Error:[/] {e}")
+        return
+    
+    summary = outcome["summary"]
+    console.print(f"\n[bold]Fleet summary[/]: {summary['succeeded']}/{summary['tasks']} tasks succeeded in {summary['wall_time_s']:.1f}s")
+    console.print(f"Throughput: {summary['tasks_per_minute']:.2f} tasks/min")
+    console.print(f"Step latency: p50 {summary['step_p50_s']:.2f}s, p95 {summary['step_p95_s']:.2f}s ({summary['steps']} steps)")
+    for serial, device in summary["devices"].items():
+        console.print(
+            f"  • [bold]{serial}[/]: {device['succeeded']}/{device['tasks']} succeeded, "
+            f"busy {device['busy_s']:.1f}s"
+        )
+
+@cli.group()
+def queue():
+    """Queue tasks and dispatch them to the connected devices."""
+    pass
+
+@queue.command('add')
+@click.argument('task', type=str)
+@click.option('--serial', 'serials', multiple=True, help='Only run on this device (repeat for several)')
+@click.option('--model', help='Required device model (ro.product.model)', default=None)
+@click.option('--android', 'android_version', help="Required Android version, e.g. '>=12' or '13'", default=None)
+@click.option('--package', 'packages', multiple=True, help='Package that must be installed (repeat for several)')
+def queue_add(task: str, serials, model, android_version, packages):
+    """Add a task to the queue."""
+    from droidrun.scheduler import TaskQueue
+    
+    requirements = {}
+    if serials:
+        requirements["serial"] = list(serials)
+    if model:
+        requirements["model"] = model
+    if android_version:
+        requirements["android_version"] = android_version
+    if packages:
+        requirements["packages"] = list(packages)
+    entry = TaskQueue().submit(task, requirements)
+    console.print(f"[green]Queued task {entry['id']}:[/] {task}")
+
+def print_queue_report(stats):
+    console.print(
+        f"Queue depth: {stats['depth']}, running: {stats['running']}, "
+        f"finished: {stats['finished']}, {stats['tasks_per_hour']:.1f} tasks/hour"
+    )
+    for serial, utilization in stats["utilization"].items():
+        console.print(f"  • [bold]{serial}[/]: {utilization:.0%} busy")
+
+@queue.command('status')
+def queue_status():
+    """Show the queued, running and finished tasks."""
+    from droidrun.scheduler import TaskQueue
+    
+    task_queue = TaskQueue()
+    colors = {"pending": "yellow", "running": "blue", "done": "green", "failed": "red"}
+    for task in sorted(task_queue.tasks.values(), key=lambda task: task["submitted_at"]):
+        device = f" on {task['device']}" if task["device"] else ""
+        console.print(f"  [{colors[task['status']]}]{task['status']:<8}[/] {task['id']} {task['task']}{device}")
+    stats = task_queue.get_stats()
+    console.print(
+        f"Queue depth: {stats['depth']}, done: {stats['done']}, failed: {stats['failed']}, "
+        f"{stats['tasks_per_hour']:.1f} tasks/hour"
+    )
+
+@queue.command('run')
+@click.option('--device', '-d', 'devices', multiple=True, help='Device serial (repeat for several; defaults to all connected devices)')
+@click.option('--provider', '-p', help='LLM provider (openai, ollama, anthropic, gemini,deepseek)', default='openai')
+@click.option('--model', '-m', help='LLM model name', default=None)
+@click.option('--steps', type=int, help='Maximum number of steps per task', default=15)
+@click.option('--vision', is_flag=True, help='Enable vision capabilities')
+@click.option('--base_url', '-u', help='Base URL for API (e.g., OpenRouter or Ollama)', default=None)
+@click.option('--watch', is_flag=True, help='Keep waiting for new tasks')
+@click.option('--report-interval', type=float, help='Seconds between progress reports', default=30.0)
+@coro
+async def queue_run(devices, provider, model, steps, vision, base_url, watch, report_interval):
+    """Run the queued tasks on the connected devices."""
+    from droidrun.agent import LLMReasoner
+    from droidrun.scheduler import Scheduler, TaskQueue
+    
+    settings = resolve_llm_settings(provider, model, base_url)
+    if settings is None:
+        return
+    provider, model, api_key, base_url = settings
+    
+    def create_llm() -> LLMReasoner:
+        return LLMReasoner(
+            llm_provider=provider,
+            model_name=model,
+            api_key=api_key,
+            temperature=0.2,
+            max_tokens=2000,
+            vision=vision,
+            base_url=base_url
+        )
+    
+    scheduler = Scheduler(TaskQueue(), create_llm, serials=list(devices) or None, max_steps=steps)
+    try:
+        stats = await scheduler.run(watch=watch, on_report=print_queue_report, report_interval=report_interval)
+    except Exception as e:
+        console.print(f"[bold red]Error:[/] {e}")
+        return
+    console.print("[bold]Queue run finished[/]")
+    print_queue_report(stats)
+
+@cli.command()
+@click.option('--host', help='Address to listen on (default: 127.0.0.1)', default=None)
+@click.option('--port', type=int, help='Port to listen on (default: DROIDRUN_SERVE_PORT or 7770)', default=None)
+@click.option('--socket', 'socket_path', help='Listen on this Unix socket instead of host and port', default=None)
+@click.option('--token', envvar='DROIDRUN_SERVE_TOKEN', help='Bearer token required on every request (default: ~/.droidrun/serve_token)', default=None)
+@click.option('--steps', type=int, help='Default maximum number of steps per task', default=15)
+@coro
+async def serve(host: str | None, port: int | None, socket_path: str | None, token: str | None, steps: int):
+    """Run a daemon that accepts tasks and keeps devices and LLM clients warm."""
+    from droidrun.server import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TOKEN_PATH, TaskDaemon, TaskServer, load_token
+    
+    host = host or DEFAULT_HOST
+    port = port or DEFAULT_PORT
+    daemon = TaskDaemon(max_steps=steps)
+    serials = await daemon.warm_up()
+    console.print(f"[blue]Devices:[/] {', '.join(serials) if serials else 'none connected'}")
+    
+    if not token:
+        token = load_token()
+        console.print(f"[blue]Token:[/] {DEFAULT_TOKEN_PATH}")
+    server = TaskServer(daemon, token=token)
+    address = f"unix:{socket_path}" if socket_path else f"http://{host}:{port}"
+    console.print(f"[bold green]Serving on {address}[/] (Ctrl+C to stop)")
+    try:
+        await server.serve_forever(host=host, port=port, socket_path=socket_path)
+    except OSError as e:
+        console.print(f"[bold red]Error:[/] {e}")
+
+@cli.command()
+@click.option('--clear', is_flag=True, help='Remove all stored trajectories and statistics')
+def trajectories(clear: bool):
+    """Show the stored trajectories used by --replay."""
+    from droidrun.agent.trajectory import TrajectoryStore
+    
+    store = TrajectoryStore()
+    if clear:
+        store.clear()
+        console.print(f"[green]Cleared {store.path}[/]")
+        return
+    
+    for items in store.trajectories.values():
+        for trajectory in items:
+            versions = ", ".join(f"{package} {version}" for package, version in trajectory["app_versions"].items())
+            console.print(
+                f"  • [bold]{trajectory['goal']}[/] on {trajectory['device_model']}: "
+                f"{len(trajectory['actions'])} actions, {trajectory['duration_ms'] / 1000:.1f}s"
+                f"{f' ({versions})' if versions else ''}"
+            )
+    
+    stats = store.get_stats()
+    console.print(f"[green]{stats['trajectories']} trajectories in {store.path}[/]")
+    console.print(
+        f"Replay hit rate: {stats['hits']:.0f}/{stats['lookups']:.0f} ({stats['hit_rate']:.0%}), "
+        f"completed: {stats['completed']:.0f}, diverged: {stats['diverged']:.0f}, "
+        f"time saved: {stats['saved_ms'] / 1000:.1f}s"
+    )
+
 @cli.command()
 @click.argument('ip_address')
 @click.option('--port', '-p', default=5555, help='ADB port (default: 5555)')
@@ -216,6 +423,8 @@ async def disconnect(serial: str):
 @coro
 async def setup(path: str, device: str | None):
     """Install an APK file and enable it as an accessibility service."""
+    from droidrun.tools.actions import install_app
+    
     try:
         # Check if APK file exists
         if not os.path.exists(path):
@@ -0,0 +1,22 @@
+"""
+Scheduler Package - Queued tasks dispatched to a pool of devices.
+"""
+
+from .task_queue import TaskQueue
+
+# The scheduler runs agents; it is imported on first use so that adding to
+# and listing the queue does not load the agent
+_SCHEDULER_EXPORTS = ('Scheduler', 'matches', 'version_matches')
+
+def __getattr__(name: str):
+    if name in _SCHEDULER_EXPORTS:
+        from . import scheduler
+        return getattr(scheduler, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = [
+    'TaskQueue',
+    'Scheduler',
+    'matches',
+    'version_matches',
+]
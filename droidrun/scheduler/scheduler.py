@@ -0,0 +1,269 @@
+"""
+Scheduler - Dispatches queued tasks to a pool of devices.
+
+Every device runs a worker that takes the oldest queued task it meets the
+requirements of whenever it is idle, so fast devices naturally take on more
+of the queue. A task that runs much longer than usual while another device
+that could run it is idle is taken away from its (slow or stuck) device and
+put back in the queue for the idle one.
+"""
+
+import re
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from droidrun.adb import get_shared_device_manager
+from droidrun.agent.fleet import FleetRunner, percentile
+from droidrun.agent.llm_reasoning import LLMReasoner
+from .task_queue import TaskQueue
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+_VERSION_SPEC_RE = re.compile(r"^\s*(>=|<=|==|>|<)?\s*([\d.]+)\s*$")
+
+def _version_tuple(version: str) -> Tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r"\d+", version))
+
+def version_matches(version: str, spec: Any) -> bool:
+    """Check a version against a spec such as '>=12', '<14', '13' or 13.
+
+    A bare version matches every version it is a prefix of ('13' matches
+    '13.0.1').
+    """
+    match = _VERSION_SPEC_RE.match(str(spec))
+    if not match or not version:
+        return False
+    operator, wanted = match.group(1), _version_tuple(match.group(2))
+    actual = _version_tuple(version)
+    if operator is None:
+        return actual[:len(wanted)] == wanted
+    return {
+        ">=": actual >= wanted,
+        "<=": actual <= wanted,
+        "==": actual == wanted,
+        ">": actual > wanted,
+        "<": actual < wanted,
+    }[operator]
+
+def matches(requirements: Dict[str, Any], profile: Dict[str, Any]) -> bool:
+    """Check whether a device meets a task's requirements.
+
+    Args:
+        requirements: Any of 'serial' (serial or list of serials), 'model',
+                      'brand' (case-insensitive), 'android_version' and
+                      'sdk' (version specs, see version_matches) and
+                      'packages' (packages that must be installed)
+        profile: Device profile from Scheduler.profile
+
+    Returns:
+        True if all requirements are met
+    """
+    properties = profile["properties"]
+    serials = requirements.get("serial")
+    if serials and profile["serial"] not in ([serials] if isinstance(serials, str) else serials):
+        return False
+    for name, prop in (("model", "ro.product.model"), ("brand", "ro.product.brand")):
+        wanted = requirements.get(name)
+        if wanted and properties.get(prop, "").lower() != str(wanted).lower():
+            return False
+    for name, prop in (("android_version", "ro.build.version.release"), ("sdk", "ro.build.version.sdk")):
+        spec = requirements.get(name)
+        if spec is not None and not version_matches(properties.get(prop, ""), spec):
+            return False
+    return all(package in profile["packages"] for package in requirements.get("packages", []))
+
+class Scheduler:
+    """Runs the tasks of a TaskQueue on a pool of devices."""
+
+    def __init__(
+        self,
+        queue: TaskQueue,
+        llm_factory: Callable[[], LLMReasoner],
+        serials: Optional[List[str]] = None,
+        max_steps: int = 15,
+        max_attempts: int = 3,
+        rebalance_factor: float = 3.0,
+        min_rebalance_time: float = 120.0,
+        poll_interval: float = 1.0,
+        **agent_options: Any
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            queue: Queue of tasks to run
+            llm_factory: Creates the reasoner of each agent
+            serials: Devices to use (defaults to all connected devices)
+            max_steps: Maximum number of steps per task
+            max_attempts: A task taken away from this many devices fails
+            rebalance_factor: A task is taken away from its device once it has
+                              run this many times longer than the median task
+            min_rebalance_time: ... and at least this many seconds
+            poll_interval: Seconds between checks of the queue and the running tasks
+            **agent_options: Further ReActAgent arguments
+        """
+        self.queue = queue
+        self.serials = serials
+        self.max_attempts = max_attempts
+        self.rebalance_factor = rebalance_factor
+        self.min_rebalance_time = min_rebalance_time
+        self.poll_interval = poll_interval
+        self.runner = FleetRunner(llm_factory, max_steps=max_steps, **agent_options)
+
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        self._running: Dict[str, Tuple[str, asyncio.Task, float]] = {}
+        self._rebalanced: Dict[str, str] = {}
+        self._durations: List[float] = []
+        self.busy_time: Dict[str, float] = {}
+        self.started_at: Optional[float] = None
+        self.finished = 0
+
+    async def profile(self, serial: str) -> Dict[str, Any]:
+        """Get a device's properties and installed packages (cached).
+
+        Returns:
+            Dictionary with 'serial', 'properties' and the set of 'packages'
+        """
+        if serial not in self.profiles:
+            device = await get_shared_device_manager().get_device(serial)
+            if not device:
+                raise ValueError(f"Device {serial} not found")
+            properties = await device.get_properties()
+            packages = await device.list_packages(include_system_apps=True)
+            self.profiles[serial] = {
+                "serial": serial,
+                "properties": properties,
+                "packages": {package["package"] for package in packages},
+            }
+        return self.profiles[serial]
+
+    def can_run(self, task: Dict[str, Any], serial: str) -> bool:
+        """Check whether a profiled device can run a task."""
+        profile = self.profiles.get(serial)
+        return profile is not None and matches(task.get("requirements", {}), profile)
+
+    def _idle_devices(self) -> List[str]:
+        return [serial for serial in self.profiles if serial not in self._running]
+
+    def _has_work(self, serial: str) -> bool:
+        """Check whether a device may still get a task from the queue."""
+        if any(self.can_run(task, serial) and serial not in task["avoid"] for task in self.queue.pending()):
+            return True
+        # A running task may still be taken away from a slower device
+        return any(
+            other != serial and self.can_run(self.queue.tasks[task_id], serial)
+            for other, (task_id, _, _) in self._running.items()
+        )
+
+    async def _worker(self, serial: str, watch: bool) -> None:
+        """Run queued tasks on a device while there are any it can run."""
+        while True:
+            task = self.queue.claim(serial, lambda task: self.can_run(task, serial))
+            if task is None:
+                if not watch and not self._has_work(serial):
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            logger.info(f"Running task {task['id']} on {serial}: {task['task']}")
+            start = time.perf_counter()
+            run = asyncio.ensure_future(self.runner.run_task(serial, task["task"]))
+            self._running[serial] = (task["id"], run, start)
+            try:
+                result = await run
+            except asyncio.CancelledError:
+                if self._rebalanced.pop(serial, None) != task["id"]:
+                    raise
+                # Taken away from this device, see _rebalance
+                if task["attempts"] >= self.max_attempts:
+                    self.queue.finish(task["id"], False, error=f"Gave up after {task['attempts']} slow attempts")
+                else:
+                    self.queue.requeue(task["id"], avoid=serial)
+                continue
+            finally:
+                self._running.pop(serial, None)
+                self.busy_time[serial] = self.busy_time.get(serial, 0.0) + time.perf_counter() - start
+
+            self._durations.append(result["duration_s"])
+            self.finished += 1
+            self.queue.finish(task["id"], result["success"], result["result"], result["error"])
+
+    def _rebalance(self) -> None:
+        """Take tasks that run too long away from their devices if another could run them."""
+        if not self._durations:
+            return
+        threshold = max(self.min_rebalance_time, self.rebalance_factor * percentile(self._durations, 0.5))
+        idle = self._idle_devices()
+        for serial, (task_id, run, _) in list(self._running.items()):
+            task = self.queue.tasks[task_id]
+            if time.time() - (task["started_at"] or time.time()) < threshold:
+                continue
+            if any(other not in task["avoid"] and other != serial and self.can_run(task, other) for other in idle):
+                logger.info(f"Task {task_id} is slow on {serial}, moving it to an idle device")
+                self._rebalanced[serial] = task_id
+                run.cancel()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the queue depth, device utilization and tasks per hour of this run."""
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        utilization = {}
+        for serial in self.profiles:
+            busy = self.busy_time.get(serial, 0.0)
+            if serial in self._running:
+                busy += time.perf_counter() - self._running[serial][2]
+            utilization[serial] = busy / elapsed if elapsed > 0 else 0.0
+        queue = self.queue.get_stats()
+        return {
+            "depth": queue["depth"],
+            "running": len(self._running),
+            "finished": self.finished,
+            "elapsed_s": elapsed,
+            "tasks_per_hour": self.finished / elapsed * 3600 if elapsed > 0 else 0.0,
+            "utilization": utilization,
+        }
+
+    async def run(
+        self,
+        watch: bool = False,
+        on_report: Optional[Callable[[Dict[str, Any]], None]] = None,
+        report_interval: float = 30.0
+    ) -> Dict[str, Any]:
+        """Run queued tasks until no device can run any of the pending ones.
+
+        Args:
+            watch: Keep waiting for new tasks instead of stopping
+            on_report: Called with get_stats() every report_interval seconds
+            report_interval: Seconds between reports
+
+        Returns:
+            Final statistics (see get_stats)
+        """
+        serials = self.serials or [device.serial for device in await get_shared_device_manager().list_devices()]
+        for serial in serials:
+            try:
+                await self.profile(serial)
+            except Exception as e:
+                logger.warning(f"Not using {serial}: {e}")
+        if not self.profiles:
+            raise ValueError("No devices found")
+
+        recovered = self.queue.recover_stale()
+        if recovered:
+            logger.info(f"Requeued {recovered} task(s) left running by a scheduler that stopped")
+
+        self.started_at = time.perf_counter()
+        workers = asyncio.gather(*(self._worker(serial, watch) for serial in self.profiles))
+        last_report = time.perf_counter()
+        try:
+            while not workers.done():
+                await asyncio.wait([workers], timeout=self.poll_interval)
+                self._rebalance()
+                if on_report is not None and time.perf_counter() - last_report >= report_interval:
+                    last_report = time.perf_counter()
+                    on_report(self.get_stats())
+            await workers
+        finally:
+            workers.cancel()
+        return self.get_stats()
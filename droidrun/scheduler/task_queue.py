@@ -0,0 +1,258 @@
+"""
+Task Queue - Persistent queue of tasks for the scheduler.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+# Default location of the queue file
+DEFAULT_QUEUE_PATH = Path.home() / ".droidrun" / "queue.json"
+
+# Task states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+def _process_alive(pid: Optional[int]) -> bool:
+    """Check whether a process of this host is still running."""
+    if not pid:
+        return False
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, but belongs to another user
+    except OSError:
+        return False
+    return True
+
+def _lock_file(f) -> None:
+    """Take an exclusive lock on an open file, waiting for other holders."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+def _unlock_file(f) -> None:
+    """Release a lock taken with _lock_file."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class TaskQueue:
+    """Tasks and their states, kept in a JSON file.
+
+    Every change is written to the file right away, so a scheduler that
+    stops (or crashes) can pick up where it left off: the next scheduler
+    puts the tasks its process left running back in the queue (see
+    recover_stale). Several processes (schedulers, 'droidrun queue add')
+    can share the file: each change re-reads it and writes it back while
+    holding an exclusive lock on a sidecar file ('queue.json.lock'), so
+    changes are never lost and a task is claimed by one scheduler only.
+    """
+
+    def __init__(self, path: Optional[Union[str, Path]] = None):
+        """Initialize the queue.
+
+        Args:
+            path: JSON file to use (defaults to DROIDRUN_QUEUE_FILE or
+                  ~/.droidrun/queue.json)
+        """
+        self.path = Path(path or os.environ.get("DROIDRUN_QUEUE_FILE") or DEFAULT_QUEUE_PATH)
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self.tasks: Dict[str, Dict[str, Any]] = self._read()
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not self.path.exists():
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return {task["id"]: task for task in json.load(f).get("tasks", [])}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable task queue {self.path}: {e}")
+            return {}
+
+    def _write(self) -> None:
+        # Only called with the lock held, so the temporary file is not shared
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"tasks": list(self.tasks.values())}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def _update(self) -> Iterator[None]:
+        """Change the queue as stored in the file, under the queue lock.
+
+        'tasks' is re-read from the file on entry, and written back on exit
+        unless the block raises.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, "a") as lock:
+            _lock_file(lock)
+            try:
+                self.tasks = self._read()
+                yield
+                self._write()
+            finally:
+                _unlock_file(lock)
+
+    def recover_stale(self) -> int:
+        """Put tasks left running by a scheduler that stopped back in the queue.
+
+        A running task belongs to the process that claimed it; only tasks
+        whose process is gone are requeued, so this is safe to call while
+        another scheduler is running on the same queue.
+
+        Returns:
+            Number of tasks put back in the queue
+        """
+        with self._update():
+            stale = [task for task in self.running() if not _process_alive(task.get("owner"))]
+            for task in stale:
+                task["status"] = PENDING
+                task["device"] = None
+                task["owner"] = None
+                task["started_at"] = None
+        return len(stale)
+
+    def submit(self, task: str, requirements: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Add a task to the queue.
+
+        Args:
+            task: Task description
+            requirements: Device requirements (see droidrun.scheduler.matches)
+
+        Returns:
+            The queued task
+        """
+        entry = {
+            "id": uuid.uuid4().hex[:12],
+            "task": task,
+            "requirements": requirements or {},
+            "status": PENDING,
+            "device": None,
+            "owner": None,
+            "avoid": [],
+            "attempts": 0,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self._update():
+            self.tasks[entry["id"]] = entry
+        return entry
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Get the pending tasks, oldest first."""
+        return sorted(
+            (task for task in self.tasks.values() if task["status"] == PENDING),
+            key=lambda task: task["submitted_at"]
+        )
+
+    def running(self) -> List[Dict[str, Any]]:
+        """Get the running tasks."""
+        return [task for task in self.tasks.values() if task["status"] == RUNNING]
+
+    def claim(self, serial: str, eligible: Callable[[Dict[str, Any]], bool]) -> Optional[Dict[str, Any]]:
+        """Take the oldest pending task a device can run.
+
+        Only tasks that are still pending in the file are claimed, so two
+        schedulers sharing the queue never take the same task.
+
+        Args:
+            serial: Device serial
+            eligible: Returns True for tasks the device meets the requirements of
+
+        Returns:
+            The task, now running on the device, or None
+        """
+        with self._update():
+            for task in self.pending():
+                if serial in task["avoid"] or not eligible(task):
+                    continue
+                task["status"] = RUNNING
+                task["device"] = serial
+                task["owner"] = os.getpid()
+                task["attempts"] += 1
+                task["started_at"] = time.time()
+                return task
+        return None
+
+    def finish(self, task_id: str, success: bool, result: Optional[str] = None, error: Optional[str] = None) -> None:
+        """Mark a task as done or failed.
+
+        Args:
+            task_id: Task ID
+            success: Whether the task's goal was achieved
+            result: Summary of the result
+            error: Error message
+        """
+        with self._update():
+            task = self.tasks[task_id]
+            task["status"] = DONE if success else FAILED
+            task["finished_at"] = time.time()
+            task["result"] = result
+            task["error"] = error
+
+    def requeue(self, task_id: str, avoid: Optional[str] = None) -> None:
+        """Put a running task back in the queue.
+
+        Args:
+            task_id: Task ID
+            avoid: Serial of a device that should not get the task again
+        """
+        with self._update():
+            task = self.tasks[task_id]
+            task["status"] = PENDING
+            task["device"] = None
+            task["owner"] = None
+            task["started_at"] = None
+            if avoid and avoid not in task["avoid"]:
+                task["avoid"].append(avoid)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get the queue depth, task counts and finished tasks per hour."""
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        for task in self.tasks.values():
+            counts[task["status"]] += 1
+
+        finished = [task for task in self.tasks.values() if task["finished_at"]]
+        tasks_per_hour = 0.0
+        if finished:
+            span = max(t["finished_at"] for t in finished) - min(t["started_at"] or t["finished_at"] for t in finished)
+            tasks_per_hour = len(finished) / span * 3600 if span > 0 else 0.0
+        return {
+            "depth": counts[PENDING],
+            **counts,
+            "tasks_per_hour": tasks_per_hour,
+        }
@@ -0,0 +1,15 @@
+"""
+Server Package - Long-lived daemon that runs tasks with warm devices and LLM clients.
+"""
+
+from .daemon import TaskDaemon
+from .api import DEFAULT_HOST, DEFAULT_PORT, DEFAULT_TOKEN_PATH, TaskServer, load_token
+
+__all__ = [
+    'TaskDaemon',
+    'TaskServer',
+    'DEFAULT_HOST',
+    'DEFAULT_PORT',
+    'DEFAULT_TOKEN_PATH',
+    'load_token',
+]
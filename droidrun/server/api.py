@@ -0,0 +1,256 @@
+"""
+Task API - A small HTTP/JSON interface to the task daemon.
+
+Requests and responses are JSON; the events of a task are streamed as
+newline-delimited JSON (one event per line) until the task is finished.
+
+    GET    /health             daemon statistics
+    GET    /devices            connected devices
+    GET    /tasks              all known tasks
+    POST   /tasks              submit a task, see TaskDaemon.submit
+    GET    /tasks/<id>         one task
+    GET    /tasks/<id>/events  stream the events of a task
+    DELETE /tasks/<id>         cancel a task
+
+Only local clients are served: requests must come with a localhost Host
+header and without an Origin header (as browsers send for web pages), and
+POST bodies must be sent as application/json.
+"""
+
+import os
+import re
+import json
+import asyncio
+import hmac
+import secrets
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from droidrun import __version__
+from .daemon import TaskDaemon
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+# Default address of the daemon
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = int(os.environ.get("DROIDRUN_SERVE_PORT", "7770"))
+
+# Largest request body accepted
+MAX_BODY_SIZE = 1 << 20
+
+# Where `droidrun serve` keeps its bearer token, readable only by the user
+DEFAULT_TOKEN_PATH = Path.home() / ".droidrun" / "serve_token"
+
+# Host headers of local clients, with an optional port
+_LOCAL_HOST = re.compile(r"^(localhost|127\.0\.0\.1|\[::1\])(:\d+)?$", re.IGNORECASE)
+
+_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    415: "Unsupported Media Type",
+    500: "Internal Server Error",
+}
+
+class HTTPError(Exception):
+    """An error answered with a status code and a JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def load_token(path: Path = DEFAULT_TOKEN_PATH) -> str:
+    """Read the daemon token, creating a random one on first use.
+
+    Args:
+        path: Token file, created with 0600 permissions
+
+    Returns:
+        The bearer token
+    """
+    path = Path(path)
+    try:
+        token = path.read_text(encoding="utf-8").strip()
+        if token:
+            return token
+    except FileNotFoundError:
+        pass
+    path.parent.mkdir(parents=True, exist_ok=True)
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(token)
+    # O_CREAT leaves the mode of an existing (empty) file alone
+    os.chmod(path, 0o600)
+    return token
+
+class TaskServer:
+    """Serves a TaskDaemon over TCP or a Unix socket."""
+
+    def __init__(self, daemon: TaskDaemon, token: Optional[str] = None):
+        """Initialize the server.
+
+        Args:
+            daemon: Daemon running the tasks
+            token: If set, requests must send 'Authorization: Bearer <token>'.
+                   Without a token, tasks cannot set 'base_url', so that the
+                   daemon only talks to the providers' own endpoints
+        """
+        self.daemon = daemon
+        self.token = token
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        socket_path: Optional[str] = None
+    ) -> asyncio.AbstractServer:
+        """Start listening on host and port, or on a Unix socket if given."""
+        if socket_path:
+            self._server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def serve_forever(self, **address: Any) -> None:
+        """Start listening (see start) and serve until cancelled."""
+        server = await self.start(**address)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.daemon.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], Any]:
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise HTTPError(400, "Malformed request line")
+        method, target, _ = parts
+
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        self._check_client(method.upper(), headers)
+
+        length_header = headers.get("content-length") or "0"
+        if not length_header.isdigit() or not length_header.isascii():
+            raise HTTPError(400, f"Invalid Content-Length {length_header}")
+        length = int(length_header)
+        if length > MAX_BODY_SIZE:
+            raise HTTPError(413, "Request body too large")
+        body = None
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HTTPError(400, "Request body is not valid JSON")
+        return method.upper(), target.split("?", 1)[0].rstrip("/") or "/", headers, body
+
+    def _check_client(self, method: str, headers: Dict[str, str]) -> None:
+        # Web pages can reach localhost too: they always send an Origin
+        # header on POST and DELETE, and a foreign Host after DNS rebinding
+        if "origin" in headers:
+            raise HTTPError(403, "Cross-origin requests are not allowed")
+        host = headers.get("host")
+        if host is not None and not _LOCAL_HOST.match(host):
+            raise HTTPError(403, f"Host {host} is not allowed")
+        # Forms and no-cors fetches cannot send application/json
+        content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        if method == "POST" and content_type != "application/json":
+            raise HTTPError(415, "Expected Content-Type: application/json")
+
+    def _check_token(self, headers: Dict[str, str]) -> None:
+        if not self.token:
+            return
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode("utf-8"), self.token.encode("utf-8")):
+            raise HTTPError(401, "Missing or invalid token")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, data: Any) -> None:
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _stream_events(self, writer: asyncio.StreamWriter, task_id: str) -> None:
+        events = self.daemon.events(task_id)
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: application/x-ndjson; charset=utf-8\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: close\r\n\r\n"
+        )
+        async for event in events:
+            writer.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def _route(self, method: str, path: str, body: Any, writer: asyncio.StreamWriter) -> None:
+        parts = path.strip("/").split("/")
+        if path == "/health" and method == "GET":
+            await self._send_json(writer, 200, {"status": "ok", "version": __version__, **self.daemon.get_stats()})
+        elif path == "/devices" and method == "GET":
+            await self._send_json(writer, 200, {"devices": await self.daemon.list_devices()})
+        elif path == "/tasks" and method == "GET":
+            await self._send_json(writer, 200, {"tasks": self.daemon.list_tasks()})
+        elif path == "/tasks" and method == "POST":
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Expected a JSON object")
+            if body.get("base_url") and not self.token:
+                raise HTTPError(400, "'base_url' is only accepted when the daemon requires a token")
+            try:
+                task = await self.daemon.submit(body)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+            await self._send_json(writer, 202, task)
+        elif parts[0] == "tasks" and len(parts) in (2, 3):
+            task = self.daemon.get_task(parts[1])
+            if task is None:
+                raise HTTPError(404, f"Unknown task {parts[1]}")
+            if len(parts) == 3 and parts[2] == "events" and method == "GET":
+                await self._stream_events(writer, parts[1])
+            elif len(parts) == 2 and method == "GET":
+                await self._send_json(writer, 200, task)
+            elif len(parts) == 2 and method == "DELETE":
+                if not await self.daemon.cancel(parts[1]):
+                    raise HTTPError(409, f"Task {parts[1]} has already finished")
+                await self._send_json(writer, 200, self.daemon.get_task(parts[1]))
+            else:
+                raise HTTPError(405, f"{method} is not supported on {path}")
+        else:
+            raise HTTPError(404, f"Unknown path {path}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            method, path, headers, body = await self._read_request(reader)
+            self._check_token(headers)
+            await self._route(method, path, body, writer)
+        except HTTPError as e:
+            await self._send_json(writer, e.status, {"error": str(e)})
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            logger.error(f"Error handling request: {e}")
+            try:
+                await self._send_json(writer, 500, {"error": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
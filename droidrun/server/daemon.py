@@ -0,0 +1,300 @@
+"""
+Task Daemon - Runs agent tasks in a long-lived process.
+
+A CLI run pays for interpreter startup, SDK imports, ADB device discovery,
+the Portal session and a new LLM client before its first step. The daemon
+pays for them once: the shared DeviceManager, the pooled provider clients
+and the per-device element stores stay warm between tasks, so a submitted
+task starts reasoning right away.
+"""
+
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from droidrun.adb import get_shared_device_manager
+from droidrun.agent.react_agent import ReActAgent, ReActStep
+from droidrun.agent.llm_reasoning import LLMReasoner
+from droidrun.agent.providers import resolve_provider_settings
+from droidrun.agent.trajectory import TrajectoryStore
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+# Task states; a task is finished once it is in one of FINISHED_STATES
+FINISHED_STATES = frozenset({"done", "failed", "cancelled"})
+
+# Task fields returned by TaskDaemon.get_task
+TASK_FIELDS = (
+    "id", "task", "serial", "status", "provider", "model", "submitted_at",
+    "started_at", "finished_at", "startup_ms", "steps", "result", "error",
+)
+
+class TaskDaemon:
+    """Runs submitted tasks with warm devices and LLM clients.
+
+    Tasks on the same device run one after the other; tasks on different
+    devices run side by side. Every task records its steps as events that
+    clients can follow while it runs.
+    """
+
+    def __init__(self, max_steps: int = 15, max_finished: int = 100, **agent_options: Any):
+        """Initialize the daemon.
+
+        Args:
+            max_steps: Default maximum number of steps per task
+            max_finished: Number of finished tasks (and their events) kept
+            **agent_options: Further ReActAgent arguments for every task
+        """
+        self.max_steps = max_steps
+        self.max_finished = max_finished
+        self.agent_options = agent_options
+        self.tasks: Dict[str, Dict[str, Any]] = {}
+        self.started_at = time.time()
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+        self._runs: Dict[str, asyncio.Task] = {}
+        self._device_locks: Dict[str, asyncio.Lock] = {}
+        self._trajectory_store: Optional[TrajectoryStore] = None
+
+    async def warm_up(self) -> List[str]:
+        """Discover the connected devices so that the first task starts warm.
+
+        Returns:
+            Serials of the connected devices
+        """
+        manager = get_shared_device_manager()
+        devices = await manager.list_devices(refresh=True)
+        for device in devices:
+            try:
+                await device.get_properties()
+            except Exception as e:
+                logger.warning(f"Could not read the properties of {device.serial}: {e}")
+        return [device.serial for device in devices]
+
+    async def list_devices(self) -> List[Dict[str, Any]]:
+        """Get the connected devices, the task running on each and its UI idle waits."""
+        devices = await get_shared_device_manager().list_devices()
+        running = {
+            task["serial"]: task["id"] for task in self.tasks.values() if task["status"] == "running"
+        }
+        return [
+            {"serial": device.serial, "task": running.get(device.serial), "idle_stats": dict(device.idle_stats)}
+            for device in devices
+        ]
+
+    def _trajectories(self) -> TrajectoryStore:
+        if self._trajectory_store is None:
+            self._trajectory_store = TrajectoryStore()
+        return self._trajectory_store
+
+    def _device_lock(self, serial: str) -> asyncio.Lock:
+        lock = self._device_locks.get(serial)
+        if lock is None:
+            lock = self._device_locks[serial] = asyncio.Lock()
+        return lock
+
+    async def _pick_device(self) -> str:
+        """Get the connected device with the fewest unfinished tasks."""
+        devices = await get_shared_device_manager().list_devices()
+        if not devices:
+            raise ValueError("No devices connected")
+        load = {device.serial: 0 for device in devices}
+        for task in self.tasks.values():
+            if task["serial"] in load and task["status"] not in FINISHED_STATES:
+                load[task["serial"]] += 1
+        return min(load, key=load.get)
+
+    async def submit(self, options: Dict[str, Any]) -> Dict[str, Any]:
+        """Submit a task.
+
+        Args:
+            options: 'task' and optionally 'device', 'provider', 'model',
+                     'api_key', 'base_url', 'steps', 'vision', 'stream',
+                     'prefetch', 'max_actions' and 'replay'. The LLM decides
+                     every action on the device, so only trusted clients
+                     may set 'base_url' (TaskServer requires a token for it)
+
+        Returns:
+            The task (see get_task)
+
+        Raises:
+            ValueError: If the options are invalid or no device is connected
+        """
+        goal = options.get("task")
+        if not isinstance(goal, str) or not goal.strip():
+            raise ValueError("'task' is required")
+
+        provider, model, api_key, base_url = resolve_provider_settings(
+            options.get("provider") or "openai",
+            options.get("model"),
+            options.get("api_key"),
+            options.get("base_url"),
+        )
+        # Built here so that invalid settings are reported to the client
+        llm = LLMReasoner(
+            llm_provider=provider,
+            model_name=model,
+            api_key=api_key,
+            temperature=0.2,
+            max_tokens=2000,
+            vision=bool(options.get("vision", False)),
+            base_url=base_url,
+            stream=bool(options.get("stream", False)),
+            max_actions=int(options.get("max_actions", 1)),
+        )
+        serial = options.get("device") or await self._pick_device()
+
+        task_id = uuid.uuid4().hex[:12]
+        self.tasks[task_id] = {
+            "id": task_id,
+            "task": goal,
+            "serial": serial,
+            "status": "queued",
+            "provider": provider,
+            "model": model,
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "startup_ms": None,
+            "steps": 0,
+            "result": None,
+            "error": None,
+        }
+        self._events[task_id] = []
+        self._changed[task_id] = asyncio.Event()
+        self._emit(task_id, {"event": "queued", "serial": serial})
+        self._runs[task_id] = asyncio.ensure_future(self._run(task_id, llm, options))
+        self._forget_finished()
+        return self.get_task(task_id)
+
+    def _emit(self, task_id: str, event: Dict[str, Any]) -> None:
+        """Record an event of a task and wake up its followers."""
+        event = {"task_id": task_id, "time": time.time(), **event}
+        self._events[task_id].append(event)
+        changed = self._changed[task_id]
+        changed.set()
+        self._changed[task_id] = asyncio.Event()
+
+    async def _run(self, task_id: str, llm: LLMReasoner, options: Dict[str, Any]) -> None:
+        task = self.tasks[task_id]
+        try:
+            async with self._device_lock(task["serial"]):
+                task["status"] = "running"
+                task["started_at"] = time.time()
+                self._emit(task_id, {"event": "started"})
+
+                def on_step(step: ReActStep) -> None:
+                    if task["startup_ms"] is None:
+                        task["startup_ms"] = round((time.time() - task["started_at"]) * 1000, 1)
+                    task["steps"] += 1
+                    self._emit(task_id, {"event": "step", **step.to_dict()})
+
+                agent = ReActAgent(
+                    task=task["task"],
+                    llm=llm,
+                    device_serial=task["serial"],
+                    max_steps=int(options.get("steps") or self.max_steps),
+                    prefetch=bool(options.get("prefetch", False)),
+                    trajectory_store=self._trajectories() if options.get("replay") else None,
+                    print_report=False,
+                    on_step=on_step,
+                    **self.agent_options
+                )
+                await agent.run()
+                task["status"] = "done" if agent.goal_achieved else "failed"
+                task["result"] = agent.result
+                if not agent.goal_achieved and agent.steps:
+                    task["error"] = agent.steps[-1].content
+        except asyncio.CancelledError:
+            task["status"] = "cancelled"
+        except Exception as e:
+            logger.error(f"Task {task_id} failed: {e}")
+            task["status"] = "failed"
+            task["error"] = str(e)
+        finally:
+            task["finished_at"] = time.time()
+            self._runs.pop(task_id, None)
+            self._emit(task_id, {
+                "event": "finished",
+                "status": task["status"],
+                "result": task["result"],
+                "error": task["error"],
+            })
+
+    def _forget_finished(self) -> None:
+        """Drop the oldest finished tasks beyond max_finished."""
+        finished = [task_id for task_id, task in self.tasks.items() if task["status"] in FINISHED_STATES]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.tasks[task_id]
+            del self._events[task_id]
+            del self._changed[task_id]
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get the state of a task, or None if it is unknown."""
+        task = self.tasks.get(task_id)
+        return {field: task[field] for field in TASK_FIELDS} if task else None
+
+    def list_tasks(self) -> List[Dict[str, Any]]:
+        """Get the state of all known tasks, oldest first."""
+        return [self.get_task(task_id) for task_id in self.tasks]
+
+    async def events(self, task_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Follow the events of a task from the start until it is finished.
+
+        Raises:
+            KeyError: If the task is unknown
+        """
+        if task_id not in self.tasks:
+            raise KeyError(task_id)
+        position = 0
+        while True:
+            changed = self._changed.get(task_id)
+            events = self._events.get(task_id, [])
+            while position < len(events):
+                yield events[position]
+                position += 1
+            if changed is None or self.tasks.get(task_id, {}).get("status") in FINISHED_STATES:
+                return
+            await changed.wait()
+
+    async def cancel(self, task_id: str) -> bool:
+        """Cancel a queued or running task and wait for it to stop.
+
+        Returns:
+            True if the task was cancelled, False if it had already finished
+
+        Raises:
+            KeyError: If the task is unknown
+        """
+        if task_id not in self.tasks:
+            raise KeyError(task_id)
+        run = self._runs.get(task_id)
+        if run is None or run.done():
+            return False
+        run.cancel()
+        await asyncio.gather(run, return_exceptions=True)
+        return True
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get task counts by state and the average startup time of the tasks."""
+        counts = {state: 0 for state in ("queued", "running", *sorted(FINISHED_STATES))}
+        startups = []
+        for task in self.tasks.values():
+            counts[task["status"]] += 1
+            if task["startup_ms"] is not None:
+                startups.append(task["startup_ms"])
+        return {
+            "uptime_s": time.time() - self.started_at,
+            "tasks": counts,
+            "avg_startup_ms": sum(startups) / len(startups) if startups else 0.0,
+        }
+
+    async def close(self) -> None:
+        """Cancel all unfinished tasks and wait for them to stop."""
+        runs = list(self._runs.values())
+        for run in runs:
+            run.cancel()
+        await asyncio.gather(*runs, return_exceptions=True)
@@ -3,18 +3,15 @@ UI Actions - Core UI interaction tools for Android device control.
 """
 
 import os
-import re
 import json
 import time
-import tempfile
 import asyncio
 import aiofiles
-import contextlib
 from typing import Optional, Dict, Tuple, List, Any
-from droidrun.adb import Device, DeviceManager
-
-# Global variable to store clickable elements for index-based tapping
-CLICKABLE_ELEMENTS_CACHE = []
+from droidrun.adb import Device, get_shared_device_manager
+from .portal import fetch_ui_data
+from .element_store import get_element_store
+from .ui_tree import flatten_ui_tree
 
 # Default device serial will be read from environment variable
 def get_device_serial() -> str:
@@ -35,7 +32,7 @@ async def get_device() -> Optional[Device]:
     if not serial:
         raise ValueError("DROIDRUN_DEVICE_SERIAL environment variable not set")
         
-    device_manager = DeviceManager()
+    device_manager = get_shared_device_manager()
     device = await device_manager.get_device(serial)
     if not device:
         raise ValueError(f"Device {serial} not found")
@@ -61,222 +58,145 @@ def parse_package_list(output: str) -> List[Dict[str, str]]:
                 apps.append({"package": package.strip(), "path": path.strip()})
     return apps
 
-async def get_clickables(serial: Optional[str] = None) -> Dict[str, Any]:
+async def get_clickables(
+    serial: Optional[str] = None,
+    wait_for_idle: bool = False,
+    max_idle_wait: float = 2.0,
+    commit: bool = True
+) -> Dict[str, Any]:
     """
     Get all clickable UI elements from the device using the custom TopViewService.
     
     This function interacts with the TopViewService app installed on the device
-    to capture only the clickable UI elements. The service writes UI data
-    to a JSON file on the device, which is then pulled to the host.
+    to capture only the clickable UI elements. The data is read through a
+    pluggable Portal backend (content provider, forwarded socket, or the
+    logcat-and-file fallback); the one used is reported as 'backend'.
     
     Args:
         serial: Optional device serial number
+        wait_for_idle: Wait until two consecutive frame signatures are identical
+                       before reading the element tree, so the result reflects
+                       a settled screen
+        max_idle_wait: Maximum time to wait for the UI to settle in seconds
+        commit: Store the elements in the device's element store, so taps by
+                index refer to them; without, 'generation' is None until the
+                result is passed to commit_clickables
     
     Returns:
-        Dictionary containing clickable UI elements extracted from the device screen
+        Dictionary containing clickable UI elements extracted from the device screen.
+        'generation' identifies this screen in the device's element store;
+        with wait_for_idle, 'idle' tells whether the screen settled in time.
     """
-    global CLICKABLE_ELEMENTS_CACHE
-    
     try:
         # Get the device
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 raise ValueError(f"Device {serial} not found")
         else:
             device = await get_device()
         
-        # Create a temporary file for the JSON
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as temp:
-            local_path = temp.name
-        
         try:
-            # Clear logcat to make it easier to find our output
-            await device._adb.shell(device._serial, "logcat -c")
-            
-            # Trigger the custom service via broadcast to get only interactive elements
-            await device._adb.shell(device._serial, "am broadcast -a com.droidrun.portal.GET_ELEMENTS")
-            
-            # Poll for the JSON file path
-            start_time = asyncio.get_event_loop().time()
-            max_wait_time = 10  # Maximum wait time in seconds
-            poll_interval = 0.2  # Check every 200ms
+            idle = None
+            if wait_for_idle:
+                # Probe with the cheap frame signature; the tree is fetched once, afterwards
+                idle = await device.wait_for_idle(max_wait=max_idle_wait, interval=0.05)
             
-            device_path = None
-            while asyncio.get_event_loop().time() - start_time < max_wait_time:
-                # Check logcat for the file path
-                logcat_output = await device._adb.shell(device._serial, "logcat -d \"DROIDRUN_FILE:E *:s\" | grep \"JSON data written to\" | tail -1")
-                
-                # Parse the file path if present
-                match = re.search(r"JSON data written to: (.*)", logcat_output)
-                if match:
-                    device_path = match.group(1).strip()
-                    break
-                    
-                # Wait before polling again
-                await asyncio.sleep(poll_interval)
-            
-            # Check if we found the file path
-            if not device_path:
-                raise ValueError(f"Failed to find the JSON file path in logcat after {max_wait_time} seconds")
-                
-            # Pull the JSON file from the device
-            await device._adb.pull_file(device._serial, device_path, local_path)
-            
-            # Read the JSON file
-            async with aiofiles.open(local_path, "r", encoding="utf-8") as f:
-                json_content = await f.read()
-                
-            # Clean up the temporary file
-            with contextlib.suppress(OSError):
-                os.unlink(local_path)
+            # Fetch the element tree through the fastest working Portal backend
+            ui_data, backend = await fetch_ui_data(device)
             
-            # Try to parse the JSON
-            import json
             try:
-                ui_data = json.loads(json_content)
+                # Flatten the element tree and summarize it in a single pass
+                tree = flatten_ui_tree(ui_data)
+                flattened_elements = tree["elements"]
+                tappable_indices = tree["tappable_indices"]
+                text_summary = tree["text_summary"]
                 
-                # Process the JSON to extract elements
-                flattened_elements = []
-                
-                # Process the nested elements structure
-                if isinstance(ui_data, list):
-                    # For each parent element in the list
-                    for parent in ui_data:
-                        # Add the parent if it's clickable (type should be 'clickable')
-                        if parent.get('type') == 'clickable' and parent.get('index', -1) != -1:
-                            parent_copy = {k: v for k, v in parent.items() if k != 'children'}
-                            parent_copy['isParent'] = True
-                            flattened_elements.append(parent_copy)
-                        
-                        # Process children 
-                        children = parent.get('children', [])
-                        for child in children:
-                            # Add all children that have valid indices, regardless of type
-                            # Include text elements as well, not just clickable ones
-                            if child.get('index', -1) != -1:
-                                child_copy = child.copy()
-                                child_copy['isParent'] = False
-                                child_copy['parentIndex'] = parent.get('index')
-                                flattened_elements.append(child_copy)
-                                
-                                # Also process nested children if present
-                                nested_children = child.get('children', [])
-                                for nested_child in nested_children:
-                                    if nested_child.get('index', -1) != -1:
-                                        nested_copy = nested_child.copy()
-                                        nested_copy['isParent'] = False
-                                        nested_copy['parentIndex'] = child.get('index')
-                                        nested_copy['grandparentIndex'] = parent.get('index')
-                                        flattened_elements.append(nested_copy)
-                else:
-                    # Old format handling (dictionary with clickable_elements)
-                    clickable_elements = ui_data.get("clickable_elements", [])
-                    for element in clickable_elements:
-                        if element.get('index', -1) != -1:
-                            element_copy = {k: v for k, v in element.items() if k != 'isClickable'}
-                            flattened_elements.append(element_copy)
-                
-                # Update the global cache with the processed elements
-                CLICKABLE_ELEMENTS_CACHE = flattened_elements
-                
-                # Sort by index
-                flattened_elements.sort(key=lambda x: x.get('index', 0))
-                
-                # Create a summary of important text elements for each clickable parent
-                text_summary = []
-                parent_texts = {}
-                tappable_elements = []
-                
-                # Group text elements by their parent and identify tappable elements
-                for elem in flattened_elements:
-                    # Track elements that are actually tappable (have bounds and either type clickable or are parents)
-                    if elem.get('bounds') and (elem.get('type') == 'clickable' or elem.get('isParent')):
-                        tappable_elements.append(elem.get('index'))
-                    
-                    if elem.get('type') == 'text' and elem.get('text'):
-                        parent_id = elem.get('parentIndex')
-                        if parent_id is not None:
-                            if parent_id not in parent_texts:
-                                parent_texts[parent_id] = []
-                            parent_texts[parent_id].append(elem.get('text'))
-                
-                # Create a text summary for parents with text children
-                for parent_id, texts in parent_texts.items():
-                    # Find the parent element
-                    parent = None
-                    for elem in flattened_elements:
-                        if elem.get('index') == parent_id:
-                            parent = elem
-                            break
-                    
-                    if parent:
-                        # Mark if this element is directly tappable
-                        tappable_marker = "🔘" if parent_id in tappable_elements else "📄"
-                        summary = f"{tappable_marker} Element {parent_id} ({parent.get('className', 'Unknown')}): " + " | ".join(texts)
-                        text_summary.append(summary)
-                
-                # Sort the text summary for better readability
-                text_summary.sort()
+                # Update the device's element store with the processed elements
+                generation = None
+                if commit:
+                    generation = get_element_store(device.serial).update(flattened_elements, tree["by_index"])
                 
                 # Count how many elements are actually tappable
-                tappable_count = len(tappable_elements)
-                
-                # Add a short sleep to ensure UI is fully loaded/processed
-                await asyncio.sleep(0.5)  # 500ms sleep
+                tappable_count = len(tappable_indices)
                 
                 return {
                     "clickable_elements": flattened_elements,
                     "count": len(flattened_elements),
                     "tappable_count": tappable_count,
-                    "tappable_indices": sorted(tappable_elements),
+                    "tappable_indices": tappable_indices,
                     "text_summary": text_summary,
+                    "backend": backend,
+                    "idle": idle["idle"] if idle else None,
+                    "idle_wait_ms": round(idle["waited_ms"], 1) if idle else 0.0,
+                    "generation": generation,
                     "message": f"Found {tappable_count} tappable elements out of {len(flattened_elements)} total elements"
                 }
-            except json.JSONDecodeError:
-                raise ValueError("Failed to parse UI elements JSON data")
+            except (AttributeError, TypeError):
+                raise ValueError("Unexpected UI elements JSON structure")
             
         except Exception as e:
-            # Clean up in case of error
-            with contextlib.suppress(OSError):
-                os.unlink(local_path)
             raise ValueError(f"Error retrieving clickable elements: {e}")
             
     except Exception as e:
         raise ValueError(f"Error getting clickable elements: {e}")
 
-async def tap_by_index(index: int, serial: Optional[str] = None) -> str:
+def commit_clickables(serial: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Store the elements of an uncommitted get_clickables result.
+    
+    Args:
+        serial: Serial number of the device the result was read from
+        result: Result of get_clickables(commit=False)
+    
+    Returns:
+        The result, with the 'generation' of the screen in the element store
+    """
+    result["generation"] = get_element_store(serial).update(result["clickable_elements"])
+    return result
+
+async def tap_by_index(
+    index: int,
+    serial: Optional[str] = None,
+    wait_for_idle: bool = False,
+    max_idle_wait: float = 3.0,
+    generation: Optional[int] = None
+) -> str:
     """
     Tap on a UI element by its index.
     
-    This function uses the cached clickable elements from the last get_clickables call
+    This function uses the device's element store from the last get_clickables call
     to find the element with the given index and tap on its center coordinates.
     
     Args:
         index: Index of the element to tap
         serial: Optional device serial (for backward compatibility)
+        wait_for_idle: Wait for the screen to settle after tapping
+        max_idle_wait: Maximum time to wait for the screen to settle in seconds
+        generation: Optional screen generation the index was taken from; the tap
+                    is refused if the store has been refreshed since
     
     Returns:
         Result message
     """
-    global CLICKABLE_ELEMENTS_CACHE
-    
     try:
+        store = get_element_store(serial or get_device_serial())
+        
         # Check if we have cached elements
-        if not CLICKABLE_ELEMENTS_CACHE:
+        if not len(store):
             return "Error: No UI elements cached. Call get_clickables first."
         
+        if store.is_stale(generation):
+            return (f"Error: Index {index} refers to screen generation {generation}, but the "
+                    f"elements were refreshed since (generation {store.generation}). "
+                    f"Call get_clickables again.")
+        
         # Find the element with the given index
-        element = None
-        for item in CLICKABLE_ELEMENTS_CACHE:
-            if item.get('index') == index:
-                element = item
-                break
+        element = store.get(index)
         
         if not element:
             # List available indices to help the user
-            indices = sorted([item.get('index') for item in CLICKABLE_ELEMENTS_CACHE if item.get('index') is not None])
+            indices = store.indices()
             indices_str = ", ".join(str(idx) for idx in indices[:20])
             if len(indices) > 20:
                 indices_str += f"... and {len(indices) - 20} more"
@@ -310,7 +230,7 @@ async def tap_by_index(index: int, serial: Optional[str] = None) -> str:
         
         # Get the device and tap at the coordinates
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -336,12 +256,10 @@ async def tap_by_index(index: int, serial: Optional[str] = None) -> str:
         # If it's a parent element, include information about its text children
         if is_parent:
             # Find all child elements that are text elements
-            text_children = []
-            for item in CLICKABLE_ELEMENTS_CACHE:
-                if (item.get('parentIndex') == index and 
-                    item.get('type') == 'text' and 
-                    item.get('text')):
-                    text_children.append(item.get('text'))
+            text_children = [
+                item.get('text') for item in store.children(index)
+                if item.get('type') == 'text' and item.get('text')
+            ]
             
             if text_children:
                 response_parts.append(f"Contains text: {' | '.join(text_children)}")
@@ -350,30 +268,28 @@ async def tap_by_index(index: int, serial: Optional[str] = None) -> str:
         if not is_parent and 'parentIndex' in element:
             parent_index = element.get('parentIndex')
             # Find the parent element
-            parent = None
-            for item in CLICKABLE_ELEMENTS_CACHE:
-                if item.get('index') == parent_index:
-                    parent = item
-                    break
+            parent = store.parent(index)
             
             if parent:
                 parent_text = parent.get('text', 'No text')
                 response_parts.append(f"Parent: {parent_index} ('{parent_text}')")
                 
                 # Find sibling text elements (other children of the same parent)
-                sibling_texts = []
-                for item in CLICKABLE_ELEMENTS_CACHE:
-                    if (item.get('parentIndex') == parent_index and 
-                        item.get('index') != index and
-                        item.get('type') == 'text' and 
-                        item.get('text')):
-                        sibling_texts.append(item.get('text'))
+                sibling_texts = [
+                    item.get('text') for item in store.siblings(index)
+                    if item.get('index') != index and item.get('type') == 'text' and item.get('text')
+                ]
                 
                 if sibling_texts:
                     response_parts.append(f"Related text: {' | '.join(sibling_texts)}")
         
         response_parts.append(f"Coordinates: ({x}, {y})")
         
+        if wait_for_idle:
+            idle = await device.wait_for_idle(max_wait=max_idle_wait)
+            state = "settled" if idle["idle"] else "still changing"
+            response_parts.append(f"UI {state} after {idle['waited_ms']:.0f}ms")
+        
         return " | ".join(response_parts)
     except ValueError as e:
         return f"Error: {str(e)}"
@@ -390,7 +306,7 @@ async def tap_by_coordinates(x: int, y: int, serial: Optional[str] = None) -> st
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -403,7 +319,13 @@ async def tap_by_coordinates(x: int, y: int, serial: Optional[str] = None) -> st
         return f"Error: {str(e)}"
 
 # Replace the old tap function with the new one
-async def tap(index: int, serial: Optional[str] = None) -> str:
+async def tap(
+    index: int,
+    serial: Optional[str] = None,
+    wait_for_idle: bool = False,
+    max_idle_wait: float = 3.0,
+    generation: Optional[int] = None
+) -> str:
     """
     Tap on a UI element by its index.
     
@@ -413,11 +335,14 @@ async def tap(index: int, serial: Optional[str] = None) -> str:
     Args:
         index: Index of the element to tap
         serial: Optional device serial (for backward compatibility)
+        wait_for_idle: Wait for the screen to settle after tapping
+        max_idle_wait: Maximum time to wait for the screen to settle in seconds
+        generation: Optional screen generation the index was taken from
     
     Returns:
         Result message
     """
-    return await tap_by_index(index, serial)
+    return await tap_by_index(index, serial, wait_for_idle, max_idle_wait, generation)
 
 async def swipe(
     start_x: int,
@@ -440,7 +365,7 @@ async def swipe(
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -461,7 +386,7 @@ async def input_text(text: str, serial: Optional[str] = None) -> str:
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -558,7 +483,7 @@ async def press_key(keycode: int, serial: Optional[str] = None) -> str:
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -583,7 +508,9 @@ async def press_key(keycode: int, serial: Optional[str] = None) -> str:
 async def start_app(
     package: str,
     activity: str = "",
-    serial: Optional[str] = None
+    serial: Optional[str] = None,
+    wait_for_idle: bool = False,
+    max_idle_wait: float = 5.0
 ) -> str:
     """
     Start an app on the device.
@@ -592,10 +519,12 @@ async def start_app(
         package: Package name (e.g., "com.android.settings")
         activity: Optional activity name
         serial: Optional device serial (for backward compatibility)
+        wait_for_idle: Wait for the app's first screen to settle
+        max_idle_wait: Maximum time to wait for the screen to settle in seconds
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -603,6 +532,10 @@ async def start_app(
             device = await get_device()
         
         result = await device.start_app(package, activity)
+        if wait_for_idle:
+            idle = await device.wait_for_idle(max_wait=max_idle_wait)
+            state = "settled" if idle["idle"] else "still changing"
+            result = f"{result or f'Started {package}'} (UI {state} after {idle['waited_ms']:.0f}ms)"
         return result
     except ValueError as e:
         return f"Error: {str(e)}"
@@ -624,7 +557,7 @@ async def install_app(
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -654,7 +587,7 @@ async def uninstall_app(
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 return f"Error: Device {serial} not found"
@@ -666,26 +599,37 @@ async def uninstall_app(
     except ValueError as e:
         return f"Error: {str(e)}"
 
-async def take_screenshot(serial: Optional[str] = None) -> Tuple[str, bytes]:
+async def take_screenshot(
+    serial: Optional[str] = None,
+    max_dimension: Optional[int] = None,
+    image_format: str = "JPEG"
+) -> Tuple[str, bytes, Dict[str, Any]]:
     """
     Take a screenshot of the device.
     
     Args:
         serial: Optional device serial (for backward compatibility)
+        max_dimension: Optional maximum size of the longest side in pixels
+        image_format: Output format ('JPEG', 'WEBP' or 'PNG')
     
     Returns:
-        Tuple of (local file path, screenshot data as bytes)
+        Tuple of (local file path, screenshot data as bytes, metadata). The
+        screenshot is captured in memory, so the path is empty. The metadata
+        contains the image size, the device screen size and the 'scale' factor
+        between them.
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 raise ValueError(f"Device {serial} not found")
         else:
             device = await get_device()
         
-        return await device.take_screenshot()
+        screenshot = await device.get_screenshot(max_dimension=max_dimension, image_format=image_format)
+        info = {k: v for k, v in screenshot.items() if k != "data"}
+        return "", screenshot["data"], info
     except ValueError as e:
         raise ValueError(f"Error taking screenshot: {str(e)}")
 
@@ -708,7 +652,7 @@ async def list_packages(
     """
     try:
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 raise ValueError(f"Device {serial} not found")
@@ -799,75 +743,28 @@ async def get_all_elements(serial: Optional[str] = None) -> Dict[str, Any]:
     try:
         # Get the device
         if serial:
-            device_manager = DeviceManager()
+            device_manager = get_shared_device_manager()
             device = await device_manager.get_device(serial)
             if not device:
                 raise ValueError(f"Device {serial} not found")
         else:
             device = await get_device()
         
-        # Create a temporary file for the JSON
-        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as temp:
-            local_path = temp.name
-        
         try:
-            # Clear logcat to make it easier to find our output
-            await device._adb.shell(device._serial, "logcat -c")
-            
-            # Trigger the custom service via broadcast to get ALL elements
-            await device._adb.shell(device._serial, "am broadcast -a com.droidrun.portal.GET_ALL_ELEMENTS")
-            
-            # Poll for the JSON file path
-            start_time = asyncio.get_event_loop().time()
-            max_wait_time = 10  # Maximum wait time in seconds
-            poll_interval = 0.2  # Check every 200ms
-            
-            device_path = None
-            while asyncio.get_event_loop().time() - start_time < max_wait_time:
-                # Check logcat for the file path
-                logcat_output = await device._adb.shell(device._serial, "logcat -d \"DROIDRUN_FILE:E *:s\" | grep \"JSON data written to\" | tail -1")
-                
-                # Parse the file path if present
-                match = re.search(r"JSON data written to: (.*)", logcat_output)
-                if match:
-                    device_path = match.group(1).strip()
-                    break
-                    
-                # Wait before polling again
-                await asyncio.sleep(poll_interval)
-            
-            # Check if we found the file path
-            if not device_path:
-                raise ValueError(f"Failed to find the JSON file path in logcat after {max_wait_time} seconds")
-                
-            # Pull the JSON file from the device
-            await device._adb.pull_file(device._serial, device_path, local_path)
+            # Fetch the element tree through the fastest working Portal backend
+            ui_data, backend = await fetch_ui_data(device, all_elements=True)
             
-            # Read the JSON file
-            async with aiofiles.open(local_path, "r", encoding="utf-8") as f:
-                json_content = await f.read()
-                
-            # Clean up the temporary file
-            with contextlib.suppress(OSError):
-                os.unlink(local_path)
-            
-            # Try to parse the JSON
-            import json
             try:
-                ui_data = json.loads(json_content)
-                
                 return {
                     "all_elements": ui_data,
                     "count": len(ui_data) if isinstance(ui_data, list) else sum(1 for _ in ui_data.get("elements", [])),
+                    "backend": backend,
                     "message": "Retrieved all UI elements from the device screen"
                 }
-            except json.JSONDecodeError:
-                raise ValueError("Failed to parse UI elements JSON data")
+            except (AttributeError, TypeError):
+                raise ValueError("Unexpected UI elements JSON structure")
             
         except Exception as e:
-            # Clean up in case of error
-            with contextlib.suppress(OSError):
-                os.unlink(local_path)
             raise ValueError(f"Error retrieving all UI elements: {e}")
             
     except Exception as e:
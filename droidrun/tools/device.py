@@ -3,14 +3,14 @@ Device Manager - Handles Android device connections and management.
 """
 
 from typing import Optional, List
-from droidrun.adb import Device, DeviceManager as ADBDeviceManager
+from droidrun.adb import Device, get_shared_device_manager
 
 class DeviceManager:
     """Manages Android device connections and operations."""
     
     def __init__(self):
-        """Initialize the device manager."""
-        self._manager = ADBDeviceManager()
+        """Initialize the device manager on top of the process-wide registry."""
+        self._manager = get_shared_device_manager()
         
     async def connect(self, ip_address: str, port: int = 5555) -> Optional[Device]:
         """Connect to an Android device over TCP/IP."""
@@ -26,4 +26,8 @@ class DeviceManager:
         
     async def get_device(self, serial: str) -> Optional[Device]:
         """Get a specific device by serial number."""
-        return await self._manager.get_device(serial)
\ No newline at end of file
+        return await self._manager.get_device(serial)
+        
+    def invalidate(self, serial: Optional[str] = None) -> None:
+        """Invalidate cached device state in the shared registry."""
+        self._manager.invalidate(serial)
\ No newline at end of file
@@ -0,0 +1,121 @@
+"""
+Element Store - Per-device cache of the last observed UI elements.
+"""
+
+from typing import Any, Dict, List, Optional
+
+class ElementStore:
+    """UI elements from the last get_clickables call on one device.
+
+    Elements are indexed by their Portal 'index' and by parent, so lookups
+    for an element, its parent and its siblings are O(1). Every update bumps
+    a screen generation counter, which lets callers detect lookups made
+    against an older screen.
+    """
+
+    def __init__(self, serial: str):
+        """Initialize an empty store.
+
+        Args:
+            serial: Device serial number
+        """
+        self.serial = serial
+        self.generation = 0
+        self._elements: List[Dict[str, Any]] = []
+        self._by_index: Dict[int, Dict[str, Any]] = {}
+        self._children: Dict[int, List[Dict[str, Any]]] = {}
+
+    def update(
+        self,
+        elements: List[Dict[str, Any]],
+        by_index: Optional[Dict[int, Dict[str, Any]]] = None
+    ) -> int:
+        """Replace the stored elements with a new screen.
+
+        Args:
+            elements: Flattened elements with 'index' and optional 'parentIndex'
+            by_index: Index of the elements, if the caller already built it
+
+        Returns:
+            The new screen generation
+        """
+        build_index = by_index is None
+        by_index = {} if build_index else by_index
+        children: Dict[int, List[Dict[str, Any]]] = {}
+        for element in elements:
+            index = element.get('index')
+            if build_index and index is not None:
+                by_index.setdefault(index, element)
+            parent_index = element.get('parentIndex')
+            if parent_index is not None:
+                children.setdefault(parent_index, []).append(element)
+
+        self._elements = elements
+        self._by_index = by_index
+        self._children = children
+        self.generation += 1
+        return self.generation
+
+    def clear(self) -> None:
+        """Forget the stored elements (the generation keeps counting)."""
+        self.update([])
+
+    @property
+    def elements(self) -> List[Dict[str, Any]]:
+        """All stored elements in their original order."""
+        return self._elements
+
+    def get(self, index: int) -> Optional[Dict[str, Any]]:
+        """Get the element with the given index."""
+        return self._by_index.get(index)
+
+    def parent(self, index: int) -> Optional[Dict[str, Any]]:
+        """Get the parent of the element with the given index."""
+        element = self._by_index.get(index)
+        if element is None or element.get('parentIndex') is None:
+            return None
+        return self._by_index.get(element['parentIndex'])
+
+    def children(self, index: int) -> List[Dict[str, Any]]:
+        """Get the direct children of the element with the given index."""
+        return self._children.get(index, [])
+
+    def siblings(self, index: int) -> List[Dict[str, Any]]:
+        """Get the other children of the element's parent."""
+        element = self._by_index.get(index)
+        if element is None or element.get('parentIndex') is None:
+            return []
+        return [e for e in self._children.get(element['parentIndex'], []) if e is not element]
+
+    def indices(self) -> List[int]:
+        """Get all element indices in ascending order."""
+        return sorted(self._by_index)
+
+    def is_stale(self, generation: Optional[int]) -> bool:
+        """Check whether a generation refers to an older screen than the stored one.
+
+        Args:
+            generation: Generation returned by get_clickables (None is never stale)
+        """
+        return generation is not None and generation != self.generation
+
+    def __len__(self) -> int:
+        return len(self._elements)
+
+# One store per device serial
+_stores: Dict[str, ElementStore] = {}
+
+def get_element_store(serial: str) -> ElementStore:
+    """Get the element store of a device, creating it if needed.
+
+    Args:
+        serial: Device serial number
+
+    Returns:
+        The device's element store
+    """
+    store = _stores.get(serial)
+    if store is None:
+        store = ElementStore(serial)
+        _stores[serial] = store
+    return store
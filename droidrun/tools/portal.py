@@ -0,0 +1,258 @@
+"""
+Portal - Retrieval of UI element data from the DroidRun Portal app.
+
+The Portal accessibility service can hand over the element tree in several
+ways. Each retrieval strategy is a backend; the fastest one that works on a
+device is remembered per serial, and the original logcat strategy is kept as
+the fallback.
+"""
+
+import os
+import re
+import json
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from droidrun.adb import Device
+
+# Set up logger
+logger = logging.getLogger("droidrun")
+
+PORTAL_PACKAGE = "com.droidrun.portal"
+PORTAL_CONTENT_URI = f"content://{PORTAL_PACKAGE}"
+
+# Broadcast actions understood by the Portal service
+ACTION_GET_ELEMENTS = f"{PORTAL_PACKAGE}.GET_ELEMENTS"
+ACTION_GET_ALL_ELEMENTS = f"{PORTAL_PACKAGE}.GET_ALL_ELEMENTS"
+
+class PortalBackend:
+    """Base class for a strategy that fetches the element tree from the Portal."""
+
+    name = "base"
+
+    async def fetch(self, device: Device, all_elements: bool = False) -> Any:
+        """Fetch and parse the UI element JSON.
+
+        Args:
+            device: Device to read from
+            all_elements: Fetch all elements instead of only interactive ones
+
+        Returns:
+            Parsed JSON data as produced by the Portal
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _parse_payload(payload: str) -> Any:
+        """Parse Portal JSON, unwrapping a {"status": ..., "data": ...} envelope."""
+        data = json.loads(payload)
+        if isinstance(data, dict) and "data" in data and "status" in data:
+            if data.get("status") != "success":
+                raise ValueError(f"Portal returned an error: {data.get('error') or data.get('data')}")
+            data = data["data"]
+            if isinstance(data, str):
+                data = json.loads(data)
+        return data
+
+class ContentProviderBackend(PortalBackend):
+    """Reads the element tree from the Portal's content provider in one shell call."""
+
+    name = "content_provider"
+
+    def __init__(self, base_uri: str = PORTAL_CONTENT_URI):
+        """Initialize the backend.
+
+        Args:
+            base_uri: Content provider base URI of the Portal
+        """
+        self.base_uri = base_uri
+
+    async def fetch(self, device: Device, all_elements: bool = False) -> Any:
+        path = "all_elements" if all_elements else "clickable_elements"
+        output = await device._adb.shell(
+            device._serial, f"content query --uri {self.base_uri}/{path}"
+        )
+
+        # Output looks like: "Row: 0 result={...}"
+        marker = output.find("result=")
+        if marker == -1:
+            raise ValueError(f"Unexpected content provider output: {output[:200]}")
+        return self._parse_payload(output[marker + len("result="):].strip())
+
+class SocketBackend(PortalBackend):
+    """Reads the element tree over HTTP from a port forwarded with `adb forward`."""
+
+    name = "socket"
+
+    def __init__(self, device_port: int = 8080, local_port: Optional[int] = None, timeout: float = 5.0):
+        """Initialize the backend.
+
+        Args:
+            device_port: Port the Portal listens on inside the device
+            local_port: Local port to forward (defaults to the device port)
+            timeout: Request timeout in seconds
+        """
+        self.device_port = device_port
+        self.local_port = local_port or device_port
+        self.timeout = timeout
+        self._forwarded: Dict[str, int] = {}
+
+    async def _ensure_forward(self, device: Device) -> int:
+        """Create the port forward once per device."""
+        if device.serial not in self._forwarded:
+            await device._adb._run_device_command(
+                device._serial,
+                ["forward", f"tcp:{self.local_port}", f"tcp:{self.device_port}"],
+                timeout=5.0
+            )
+            self._forwarded[device.serial] = self.local_port
+        return self._forwarded[device.serial]
+
+    async def fetch(self, device: Device, all_elements: bool = False) -> Any:
+        port = await self._ensure_forward(device)
+        path = "/all_elements" if all_elements else "/clickable_elements"
+
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection("127.0.0.1", port), self.timeout
+        )
+        try:
+            writer.write(
+                f"GET {path} HTTP/1.0\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode("ascii")
+            )
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), self.timeout)
+        finally:
+            writer.close()
+
+        head, _, body = response.partition(b"\r\n\r\n")
+        status_line = head.split(b"\r\n", 1)[0].decode("ascii", errors="replace")
+        if " 200 " not in f"{status_line} ":
+            self._forwarded.pop(device.serial, None)
+            raise ValueError(f"Portal socket returned: {status_line or 'no response'}")
+        return self._parse_payload(body.decode("utf-8"))
+
+class LogcatBackend(PortalBackend):
+    """Original strategy: broadcast, poll logcat for the output path, then read the file."""
+
+    name = "logcat"
+
+    def __init__(self, max_wait_time: float = 10.0, poll_interval: float = 0.2):
+        """Initialize the backend.
+
+        Args:
+            max_wait_time: Maximum time to wait for the Portal in seconds
+            poll_interval: Delay between logcat polls in seconds
+        """
+        self.max_wait_time = max_wait_time
+        self.poll_interval = poll_interval
+
+    async def fetch(self, device: Device, all_elements: bool = False) -> Any:
+        action = ACTION_GET_ALL_ELEMENTS if all_elements else ACTION_GET_ELEMENTS
+
+        # Clear logcat to make it easier to find our output, then trigger the service
+        await device._adb.shell(device._serial, f"logcat -c && am broadcast -a {action}")
+
+        # Poll for the JSON file path
+        start_time = asyncio.get_event_loop().time()
+        device_path = None
+        while asyncio.get_event_loop().time() - start_time < self.max_wait_time:
+            # Check logcat for the file path
+            logcat_output = await device._adb.shell(device._serial, "logcat -d \"DROIDRUN_FILE:E *:s\" | grep \"JSON data written to\" | tail -1")
+
+            # Parse the file path if present
+            match = re.search(r"JSON data written to: (.*)", logcat_output)
+            if match:
+                device_path = match.group(1).strip()
+                break
+
+            # Wait before polling again
+            await asyncio.sleep(self.poll_interval)
+
+        # Check if we found the file path
+        if not device_path:
+            raise ValueError(f"Failed to find the JSON file path in logcat after {self.max_wait_time} seconds")
+
+        # Stream the file straight into memory instead of pulling it to a temp file
+        content = await device._adb.exec_out(device._serial, f"cat {device_path}", timeout=60.0)
+        try:
+            return json.loads(content.decode("utf-8"))
+        except json.JSONDecodeError:
+            raise ValueError("Failed to parse UI elements JSON data")
+
+# Registered backends, in the order tried by "auto"
+BACKENDS: Dict[str, PortalBackend] = {
+    ContentProviderBackend.name: ContentProviderBackend(),
+    SocketBackend.name: SocketBackend(),
+    LogcatBackend.name: LogcatBackend(),
+}
+
+# Backends tried by "auto" (the socket backend needs a Portal server, so it is opt-in)
+AUTO_ORDER: List[str] = [ContentProviderBackend.name, LogcatBackend.name]
+
+# Backend that worked last for each device serial
+_active_backends: Dict[str, str] = {}
+
+def register_backend(backend: PortalBackend, auto: bool = False) -> None:
+    """Register a retrieval backend.
+
+    Args:
+        backend: Backend instance
+        auto: Also try it in "auto" mode, before the logcat fallback
+    """
+    BACKENDS[backend.name] = backend
+    if auto and backend.name not in AUTO_ORDER:
+        AUTO_ORDER.insert(len(AUTO_ORDER) - 1, backend.name)
+
+def get_backend_order(serial: str, preferred: Optional[str] = None) -> List[str]:
+    """Get the backends to try for a device, most promising first.
+
+    Args:
+        serial: Device serial number
+        preferred: Backend name, or "auto" (defaults to DROIDRUN_PORTAL_BACKEND)
+
+    Returns:
+        Ordered list of backend names
+    """
+    preferred = (preferred or os.environ.get("DROIDRUN_PORTAL_BACKEND", "auto")).lower()
+    if preferred != "auto":
+        if preferred not in BACKENDS:
+            raise ValueError(f"Unknown Portal backend: {preferred}")
+        return [preferred]
+
+    order = list(AUTO_ORDER)
+    active = _active_backends.get(serial)
+    if active in order:
+        # Start with the backend that worked last; the ones before it failed
+        order = order[order.index(active):]
+    return order
+
+async def fetch_ui_data(
+    device: Device,
+    all_elements: bool = False,
+    backend: Optional[str] = None
+) -> Tuple[Any, str]:
+    """Fetch the UI element JSON from the Portal using the best available backend.
+
+    Args:
+        device: Device to read from
+        all_elements: Fetch all elements instead of only interactive ones
+        backend: Backend name, or "auto" (defaults to DROIDRUN_PORTAL_BACKEND)
+
+    Returns:
+        Tuple of (parsed JSON data, name of the backend that returned it)
+    """
+    errors = []
+    for name in get_backend_order(device.serial, backend):
+        try:
+            ui_data = await BACKENDS[name].fetch(device, all_elements)
+        except Exception as e:
+            logger.debug(f"Portal backend '{name}' failed on {device.serial}: {e}")
+            errors.append(f"{name}: {e}")
+            continue
+
+        if _active_backends.get(device.serial) != name:
+            logger.info(f"Using Portal backend '{name}' for {device.serial}")
+            _active_backends[device.serial] = name
+        return ui_data, name
+
+    raise ValueError("; ".join(errors))
@@ -0,0 +1,180 @@
+"""
+UI Diff - Differences between successive UI element snapshots.
+
+Nodes are matched by class, resource id, text and bounds, so a screen that
+barely changed after a tap or swipe can be reported as a short diff instead
+of the full element list.
+"""
+
+import hashlib
+from collections import defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .ui_encoder import bounds_center, short_class_name
+
+def _resource_id(element: Dict[str, Any]) -> str:
+    return element.get('resourceId') or element.get('resource_id') or ''
+
+def node_key(element: Dict[str, Any]) -> Tuple[str, str, str, str]:
+    """Identity of a node: (class, resource id, text, bounds)."""
+    return (
+        element.get('className') or '',
+        _resource_id(element),
+        element.get('text') or '',
+        element.get('bounds') or '',
+    )
+
+def _hash(parts: List[str]) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x1e")
+    return digest.hexdigest()[:12]
+
+def screen_hash(elements: List[Dict[str, Any]]) -> str:
+    """Stable hash of a screen's content (independent of element order).
+
+    Args:
+        elements: Flattened UI elements
+
+    Returns:
+        12-character hex hash
+    """
+    return _hash(sorted("\x1f".join(node_key(element)) for element in elements))
+
+def screen_family(elements: List[Dict[str, Any]]) -> str:
+    """Hash of a screen's layout, ignoring texts, positions and repetitions.
+
+    Screens of the same family (e.g. a list before and after scrolling, or a
+    form before and after typing) can be described as a diff of each other.
+
+    Args:
+        elements: Flattened UI elements
+
+    Returns:
+        12-character hex hash
+    """
+    return _hash(sorted({f"{element.get('className') or ''}\x1f{_resource_id(element)}" for element in elements}))
+
+def _match(
+    old: List[Dict[str, Any]],
+    new: List[Dict[str, Any]],
+    key: Callable[[Dict[str, Any]], Hashable]
+) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any]]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Pair old and new nodes with equal keys, in order of appearance.
+
+    Returns:
+        Tuple of (pairs, unmatched old nodes, unmatched new nodes)
+    """
+    pending: Dict[Hashable, List[Dict[str, Any]]] = defaultdict(list)
+    for element in reversed(old):
+        pending[key(element)].append(element)
+
+    pairs = []
+    unmatched_new = []
+    for element in new:
+        candidates = pending.get(key(element))
+        if candidates:
+            pairs.append((candidates.pop(), element))
+        else:
+            unmatched_new.append(element)
+    matched_old = {id(before) for before, _ in pairs}
+    unmatched_old = [element for element in old if id(element) not in matched_old]
+    return pairs, unmatched_old, unmatched_new
+
+def diff_screens(old: List[Dict[str, Any]], new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Compute the difference between two UI snapshots.
+
+    Nodes with the same class, resource id, text and bounds are the same
+    node; if its index changed it is reported as changed. Remaining nodes
+    with the same class, resource id and bounds (new text), or the same
+    class, resource id and non-empty text (moved), are changed as well.
+    Everything else was added or removed.
+
+    Args:
+        old: Elements of the previous snapshot
+        new: Elements of the current snapshot
+
+    Returns:
+        Dictionary with 'screen_hash', 'family', 'previous_hash',
+        'same_family', 'added', 'removed', 'changed' (list of
+        {"before", "after"}) and 'unchanged' (count)
+    """
+    pairs, old_rest, new_rest = _match(old, new, node_key)
+    changed = [
+        {"before": before, "after": after}
+        for before, after in pairs
+        if before.get('index') != after.get('index')
+    ]
+    unchanged = len(pairs) - len(changed)
+
+    # Same node with new text
+    pairs, old_rest, new_rest = _match(
+        old_rest, new_rest,
+        lambda e: (e.get('className') or '', _resource_id(e), e.get('bounds') or '')
+    )
+    changed.extend({"before": before, "after": after} for before, after in pairs)
+
+    # Same node, moved
+    old_keyed = [e for e in old_rest if e.get('text') or _resource_id(e)]
+    new_keyed = [e for e in new_rest if e.get('text') or _resource_id(e)]
+    pairs, old_left, new_left = _match(
+        old_keyed, new_keyed,
+        lambda e: (e.get('className') or '', _resource_id(e), e.get('text') or '')
+    )
+    changed.extend({"before": before, "after": after} for before, after in pairs)
+    matched = {id(e) for pair in pairs for e in pair}
+
+    family = screen_family(new)
+    return {
+        "screen_hash": screen_hash(new),
+        "family": family,
+        "previous_hash": screen_hash(old),
+        "same_family": family == screen_family(old),
+        "added": [e for e in new_rest if id(e) not in matched],
+        "removed": [e for e in old_rest if id(e) not in matched],
+        "changed": changed,
+        "unchanged": unchanged,
+    }
+
+def diff_size(diff: Dict[str, Any]) -> int:
+    """Number of nodes reported by a diff."""
+    return len(diff["added"]) + len(diff["removed"]) + len(diff["changed"])
+
+def _describe(element: Dict[str, Any], tappable: Optional[set] = None) -> str:
+    """One-line description of a node, in the ui_encoder outline style."""
+    index = element.get('index')
+    star = '*' if tappable is not None and index in tappable else ''
+    line = f"{index}{star} {short_class_name(element.get('className'))}"
+    text = (element.get('text') or '').strip().replace("\n", " ")
+    if text:
+        line += f' "{text}"'
+    center = bounds_center(element.get('bounds'))
+    if center and star:
+        line += f" @{center}"
+    return line
+
+def encode_diff(diff: Dict[str, Any], tappable_indices: Optional[List[int]] = None) -> str:
+    """Render a diff as compact text for the LLM.
+
+    Args:
+        diff: Result of diff_screens
+        tappable_indices: Indices of tappable elements in the new snapshot
+
+    Returns:
+        Header line followed by one line per added (+), removed (-) and
+        changed (~) node
+    """
+    tappable = set(tappable_indices or [])
+    lines = [
+        f"Screen {diff['screen_hash']} changed from {diff['previous_hash']} "
+        f"(same layout; {diff['unchanged']} elements unchanged, indices kept): "
+        f"+{len(diff['added'])} -{len(diff['removed'])} ~{len(diff['changed'])}"
+    ]
+    for element in diff["added"]:
+        lines.append(f"+ {_describe(element, tappable)}")
+    for element in diff["removed"]:
+        lines.append(f"- {_describe(element)}")
+    for change in diff["changed"]:
+        lines.append(f"~ {_describe(change['before'])} -> {_describe(change['after'], tappable)}")
+    return "\n".join(lines)
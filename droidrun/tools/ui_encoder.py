@@ -0,0 +1,106 @@
+"""
+UI Encoder - Compact text rendering of UI elements for the LLM.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Explains the outline format, sent once with every encoded screen
+LEGEND = 'index class "text" @x,y (* = tappable, indented under its parent)'
+
+def short_class_name(class_name: Optional[str]) -> str:
+    """Strip the package from a class name ('android.widget.Button' -> 'Button')."""
+    if not class_name:
+        return "View"
+    return class_name.rsplit(".", 1)[-1]
+
+def bounds_center(bounds: Optional[str]) -> Optional[str]:
+    """Get the center of 'left,top,right,bottom' bounds as 'x,y'."""
+    if not bounds:
+        return None
+    try:
+        left, top, right, bottom = (int(value) for value in bounds.split(","))
+    except ValueError:
+        return None
+    return f"{(left + right) // 2},{(top + bottom) // 2}"
+
+def encode_elements(
+    elements: List[Dict[str, Any]],
+    tappable_indices: Optional[Iterable[int]] = None,
+    max_text_length: int = 80
+) -> str:
+    """Render flattened UI elements as a compact indented outline.
+
+    Each element takes one line with its index, short class name, text and
+    center coordinates, indented under its parent. Containers without text
+    that cannot be tapped are left out (their children move up a level), and
+    on elements that cannot be tapped, a text equal to the parent's text or a
+    sibling's is not repeated. Tappable elements always keep their text, so
+    rows sharing a label (e.g. several "Delete" buttons) stay labeled.
+
+    Args:
+        elements: Flattened elements as returned by get_clickables
+                  (with 'index' and optional 'parentIndex')
+        tappable_indices: Indices of tappable elements (defaults to clickable
+                          elements with bounds and top-level parents)
+        max_text_length: Texts longer than this are shortened
+
+    Returns:
+        Outline text, one line per element, preceded by a legend line
+    """
+    if tappable_indices is None:
+        tappable: Set[int] = {
+            element.get('index') for element in elements
+            if element.get('bounds') and (element.get('type') == 'clickable' or element.get('isParent'))
+        }
+    else:
+        tappable = set(tappable_indices)
+
+    # Walk the tree depth-first so children follow their parent, whatever
+    # the order of the indices
+    present = {element.get('index') for element in elements}
+    children: Dict[Any, List[Dict[str, Any]]] = {}
+    roots = []
+    for element in elements:
+        parent_index = element.get('parentIndex')
+        if parent_index is not None and parent_index in present:
+            children.setdefault(parent_index, []).append(element)
+        else:
+            roots.append(element)
+
+    lines = [LEGEND]
+    sibling_texts: Dict[Any, Set[str]] = {}
+    # Stack of (element, level of the nearest emitted ancestor, its text)
+    stack = [(element, -1, '') for element in reversed(roots)]
+    while stack:
+        element, parent_level, parent_text = stack.pop()
+        index = element.get('index')
+
+        text = (element.get('text') or '').strip().replace("\n", " ")
+        siblings = sibling_texts.setdefault(element.get('parentIndex'), set())
+        is_tappable = index in tappable
+        if text and not is_tappable and (text == parent_text or text in siblings):
+            text = ''
+
+        if not text and not is_tappable:
+            # Skip the container, its children take its level
+            level, own_text = parent_level, parent_text
+        else:
+            level = parent_level + 1
+            own_text = text or parent_text
+            if text:
+                siblings.add(text)
+                if len(text) > max_text_length:
+                    text = text[:max_text_length - 1] + "…"
+
+            line = f"{'  ' * level}{index}{'*' if is_tappable else ''} {short_class_name(element.get('className'))}"
+            if text:
+                line += f' "{text}"'
+            center = bounds_center(element.get('bounds'))
+            if center and is_tappable:
+                line += f" @{center}"
+            lines.append(line)
+
+        for child in reversed(children.get(index, [])):
+            stack.append((child, level, own_text))
+
+    return "\n".join(lines)
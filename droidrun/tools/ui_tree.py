@@ -0,0 +1,99 @@
+"""
+UI Tree - Flattening of the Portal element tree.
+"""
+
+from typing import Any, Dict, List
+
+def flatten_ui_tree(ui_data: Any) -> Dict[str, Any]:
+    """Flatten the Portal element tree in a single pass.
+
+    Walks the tree iteratively to any depth and builds, in the same pass,
+    the flat element list, the index of elements, the set of tappable
+    elements and the texts of each parent. Top-level elements are kept only
+    if they are clickable; descendants are kept whenever they have a valid
+    index, with 'parentIndex' pointing to the nearest kept ancestor and
+    'grandparentIndex' to the one above it.
+
+    Args:
+        ui_data: Parsed Portal JSON (list of root elements, or the older
+                 {"clickable_elements": [...]} format)
+
+    Returns:
+        Dictionary with:
+        - elements: Flattened elements sorted by index (without 'children')
+        - by_index: Mapping of index to flattened element
+        - tappable_indices: Sorted indices of elements that can be tapped
+        - text_summary: One line per parent summarizing its text children
+    """
+    elements: List[Dict[str, Any]] = []
+    by_index: Dict[int, Dict[str, Any]] = {}
+    tappable = set()
+    parent_texts: Dict[int, List[str]] = {}
+
+    if isinstance(ui_data, list):
+        # Stack of (node, parent index, grandparent index, is root)
+        stack = [(node, None, None, True) for node in reversed(ui_data)]
+        while stack:
+            node, parent_index, grandparent_index, is_root = stack.pop()
+            index = node.get('index', -1)
+
+            kept = index != -1 and (not is_root or node.get('type') == 'clickable')
+            if kept:
+                element = {k: v for k, v in node.items() if k != 'children'}
+                element['isParent'] = is_root
+                if not is_root:
+                    element['parentIndex'] = parent_index
+                    if grandparent_index is not None:
+                        element['grandparentIndex'] = grandparent_index
+                elements.append(element)
+                by_index.setdefault(index, element)
+
+                if element.get('bounds') and (element.get('type') == 'clickable' or is_root):
+                    tappable.add(index)
+                if element.get('type') == 'text' and element.get('text') and parent_index is not None:
+                    parent_texts.setdefault(parent_index, []).append(element['text'])
+
+            children = node.get('children')
+            if children:
+                # Roots are always the parent of their children, kept or not
+                if kept or is_root:
+                    child_parent, child_grandparent = index, parent_index
+                else:
+                    child_parent, child_grandparent = parent_index, grandparent_index
+                for child in reversed(children):
+                    stack.append((child, child_parent, child_grandparent, False))
+    else:
+        # Old format handling (dictionary with clickable_elements)
+        for node in ui_data.get("clickable_elements", []):
+            index = node.get('index', -1)
+            if index == -1:
+                continue
+            element = {k: v for k, v in node.items() if k != 'isClickable'}
+            elements.append(element)
+            by_index.setdefault(index, element)
+            if element.get('bounds') and (element.get('type') == 'clickable' or element.get('isParent')):
+                tappable.add(index)
+            parent_index = element.get('parentIndex')
+            if element.get('type') == 'text' and element.get('text') and parent_index is not None:
+                parent_texts.setdefault(parent_index, []).append(element['text'])
+
+    elements.sort(key=lambda x: x.get('index', 0))
+
+    # Create a text summary for parents with text children
+    text_summary = []
+    for parent_index, texts in parent_texts.items():
+        parent = by_index.get(parent_index)
+        if parent is not None:
+            # Mark if this element is directly tappable
+            tappable_marker = "🔘" if parent_index in tappable else "📄"
+            text_summary.append(
+                f"{tappable_marker} Element {parent_index} ({parent.get('className', 'Unknown')}): " + " | ".join(texts)
+            )
+    text_summary.sort()
+
+    return {
+        "elements": elements,
+        "by_index": by_index,
+        "tappable_indices": sorted(tappable),
+        "text_summary": text_summary,
+    }
@@ -0,0 +1,128 @@
+"""
+Fake adb server speaking the host protocol over a local TCP socket.
+
+Supports host:devices-l, host-serial:<serial>:features, host:transport:<serial>,
+the shell v2 and legacy shell services, exec: and sync: RECV. An interactive
+shell (shell:sh) reads one command and then drops the connection. Every service
+request is recorded so tests can check what reached the "device".
+"""
+
+import asyncio
+import struct
+from typing import Dict, List, Optional, Tuple
+
+class FakeADBServer:
+    """A fake adb server with one device and canned command output."""
+
+    def __init__(
+        self,
+        serial: str = "emulator-5554",
+        features: str = "shell_v2,cmd",
+        outputs: Optional[Dict[str, Tuple[bytes, bytes, int]]] = None,
+        files: Optional[Dict[str, bytes]] = None
+    ):
+        """Initialize the server.
+
+        Args:
+            serial: Serial of the only connected device
+            features: Comma-separated device features
+            outputs: (stdout, stderr, exit code) by shell or exec command
+            files: File contents by device path, served over sync
+        """
+        self.serial = serial
+        self.features = features
+        self.outputs = outputs or {}
+        self.files = files or {}
+        self.requests: List[str] = []
+        # Service prefix after whose OKAY the connection is dropped
+        self.drop_after: Optional[str] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port = 0
+
+    async def __aenter__(self) -> "FakeADBServer":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    @staticmethod
+    def _prefixed(data: bytes) -> bytes:
+        return f"{len(data):04x}".encode("ascii") + data
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> str:
+        length = int((await reader.readexactly(4)).decode("ascii"), 16)
+        request = (await reader.readexactly(length)).decode("utf-8")
+        self.requests.append(request)
+        return request
+
+    def _fail(self, writer: asyncio.StreamWriter, message: str) -> None:
+        writer.write(b"FAIL" + self._prefixed(message.encode("utf-8")))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request = await self._read_request(reader)
+            if request == "host:devices-l":
+                writer.write(b"OKAY" + self._prefixed(f"{self.serial}\tdevice product:sdk\n".encode()))
+            elif request == f"host-serial:{self.serial}:features":
+                writer.write(b"OKAY" + self._prefixed(self.features.encode()))
+            elif request.startswith("host:transport:"):
+                if request != f"host:transport:{self.serial}":
+                    self._fail(writer, f"device '{request.split(':', 2)[2]}' not found")
+                else:
+                    writer.write(b"OKAY")
+                    await writer.drain()
+                    await self._serve_device(reader, writer, await self._read_request(reader))
+            else:
+                self._fail(writer, f"unknown host service {request}")
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _serve_device(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, service: str) -> None:
+        kind, _, command = service.partition(":")
+        if kind not in ("shell,v2,raw", "shell", "exec", "sync"):
+            self._fail(writer, f"unknown service {service}")
+            return
+        writer.write(b"OKAY")
+        if self.drop_after and service.startswith(self.drop_after):
+            return
+
+        if service == "shell:sh":
+            # An interactive shell that goes away while running its first command
+            line = await reader.readline()
+            self.requests.append(f"sh: {line.decode('utf-8').strip()}")
+            return
+
+        stdout, stderr, exit_code = self.outputs.get(command, (b"", b"", 0))
+        if kind == "shell,v2,raw":
+            for packet_id, data in ((1, stdout), (2, stderr), (3, bytes([exit_code]))):
+                if data:
+                    writer.write(struct.pack("<BI", packet_id, len(data)) + data)
+        elif kind in ("shell", "exec"):
+            writer.write(stdout + stderr)
+        else:
+            await self._serve_sync(reader, writer)
+
+    async def _serve_sync(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        while True:
+            header = await reader.readexactly(8)
+            tag, length = header[:4], struct.unpack("<I", header[4:])[0]
+            if tag == b"QUIT":
+                return
+            path = (await reader.readexactly(length)).decode("utf-8")
+            self.requests.append(f"RECV {path}")
+            content = self.files.get(path)
+            if content is None:
+                message = b"No such file or directory"
+                writer.write(b"FAIL" + struct.pack("<I", len(message)) + message)
+                return
+            for start in range(0, len(content), 4):
+                chunk = content[start:start + 4]
+                writer.write(b"DATA" + struct.pack("<I", len(chunk)) + chunk)
+            writer.write(b"DONE" + struct.pack("<I", 0))
+            await writer.drain()
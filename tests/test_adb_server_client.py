@@ -0,0 +1,135 @@
+"""Tests for the adb server socket transport against a fake adb server."""
+
+import asyncio
+
+import pytest
+from fake_adb_server import FakeADBServer
+
+from droidrun.adb.wrapper import ADBProtocolError, ADBServerClient, ADBServerUnavailable, ADBWrapper
+
+SERIAL = "emulator-5554"
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+def socket_wrapper(server: FakeADBServer, transport: str = "socket") -> ADBWrapper:
+    # A missing adb binary makes any subprocess fallback fail loudly
+    return ADBWrapper(
+        adb_path="/nonexistent/adb", transport=transport, server_host="127.0.0.1", server_port=server.port
+    )
+
+def test_devices():
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            devices = await socket_wrapper(server).get_devices()
+            return devices, server.requests
+
+    devices, requests = run(scenario())
+    assert devices == [{"serial": SERIAL, "status": "device"}]
+    assert requests == ["host:devices-l"]
+
+def test_shell_v2_switches_transport():
+    async def scenario():
+        outputs = {"getprop ro.product.model": (b"Pixel\n", b"", 0)}
+        async with FakeADBServer(SERIAL, outputs=outputs) as server:
+            output = await socket_wrapper(server).shell(SERIAL, "getprop ro.product.model")
+            return output, server.requests
+
+    output, requests = run(scenario())
+    assert output == "Pixel"
+    assert requests == [
+        f"host-serial:{SERIAL}:features",
+        f"host:transport:{SERIAL}",
+        "shell,v2,raw:getprop ro.product.model",
+    ]
+
+def test_shell_v2_exit_code_and_stderr():
+    async def scenario():
+        outputs = {"ls /missing": (b"", b"No such file\n", 1)}
+        async with FakeADBServer(SERIAL, outputs=outputs) as server:
+            client = ADBServerClient("127.0.0.1", server.port)
+            raw = await client.shell(SERIAL, "ls /missing")
+            with pytest.raises(RuntimeError, match="No such file"):
+                await socket_wrapper(server).shell(SERIAL, "ls /missing")
+            return raw
+
+    assert run(scenario()) == (b"", b"No such file\n", 1)
+
+def test_legacy_shell_without_shell_v2():
+    async def scenario():
+        async with FakeADBServer(SERIAL, features="cmd", outputs={"echo hi": (b"hi\n", b"", 0)}) as server:
+            client = ADBServerClient("127.0.0.1", server.port)
+            return await client.shell(SERIAL, "echo hi"), server.requests[-1]
+
+    assert run(scenario()) == ((b"hi\n", b"", None), "shell:echo hi")
+
+def test_exec_out_is_binary_safe():
+    frame = bytes(range(256)) + b"\r\n\x00"
+
+    async def scenario():
+        async with FakeADBServer(SERIAL, outputs={"screencap -p": (frame, b"", 0)}) as server:
+            return await socket_wrapper(server).exec_out(SERIAL, "screencap -p")
+
+    assert run(scenario()) == frame
+
+def test_sync_recv():
+    async def scenario():
+        files = {"/sdcard/ui.json": b'{"elements": []}'}
+        async with FakeADBServer(SERIAL, files=files) as server:
+            client = ADBServerClient("127.0.0.1", server.port)
+            return await client.pull(SERIAL, "/sdcard/ui.json"), server.requests
+
+    content, requests = run(scenario())
+    assert content == b'{"elements": []}'
+    assert requests[-2:] == ["sync:", "RECV /sdcard/ui.json"]
+
+def test_sync_recv_fail():
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            client = ADBServerClient("127.0.0.1", server.port)
+            with pytest.raises(ADBProtocolError, match="No such file"):
+                await client.pull(SERIAL, "/sdcard/missing.json")
+
+    run(scenario())
+
+def test_fail_reply_is_reported():
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            with pytest.raises(RuntimeError, match="device 'other' not found"):
+                await socket_wrapper(server).exec_out("other", "true")
+
+    run(scenario())
+
+def test_unreachable_server_falls_back_in_auto_mode():
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            port = server.port
+        wrapper = ADBWrapper(adb_path="/nonexistent/adb", transport="auto", server_port=port)
+        # The server is gone, so the subprocess fallback (and its missing binary) is used
+        with pytest.raises(FileNotFoundError):
+            await wrapper.shell(SERIAL, "input tap 1 1")
+        with pytest.raises(ADBServerUnavailable):
+            await ADBServerClient("127.0.0.1", port).host_request("host:version")
+
+    run(scenario())
+
+def test_dropped_service_is_not_retried(tmp_path):
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            server.drop_after = "sync:"
+            wrapper = socket_wrapper(server, transport="auto")
+            # The connection drops after the service was opened: raised, not re-run with the adb binary
+            with pytest.raises(asyncio.IncompleteReadError):
+                await wrapper.pull_file(SERIAL, "/sdcard/ui.json", str(tmp_path / "ui.json"))
+            return [request for request in server.requests if request == "sync:"]
+
+    assert run(scenario()) == ["sync:"]
+
+def test_dropped_legacy_shell_runs_once():
+    async def scenario():
+        async with FakeADBServer(SERIAL, features="cmd") as server:
+            server.drop_after = "shell:"
+            await socket_wrapper(server, transport="auto").shell(SERIAL, "input tap 1 1")
+            return [request for request in server.requests if request.startswith("shell:")]
+
+    assert run(scenario()) == ["shell:input tap 1 1"]
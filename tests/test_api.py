@@ -0,0 +1,86 @@
+"""Tests for the request checks of the task API."""
+
+import asyncio
+import json
+
+from droidrun.server.api import TaskServer
+
+TOKEN = "secret-token"
+
+class FakeDaemon:
+    """Just enough of TaskDaemon to answer requests."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def get_stats(self):
+        return {"tasks": len(self.submitted)}
+
+    async def submit(self, request):
+        self.submitted.append(request)
+        return {"id": "1", "serial": "emulator-5554", "status": "queued"}
+
+def send(raw: bytes, token=TOKEN, daemon=None):
+    """Send a raw request to a TaskServer and return (status, JSON body)."""
+    async def scenario():
+        server = await TaskServer(daemon or FakeDaemon(), token=token).start(host="127.0.0.1", port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(raw)
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+        finally:
+            server.close()
+            await server.wait_closed()
+        head, _, body = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(body)
+
+    return asyncio.run(scenario())
+
+def request(method="GET", path="/health", headers=None, body=b""):
+    headers = {"Host": "127.0.0.1:7770", "Authorization": f"Bearer {TOKEN}", **(headers or {})}
+    if body:
+        headers.setdefault("Content-Type", "application/json")
+        headers.setdefault("Content-Length", str(len(body)))
+    lines = [f"{method} {path} HTTP/1.1"] + [f"{name}: {value}" for name, value in headers.items() if value is not None]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+def test_health_with_token():
+    status, data = send(request())
+    assert status == 200
+    assert data["status"] == "ok"
+
+def test_missing_or_wrong_token_is_rejected():
+    assert send(request(headers={"Authorization": None}))[0] == 401
+    assert send(request(headers={"Authorization": "Bearer wrong"}))[0] == 401
+    assert send(request(headers={"Authorization": "Basic " + TOKEN}))[0] == 401
+    assert send(request(headers={"Authorization": "Bearer tökén"}))[0] == 401
+
+def test_browser_requests_are_rejected():
+    assert send(request(headers={"Origin": "http://example.com"}))[0] == 403
+    assert send(request(headers={"Host": "evil.example.com"}))[0] == 403
+    assert send(request(headers={"Host": "localhost:7770"}))[0] == 200
+
+def test_post_requires_json_content_type():
+    daemon = FakeDaemon()
+    body = json.dumps({"task": "open settings"}).encode()
+    assert send(request("POST", "/tasks", {"Content-Type": "text/plain"}, body), daemon=daemon)[0] == 415
+    status, data = send(request("POST", "/tasks", {"Content-Type": "application/json; charset=utf-8"}, body), daemon=daemon)
+    assert status == 202
+    assert daemon.submitted == [{"task": "open settings"}]
+
+def test_invalid_content_length_is_a_bad_request():
+    body = b'{"task": "x"}'
+    for length in ("abc", "-5", "1e3"):
+        status, data = send(request("POST", "/tasks", {"Content-Length": length}, body))
+        assert status == 400, length
+        assert "Content-Length" in data["error"]
+    assert send(request("POST", "/tasks", {"Content-Length": str(2 << 20)}, body))[0] == 413
+
+def test_base_url_needs_a_token():
+    body = json.dumps({"task": "x", "base_url": "http://localhost:8000"}).encode()
+    status, data = send(request("POST", "/tasks", {"Authorization": None}, body), token=None)
+    assert status == 400
+    assert "base_url" in data["error"]
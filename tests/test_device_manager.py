@@ -0,0 +1,45 @@
+"""Tests for the device registry and its cached device list."""
+
+import asyncio
+
+from droidrun.adb.manager import DeviceManager
+
+class FakeADB:
+    """Answers get_devices from a list that tests change."""
+
+    def __init__(self, serials):
+        self.serials = list(serials)
+        self.listings = 0
+        self.closed = []
+
+    async def get_devices(self):
+        self.listings += 1
+        return [{"serial": serial, "status": "device"} for serial in self.serials]
+
+    async def close_sessions(self, serial=None):
+        self.closed.append(serial)
+
+def test_known_device_is_cached_while_list_is_fresh():
+    adb = FakeADB(["emulator-5554"])
+    manager = DeviceManager(adb=adb, device_list_ttl=60)
+
+    async def scenario():
+        first = await manager.get_device("emulator-5554")
+        second = await manager.get_device("emulator-5554")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert adb.listings == 1
+
+def test_unplugged_device_is_dropped_after_ttl():
+    adb = FakeADB(["emulator-5554"])
+    manager = DeviceManager(adb=adb, device_list_ttl=0)
+
+    async def scenario():
+        assert await manager.get_device("emulator-5554") is not None
+        adb.serials = []
+        return await manager.get_device("emulator-5554")
+
+    assert asyncio.run(scenario()) is None
+    assert adb.closed == ["emulator-5554"]
@@ -0,0 +1,41 @@
+"""Tests for the per-device element store and stale index detection."""
+
+import asyncio
+
+from droidrun.tools.actions import tap_by_index
+from droidrun.tools.element_store import ElementStore, get_element_store
+
+ELEMENTS = [
+    {"index": 0, "text": "List"},
+    {"index": 1, "parentIndex": 0, "text": "Inbox", "bounds": "0,0,100,50"},
+    {"index": 2, "parentIndex": 0, "text": "Sent", "bounds": "0,50,100,100"},
+]
+
+def test_lookups():
+    store = ElementStore("emulator-5554")
+    store.update(ELEMENTS)
+    assert store.get(2)["text"] == "Sent"
+    assert store.parent(1)["text"] == "List"
+    assert [element["index"] for element in store.children(0)] == [1, 2]
+    assert [element["index"] for element in store.siblings(1)] == [2]
+    assert store.indices() == [0, 1, 2]
+    assert len(store) == 3
+
+def test_generation_detects_older_screens():
+    store = ElementStore("emulator-5554")
+    first = store.update(ELEMENTS)
+    second = store.update(ELEMENTS[:1])
+    assert second == first + 1
+    assert store.is_stale(first)
+    assert not store.is_stale(second)
+    assert not store.is_stale(None)
+    store.clear()
+    assert len(store) == 0 and store.generation == second + 1
+
+def test_tap_with_stale_generation_is_refused():
+    store = get_element_store("stale-test")
+    generation = store.update(ELEMENTS)
+    store.update(ELEMENTS)
+    # Refused before any device is looked up
+    result = asyncio.run(tap_by_index(1, serial="stale-test", generation=generation))
+    assert result.startswith("Error: Index 1 refers to screen generation")
@@ -0,0 +1,76 @@
+"""Tests for the token-counted prompt history."""
+
+from droidrun.agent.history import HistoryBuffer
+from droidrun.agent.tokens import HeuristicCounter
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+def test_append_renders_and_counts_once():
+    calls = []
+
+    def counter(text: str) -> int:
+        calls.append(text)
+        return count_words(text)
+
+    history = HistoryBuffer(counter)
+    history.append("thought", "open the app")
+    history.append("action", "start_app(package=com.example)")
+    assert history.render() == "THOUGHT: open the app\nACTION: start_app(package=com.example)\n"
+    assert history.total_tokens == 4 + 2
+    history.render()
+    assert len(calls) == 2
+
+def test_trim_evicts_oldest_steps():
+    history = HistoryBuffer(count_words)
+    for number in range(5):
+        history.append("observation", f"screen {number}")
+    # Three tokens per step
+    assert history.trim(6) == 3
+    assert history.texts() == ["OBSERVATION: screen 3\n", "OBSERVATION: screen 4\n"]
+    assert history.total_tokens == 6
+    assert history.evicted == 3
+
+def test_old_observations_are_compacted():
+    history = HistoryBuffer(count_words, keep_full=1)
+    first = history.append("observation", "a long list of many elements", lambda entry: "digest")
+    history.append("observation", "another long list of elements", lambda entry: "digest")
+    assert first.compacted
+    assert history.texts()[0] == "OBSERVATION: digest\n"
+    assert history.total_tokens == count_words("OBSERVATION: digest") + count_words(
+        "OBSERVATION: another long list of elements"
+    )
+    assert history.compacted == 1
+
+def test_replace_after_eviction_is_ignored():
+    history = HistoryBuffer(count_words)
+    entry = history.append("observation", "old screen")
+    history.append("observation", "new screen")
+    history.trim(3)
+    history.replace(entry, "summary")
+    assert history.render() == "OBSERVATION: new screen\n"
+
+def test_recount_after_calibration():
+    counter = HeuristicCounter()
+    history = HistoryBuffer(counter.count)
+    for number in range(20):
+        history.append("observation", f"screen {number} with a list of elements")
+    history.recount(counter.revision)
+    before = history.total_tokens
+    counter.calibrate(before, before * 2)
+    assert counter.revision == 1
+    history.recount(counter.revision)
+    assert history.total_tokens > before
+    assert history.total_tokens == sum(counter.count(text) for text in history.texts())
+
+def test_attached_steps_are_compacted_with_their_entry():
+    history = HistoryBuffer(count_words, keep_full=1)
+    screen = history.append("observation", "full screen one", lambda entry: "screen digest")
+    diff = history.append("observation", "diff of screen one", lambda entry: "diff digest", attach_to=screen)
+    # The diff extends the current screen, which stays in full
+    assert not screen.compacted and not diff.compacted
+    history.append("observation", "full screen two", lambda entry: "screen digest")
+    assert screen.compacted and diff.compacted
+    assert history.texts()[:2] == ["OBSERVATION: screen digest\n", "OBSERVATION: diff digest\n"]
+    late = history.append("observation", "late diff", lambda entry: "diff digest", attach_to=screen)
+    assert late.compacted
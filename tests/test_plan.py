@@ -0,0 +1,44 @@
+"""Tests for multi-action plans."""
+
+from droidrun.agent.plan import check_element, needs_guard, parse_plan
+
+RESULT = {
+    "action": "tap",
+    "parameters": {"index": 1},
+    "actions": [
+        {"action": "tap", "parameters": {"index": 1}},
+        {"action": "input_text", "parameters": {"text": "hello"}},
+        {"action": "get_clickables"},
+        {"action": "tap", "parameters": {"index": 2}},
+    ],
+}
+
+def test_single_action_by_default():
+    assert parse_plan(RESULT) == [{"action": "tap", "parameters": {"index": 1}}]
+
+def test_plan_ends_at_first_observation():
+    plan = parse_plan(RESULT, max_actions=5)
+    assert [item["action"] for item in plan] == ["tap", "input_text", "get_clickables"]
+    assert plan[2]["parameters"] == {}
+
+def test_plan_is_capped():
+    assert [item["action"] for item in parse_plan(RESULT, max_actions=2)] == ["tap", "input_text"]
+
+def test_malformed_actions_fall_back_to_the_single_action():
+    result = {"action": "swipe", "parameters": {"end_y": 100}, "actions": [{"parameters": {}}, "tap"]}
+    assert parse_plan(result, max_actions=3) == [{"action": "swipe", "parameters": {"end_y": 100}}]
+    assert parse_plan({"action": "complete", "actions": "tap"}, max_actions=3) == [
+        {"action": "complete", "parameters": {}}
+    ]
+
+def test_needs_guard():
+    assert needs_guard("tap", {"index": 3})
+    assert not needs_guard("tap", {"x": 1, "y": 2})
+    assert not needs_guard("input_text", {"index": 3})
+
+def test_check_element():
+    planned = {"className": "EditText", "resourceId": "name", "bounds": "0,0,10,10", "text": ""}
+    assert check_element(1, None, None) is None
+    assert check_element(1, planned, dict(planned, text="typed")) is None
+    assert "no longer on the screen" in check_element(1, planned, None)
+    assert "bounds" in check_element(1, planned, dict(planned, bounds="0,20,10,30"))
@@ -0,0 +1,80 @@
+"""Tests for the speculative UI capture."""
+
+import asyncio
+
+from droidrun.agent.prefetch import UIPrefetcher
+
+def make_prefetcher(signatures, committed=None, fetch_delay=0.0):
+    """Prefetcher over a fake screen whose signature is popped per read."""
+    calls = []
+
+    async def signature():
+        return signatures.pop(0) if len(signatures) > 1 else signatures[0]
+
+    async def fetch():
+        calls.append("fetch")
+        await asyncio.sleep(fetch_delay)
+        calls.append("done")
+        return {"elements": ["button"]}
+
+    committers = None
+    if committed is not None:
+        committers = {"get_clickables": lambda result: committed.append(result) or result}
+    return UIPrefetcher({"get_clickables": fetch}, signature, committers), calls
+
+def test_hit_is_committed_only_when_taken():
+    committed = []
+
+    async def scenario():
+        prefetcher, calls = make_prefetcher(["a"], committed)
+        prefetcher.schedule()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert calls == ["fetch", "done"]
+        assert committed == []
+        result = await prefetcher.take("get_clickables")
+        return prefetcher, result
+
+    prefetcher, result = asyncio.run(scenario())
+    assert result == {"elements": ["button"]}
+    assert committed == [result]
+    assert prefetcher.stats["hits"] == 1
+
+def test_changed_screen_is_a_miss_and_not_committed():
+    committed = []
+
+    async def scenario():
+        prefetcher, _ = make_prefetcher(["a", "a", "b"], committed)
+        prefetcher.schedule()
+        return prefetcher, await prefetcher.take("get_clickables")
+
+    prefetcher, result = asyncio.run(scenario())
+    assert result is None
+    assert committed == []
+    assert prefetcher.stats["misses"] == 1
+
+def test_screen_changing_during_capture_is_a_miss():
+    async def scenario():
+        prefetcher, _ = make_prefetcher(["a", "b"])
+        prefetcher.schedule()
+        return prefetcher, await prefetcher.take("get_clickables")
+
+    prefetcher, result = asyncio.run(scenario())
+    assert result is None
+    assert prefetcher.stats["misses"] == 1
+
+def test_cancel_stops_a_capture_in_progress():
+    committed = []
+
+    async def scenario():
+        prefetcher, calls = make_prefetcher(["a"], committed, fetch_delay=0.05)
+        prefetcher.schedule()
+        await asyncio.sleep(0)
+        await prefetcher.cancel()
+        await asyncio.sleep(0.1)
+        return prefetcher, calls
+
+    prefetcher, calls = asyncio.run(scenario())
+    assert calls == ["fetch"]
+    assert committed == []
+    assert asyncio.run(prefetcher.take("get_clickables")) is None
@@ -0,0 +1,140 @@
+"""Tests for ReActAgent tool dispatch with fake tools and a fake reasoner."""
+
+import asyncio
+from types import SimpleNamespace
+
+from droidrun.agent.react_agent import ReActAgent
+
+class FakeReasoner:
+    """Just enough of LLMReasoner to build an agent."""
+
+    llm_provider = "fake"
+    provider = SimpleNamespace(vision=False, model_name="fake-model")
+    max_actions = 1
+
+    @staticmethod
+    def count_tokens(text: str) -> int:
+        return len(text.split())
+
+def make_agent(**options) -> ReActAgent:
+    return ReActAgent(task="test", llm=FakeReasoner(), device_serial="emulator-5554", print_report=False, **options)
+
+def test_tap_gets_generation_of_observed_screen():
+    agent = make_agent()
+    taps = []
+
+    async def get_clickables(serial=None, wait_for_idle=False):
+        return {
+            "message": "Found 1 tappable elements",
+            "clickable_elements": [{"index": 1, "className": "Button", "text": "OK"}],
+            "tappable_indices": [1],
+            "generation": 7,
+        }
+
+    async def tap(index, serial=None, generation=None):
+        taps.append((index, generation))
+        return f"Tapped element with index {index}"
+
+    agent.tools.update(get_clickables=get_clickables, tap=tap)
+
+    async def scenario():
+        await agent.execute_tool("tap", index=1)
+        await agent.execute_tool("get_clickables")
+        await agent.execute_tool("tap", index=1)
+
+    asyncio.run(scenario())
+    assert taps == [(1, None), (1, 7)]
+
+def test_idle_wait_only_after_an_action():
+    agent = make_agent()
+    calls = []
+
+    async def get_clickables(serial=None, wait_for_idle=False):
+        calls.append(wait_for_idle)
+        return {"message": "", "clickable_elements": [], "tappable_indices": [], "idle": True, "idle_wait_ms": 50.0}
+
+    async def swipe(start_x, start_y, end_x, end_y, serial=None):
+        return "Swiped"
+
+    async def get_clickables_without_idle(serial=None):
+        return {"message": "", "clickable_elements": [], "tappable_indices": []}
+
+    agent.tools.update(get_clickables=get_clickables, swipe=swipe)
+
+    async def scenario():
+        await agent.execute_tool("get_clickables")
+        await agent.execute_tool("get_clickables")
+        await agent.execute_tool("swipe", start_x=0, start_y=0, end_x=0, end_y=100)
+        await agent.execute_tool("get_clickables")
+        # Tools without the parameter are called as before
+        agent.tools["get_clickables"] = get_clickables_without_idle
+        await agent.execute_tool("swipe", start_x=0, start_y=0, end_x=0, end_y=100)
+        return await agent.execute_tool("get_clickables")
+
+    assert not asyncio.run(scenario()).startswith("Error")
+    assert calls == [True, False, True]
+    assert agent.idle_stats == {"waits": 3, "timeouts": 0, "total_ms": 150.0}
+
+def test_cancelled_run_cancels_early_dispatched_action():
+    started = asyncio.Event()
+    swipes = []
+
+    class StreamingReasoner(FakeReasoner):
+        async def reason(self, on_action=None, **kwargs):
+            # The action is known before the rest of the response streams in
+            on_action("swipe", {"start_x": 0, "start_y": 0, "end_x": 0, "end_y": 100})
+            await asyncio.sleep(3600)
+
+    async def swipe(start_x, start_y, end_x, end_y, serial=None):
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            swipes.append("cancelled")
+            raise
+
+    agent = ReActAgent(task="test", llm=StreamingReasoner(), device_serial="emulator-5554", print_report=False)
+    agent.tools["swipe"] = swipe
+
+    async def connect():
+        return True
+
+    agent.connect = connect
+
+    async def scenario():
+        run = asyncio.ensure_future(agent.run())
+        await started.wait()
+        run.cancel()
+        try:
+            await run
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0)
+        # Checked before asyncio.run cancels whatever is left
+        return list(swipes)
+
+    assert asyncio.run(scenario()) == ["cancelled"]
+
+def test_replay_stops_at_action_without_screen(tmp_path):
+    from droidrun.agent.trajectory import TrajectoryStore
+
+    agent = make_agent(trajectory_store=TrajectoryStore(tmp_path / "trajectories.json"))
+    swipes = []
+
+    async def swipe(start_x, start_y, end_x, end_y, serial=None):
+        swipes.append(end_y)
+        return "Swiped"
+
+    agent.tools.update(swipe=swipe)
+    trajectory = {
+        "actions": [
+            {"action": "swipe", "parameters": {"start_x": 0, "start_y": 0, "end_x": 0, "end_y": 100}},
+            {"action": "complete", "parameters": {"result": "done"}},
+        ],
+        "duration_ms": 1000.0,
+    }
+
+    assert not asyncio.run(agent._replay_trajectory(trajectory))
+    assert swipes == []
+    assert agent.replay_stats["replayed"] == 0
+    assert "without looking at the screen" in agent.steps[-1].content
@@ -0,0 +1,41 @@
+"""Tests for matching tasks to device profiles."""
+
+from droidrun.scheduler import matches, version_matches
+
+PROFILE = {
+    "serial": "emulator-5554",
+    "properties": {
+        "ro.product.model": "Pixel 7",
+        "ro.product.brand": "google",
+        "ro.build.version.release": "13.0.1",
+        "ro.build.version.sdk": "33",
+    },
+    "packages": ["com.android.settings", "com.example.app"],
+}
+
+def test_bare_version_matches_as_prefix():
+    assert version_matches("13.0.1", "13")
+    assert version_matches("13.0.1", 13)
+    assert version_matches("13", "13.0") is False
+    assert not version_matches("1", "13")
+    assert not version_matches("130", "13")
+
+def test_version_comparisons():
+    assert version_matches("13.0.1", ">=12")
+    assert version_matches("13.0.1", "< 14")
+    assert version_matches("13", "==13")
+    assert not version_matches("13.0.1", ">13.1")
+    assert version_matches("9", "<10")
+
+def test_invalid_spec_or_missing_version_never_matches():
+    assert not version_matches("13", "latest")
+    assert not version_matches("13", "~=13")
+    assert not version_matches("", ">=1")
+
+def test_requirements_against_profile():
+    assert matches({}, PROFILE)
+    assert matches({"model": "pixel 7", "brand": "Google", "sdk": ">=30"}, PROFILE)
+    assert matches({"serial": ["emulator-5556", "emulator-5554"], "android_version": "13"}, PROFILE)
+    assert not matches({"serial": "emulator-5556"}, PROFILE)
+    assert not matches({"sdk": "<33"}, PROFILE)
+    assert not matches({"packages": ["com.example.missing"]}, PROFILE)
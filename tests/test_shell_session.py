@@ -0,0 +1,73 @@
+"""Tests for the persistent shell session and its one-off shell fallback."""
+
+import asyncio
+import socket
+
+import pytest
+from fake_adb_server import FakeADBServer
+
+from droidrun.adb.shell_session import ShellSession, ShellSessionUnavailable
+from droidrun.adb.wrapper import ADBWrapper
+
+SERIAL = "emulator-5554"
+
+def test_session_that_cannot_open_is_unavailable():
+    async def opener():
+        raise ConnectionRefusedError("refused")
+
+    async def scenario():
+        with pytest.raises(ShellSessionUnavailable):
+            await ShellSession(SERIAL, opener).run("input tap 1 1")
+
+    asyncio.run(scenario())
+
+def test_unavailable_session_falls_back_to_shell():
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            wrapper = ADBWrapper(transport="socket", server_host="127.0.0.1", server_port=server.port)
+
+            async def opener():
+                raise ConnectionRefusedError("refused")
+
+            wrapper._shell_sessions[SERIAL] = ShellSession(SERIAL, opener)
+            await wrapper.session_shell(SERIAL, "input tap 1 1")
+            return server.requests
+
+    assert "shell,v2,raw:input tap 1 1" in asyncio.run(scenario())
+
+def test_session_dropped_after_write_is_not_retried():
+    async def scenario():
+        async with FakeADBServer(SERIAL) as server:
+            wrapper = ADBWrapper(transport="socket", server_host="127.0.0.1", server_port=server.port)
+            with pytest.raises(ConnectionError) as error:
+                await wrapper.session_shell(SERIAL, "input tap 1 1")
+            return error.value, server.requests
+
+    error, requests = asyncio.run(scenario())
+    assert not isinstance(error, ShellSessionUnavailable)
+    assert [request for request in requests if "input tap" in request] == ["sh: { input tap 1 1"]
+
+def test_session_of_finished_loop_is_closed_when_replaced():
+    device_end, local_end = socket.socketpair()
+    device_end.settimeout(2)
+    wrapper = ADBWrapper(transport="socket")
+
+    async def opener():
+        reader, writer = await asyncio.open_connection(sock=local_end)
+        return reader, writer, None
+
+    async def open_session():
+        session = ShellSession(SERIAL, opener)
+        await session._ensure_open()
+        wrapper._shell_sessions[SERIAL] = session
+        return session
+
+    async def replace_session():
+        return wrapper.get_shell_session(SERIAL)
+
+    old = asyncio.run(open_session())
+    new = asyncio.run(replace_session())
+    assert new is not old
+    # The device side sees the old connection go away
+    assert device_end.recv(1) == b""
+    device_end.close()
@@ -0,0 +1,42 @@
+"""Tests for the incremental parser of streamed JSON responses."""
+
+import json
+
+from droidrun.agent.stream_parser import ActionStreamParser
+
+RESPONSE = json.dumps({
+    "action": "tap",
+    "parameters": {"index": 12, "label": "say \"hi\" {not a brace}"},
+    "thought": "Tap the button, then check the screen",
+    "confidence": 0.9,
+})
+
+def test_action_is_complete_before_the_object_ends():
+    parser = ActionStreamParser()
+    prefix = RESPONSE[:RESPONSE.index('"thought"')]
+    fields = parser.feed(prefix)
+    assert fields["action"] == "tap"
+    assert fields["parameters"] == {"index": 12, "label": "say \"hi\" {not a brace}"}
+    assert "thought" not in fields
+    assert not parser.done
+
+def test_partial_action_is_not_reported():
+    parser = ActionStreamParser()
+    parser.feed('{"action": "ta')
+    assert not parser.has("action")
+    parser.feed('p", "parameters": {"index": 1')
+    assert parser.fields == {"action": "tap"}
+    parser.feed("}")
+    assert parser.has("action", "parameters")
+
+def test_one_character_at_a_time_matches_json_loads():
+    parser = ActionStreamParser()
+    for char in "```json\n" + RESPONSE + "\n```":
+        parser.feed(char)
+    assert parser.done
+    assert parser.fields == json.loads(RESPONSE)
+
+def test_malformed_value_is_left_out():
+    parser = ActionStreamParser()
+    fields = parser.feed('{"action": "swipe", "parameters": {"x": 1,}, "thought": "t"}')
+    assert fields == {"action": "swipe", "thought": "t"}
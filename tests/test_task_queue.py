@@ -0,0 +1,103 @@
+"""Tests for the persistent task queue."""
+
+import os
+import json
+import multiprocessing
+
+from droidrun.scheduler.task_queue import DONE, PENDING, RUNNING, TaskQueue
+
+def anything(task):
+    return True
+
+def test_two_queues_on_one_file_never_claim_the_same_task(tmp_path):
+    path = tmp_path / "queue.json"
+    first = TaskQueue(path)
+    second = TaskQueue(path)
+    task = first.submit("open settings")
+
+    # Both loaded the task as pending; only one may run it
+    claims = [second.claim("emulator-5556", anything), first.claim("emulator-5554", anything)]
+    assert [claim is not None for claim in claims] == [True, False]
+    claimed = TaskQueue(path).tasks[task["id"]]
+    assert claimed["status"] == RUNNING
+    assert claimed["attempts"] == 1
+
+def _claim_all(path, serial, results):
+    queue = TaskQueue(path)
+    claimed = []
+    while True:
+        task = queue.claim(serial, anything)
+        if task is None:
+            break
+        claimed.append(task["id"])
+    results.put(claimed)
+
+def test_concurrent_schedulers_claim_each_task_once(tmp_path):
+    path = tmp_path / "queue.json"
+    queue = TaskQueue(path)
+    ids = [queue.submit(f"task {number}")["id"] for number in range(20)]
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=_claim_all, args=(path, f"emulator-{5554 + 2 * n}", results))
+        for n in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    claimed = [task_id for _ in workers for task_id in results.get(timeout=30)]
+    for worker in workers:
+        worker.join()
+
+    assert sorted(claimed) == sorted(ids)
+
+def test_claim_skips_a_task_claimed_since_loading(tmp_path):
+    path = tmp_path / "queue.json"
+    first = TaskQueue(path)
+    task = first.submit("open settings")
+    second = TaskQueue(path)
+    assert second.pending()[0]["id"] == task["id"]
+
+    assert first.claim("emulator-5554", anything)["id"] == task["id"]
+    assert second.claim("emulator-5556", anything) is None
+    assert TaskQueue(path).tasks[task["id"]]["device"] == "emulator-5554"
+
+def test_changes_from_other_processes_are_kept(tmp_path):
+    path = tmp_path / "queue.json"
+    scheduler = TaskQueue(path)
+    running = scheduler.submit("first")
+    scheduler.claim("emulator-5554", anything)
+    added = TaskQueue(path).submit("second")
+
+    scheduler.finish(running["id"], True, result="done")
+    tasks = TaskQueue(path).tasks
+    assert tasks[running["id"]]["status"] == DONE
+    assert tasks[added["id"]]["status"] == PENDING
+
+def test_requeue_avoids_the_device(tmp_path):
+    queue = TaskQueue(tmp_path / "queue.json")
+    task = queue.submit("open settings")
+    queue.claim("emulator-5554", anything)
+    queue.requeue(task["id"], avoid="emulator-5554")
+    assert queue.claim("emulator-5554", anything) is None
+    assert queue.claim("emulator-5556", anything)["id"] == task["id"]
+
+def test_recover_stale_requeues_only_dead_owners(tmp_path):
+    path = tmp_path / "queue.json"
+    queue = TaskQueue(path)
+    mine = queue.submit("mine")
+    queue.claim("emulator-5554", anything)
+    orphan = queue.submit("orphan")
+    queue.claim("emulator-5556", anything)
+    # Simulate a scheduler process that has exited
+    data = json.loads(path.read_text(encoding="utf-8"))
+    for task in data["tasks"]:
+        if task["id"] == orphan["id"]:
+            task["owner"] = 2 ** 22 + 1
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+    assert TaskQueue(path).recover_stale() == 1
+    tasks = TaskQueue(path).tasks
+    assert tasks[mine["id"]]["status"] == RUNNING
+    assert tasks[mine["id"]]["owner"] == os.getpid()
+    assert tasks[orphan["id"]]["status"] == PENDING
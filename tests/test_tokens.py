@@ -0,0 +1,38 @@
+"""Tests for the per-provider token counters."""
+
+import pytest
+
+from droidrun.agent import tokens
+from droidrun.agent.tokens import HeuristicCounter, get_token_counter
+
+def test_cjk_text_counts_more_per_character():
+    counter = HeuristicCounter()
+    assert counter.count("设置显示深色模式") > counter.count("settings")
+    assert counter.count("") == 0
+
+def test_calibration_is_bounded_and_clears_the_cache():
+    counter = HeuristicCounter()
+    text = "Tap the settings button " * 10
+    estimate = counter.count(text)
+    for _ in range(50):
+        counter.calibrate(100, 1000)
+    assert counter.scale == pytest.approx(2.0, abs=0.05)
+    assert counter.count(text) > estimate
+    counter.calibrate(0, 100)
+    assert counter.scale == pytest.approx(2.0, abs=0.05)
+
+def test_small_calibration_keeps_revision():
+    counter = HeuristicCounter()
+    counter.calibrate(1000, 1001)
+    assert counter.revision == 0
+
+def test_counters_are_shared_per_provider_and_model():
+    assert get_token_counter("anthropic", "m") is get_token_counter("anthropic", "m")
+    assert get_token_counter("unknown-provider").name == "heuristic"
+
+def test_tiktoken_download_needs_opt_in(monkeypatch, tmp_path):
+    monkeypatch.delenv("DROIDRUN_TIKTOKEN_DOWNLOAD", raising=False)
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    assert not tokens._tiktoken_cached("cl100k_base")
+    monkeypatch.setenv("DROIDRUN_TIKTOKEN_DOWNLOAD", "1")
+    assert tokens._tiktoken_cached("cl100k_base")
@@ -0,0 +1,62 @@
+"""Tests for the trajectory store."""
+
+import asyncio
+
+from droidrun.agent.trajectory import TrajectoryStore, normalize_goal, trajectory_key
+
+ACTIONS = [
+    {"action": "start_app", "parameters": {"package": "com.android.settings"}, "screen": "home"},
+    {"action": "tap", "parameters": {"index": 3}, "screen": "settings"},
+]
+
+def versions(**installed):
+    async def get_version(package):
+        return installed.get(package, "")
+    return get_version
+
+def test_goals_are_normalized():
+    assert normalize_goal("  Check  the VERSION! ") == "check the version"
+    assert normalize_goal("检查系统版本。") == normalize_goal("检查系统版本")
+    assert normalize_goal("ＡＢＣ") == "abc"
+    assert trajectory_key("Open settings.", "Pixel 7") == "Pixel 7|open settings"
+
+def test_lookup_matches_app_versions(tmp_path):
+    path = tmp_path / "trajectories.json"
+    store = TrajectoryStore(path)
+    get_version = versions(**{"com.android.settings": "14 (34)"})
+    asyncio.run(store.record("Open settings", "Pixel 7", ACTIONS, 2000.0, get_version))
+
+    # A new store reads the recorded trajectory back
+    store = TrajectoryStore(path)
+    found = asyncio.run(store.lookup("open settings.", "Pixel 7", get_version))
+    assert found["actions"] == ACTIONS
+    assert found["app_versions"] == {"com.android.settings": "14 (34)"}
+    assert asyncio.run(store.lookup("open settings", "Pixel 8", get_version)) is None
+    updated = versions(**{"com.android.settings": "15 (35)"})
+    assert asyncio.run(store.lookup("open settings", "Pixel 7", updated)) is None
+    assert store.get_stats()["hit_rate"] == 1 / 3
+
+def test_lookup_does_not_write(tmp_path):
+    path = tmp_path / "trajectories.json"
+    store = TrajectoryStore(path)
+    asyncio.run(store.lookup("open settings", "Pixel 7", versions()))
+    assert not path.exists()
+
+    asyncio.run(store.record("open settings", "Pixel 7", ACTIONS, 2000.0, versions()))
+    written = path.read_text(encoding="utf-8")
+    asyncio.run(store.lookup("open settings", "Pixel 7", versions()))
+    assert path.read_text(encoding="utf-8") == written
+    # The lookups are saved with the next write, without leftover temporary files
+    store.record_replay(True, 500.0)
+    assert TrajectoryStore(path).stats["lookups"] == 2
+    assert [p.name for p in tmp_path.iterdir()] == ["trajectories.json"]
+
+def test_recording_replaces_same_versions_only(tmp_path):
+    store = TrajectoryStore(tmp_path / "trajectories.json")
+    old = versions(**{"com.android.settings": "14"})
+    new = versions(**{"com.android.settings": "15"})
+    asyncio.run(store.record("open settings", "Pixel 7", ACTIONS, 2000.0, old))
+    asyncio.run(store.record("open settings", "Pixel 7", ACTIONS, 1500.0, old))
+    asyncio.run(store.record("open settings", "Pixel 7", ACTIONS, 1800.0, new))
+    stored = store.trajectories[trajectory_key("open settings", "Pixel 7")]
+    assert [t["duration_ms"] for t in stored] == [1500.0, 1800.0]
@@ -0,0 +1,64 @@
+"""Tests for UI snapshot diffs."""
+
+from droidrun.agent.compaction import diff_digest
+from droidrun.tools.ui_diff import diff_screens, diff_size, encode_diff
+
+def element(index, text, bounds, class_name="android.widget.TextView", **extra):
+    return {"index": index, "text": text, "bounds": bounds, "className": class_name, **extra}
+
+SCREEN = [
+    element(0, "Inbox", "0,0,100,50"),
+    element(1, "Compose", "0,60,100,110", "android.widget.Button", type="clickable"),
+    element(2, "Unread: 3", "0,120,100,170"),
+]
+
+def test_identical_screens_have_no_changes():
+    diff = diff_screens(SCREEN, [dict(e) for e in SCREEN])
+    assert diff_size(diff) == 0
+    assert diff["unchanged"] == 3
+    assert diff["same_family"]
+    assert diff["screen_hash"] == diff["previous_hash"]
+
+def test_unchanged_nodes_keep_their_index():
+    new = [
+        element(0, "Inbox", "0,0,100,50"),
+        element(1, "Compose", "0,60,100,110", "android.widget.Button", type="clickable"),
+        element(2, "Unread: 4", "0,120,100,170"),
+        element(3, "New mail", "0,180,100,230"),
+    ]
+    diff = diff_screens(SCREEN, new)
+    assert diff["unchanged"] == 2
+    assert [change["after"]["text"] for change in diff["changed"]] == ["Unread: 4"]
+    assert diff["changed"][0]["before"]["index"] == diff["changed"][0]["after"]["index"] == 2
+    assert [e["index"] for e in diff["added"]] == [3]
+    assert diff["removed"] == []
+
+def test_shifted_index_is_reported_as_changed():
+    new = [element(0, "Banner", "0,300,100,350")] + [
+        dict(e, index=e["index"] + 1) for e in SCREEN
+    ]
+    diff = diff_screens(SCREEN, new)
+    # The model's indices would be stale, so every shifted node is reported
+    assert diff["unchanged"] == 0
+    assert len(diff["changed"]) == 3
+    assert [e["text"] for e in diff["added"]] == ["Banner"]
+
+def test_removed_and_moved_nodes():
+    new = [
+        element(0, "Inbox", "0,0,100,50"),
+        element(1, "Compose", "0,200,100,250", "android.widget.Button", type="clickable"),
+    ]
+    diff = diff_screens(SCREEN, new)
+    assert [change["after"]["bounds"] for change in diff["changed"]] == ["0,200,100,250"]
+    assert [e["text"] for e in diff["removed"]] == ["Unread: 3"]
+
+def test_encode_diff_and_digest():
+    new = SCREEN[:2] + [element(2, "Unread: 4", "0,120,100,170")]
+    diff = diff_screens(SCREEN, new)
+    text = encode_diff(diff, tappable_indices=[1])
+    lines = text.splitlines()
+    assert lines[0].startswith(f"Screen {diff['screen_hash']} changed from {diff['previous_hash']} ")
+    assert lines[0].endswith("+0 -0 ~1")
+    assert lines[1] == '~ 2 TextView "Unread: 3" -> 2 TextView "Unread: 4"'
+    assert diff_digest("Result:\n" + text) == f"[update to screen {diff['screen_hash']}: +0 -0 ~1]"
+    assert diff_digest("no diff here") == "[screen update]"
@@ -0,0 +1,48 @@
+"""Tests for the compact outline encoding of UI elements."""
+
+from droidrun.tools.ui_encoder import LEGEND, bounds_center, encode_elements, short_class_name
+
+def rows(texts):
+    elements = [{"index": 0, "className": "android.widget.ListView"}]
+    for number, text in enumerate(texts, start=1):
+        elements.append({
+            "index": number,
+            "parentIndex": 0,
+            "className": "android.widget.Button",
+            "text": text,
+            "bounds": f"0,{number * 100},200,{number * 100 + 80}",
+        })
+    return elements
+
+def test_outline_lines():
+    encoded = encode_elements(rows(["Inbox"]), tappable_indices=[1])
+    assert encoded.splitlines() == [LEGEND, '1* Button "Inbox" @100,140']
+
+def test_tappable_siblings_keep_shared_text():
+    encoded = encode_elements(rows(["Delete", "Delete", "Delete"]), tappable_indices=[1, 2, 3])
+    assert encoded.splitlines()[1:] == [
+        '1* Button "Delete" @100,140',
+        '2* Button "Delete" @100,240',
+        '3* Button "Delete" @100,340',
+    ]
+
+def test_repeated_text_is_dropped_from_untappable_elements():
+    elements = [
+        {"index": 0, "className": "android.widget.LinearLayout", "text": "Wi-Fi", "bounds": "0,0,100,100"},
+        {"index": 1, "parentIndex": 0, "className": "android.widget.TextView", "text": "Wi-Fi"},
+        {"index": 2, "parentIndex": 0, "className": "android.widget.TextView", "text": "Connected"},
+    ]
+    encoded = encode_elements(elements, tappable_indices=[0])
+    assert encoded.splitlines()[1:] == ['0* LinearLayout "Wi-Fi" @50,50', '  2 TextView "Connected"']
+
+def test_indices_are_kept_whatever_the_order():
+    elements = list(reversed(rows(["A", "B"])))
+    encoded = encode_elements(elements, tappable_indices=[1, 2])
+    # Index numbers are the Portal indices, never renumbered
+    assert [line.split()[0] for line in encoded.splitlines()[1:]] == ["2*", "1*"]
+
+def test_helpers():
+    assert short_class_name("android.widget.Button") == "Button"
+    assert short_class_name(None) == "View"
+    assert bounds_center("0,0,100,50") == "50,25"
+    assert bounds_center("bad") is None
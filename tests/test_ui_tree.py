@@ -0,0 +1,66 @@
+"""Tests for flattening the Portal element tree."""
+
+from droidrun.tools.ui_tree import flatten_ui_tree
+
+TREE = [
+    {
+        "index": 0, "type": "clickable", "className": "android.widget.LinearLayout",
+        "bounds": "0,0,100,100",
+        "children": [
+            {"index": 1, "type": "text", "text": "Wi-Fi", "className": "android.widget.TextView"},
+            {
+                "index": -1, "className": "android.widget.FrameLayout",
+                "children": [
+                    {"index": 2, "type": "clickable", "className": "android.widget.Switch", "bounds": "80,0,100,20"},
+                ],
+            },
+        ],
+    },
+    # Roots that cannot be tapped are left out; their children are kept
+    {
+        "index": 3, "type": "text", "className": "android.widget.TextView", "text": "Network",
+        "children": [{"index": 4, "type": "text", "text": "Connected", "className": "android.widget.TextView"}],
+    },
+]
+
+def test_flatten_keeps_parents_and_drops_children_field():
+    tree = flatten_ui_tree(TREE)
+    assert [element["index"] for element in tree["elements"]] == [0, 1, 2, 4]
+    assert all("children" not in element for element in tree["elements"])
+    assert tree["by_index"][0]["isParent"]
+    assert tree["by_index"][1]["parentIndex"] == 0
+
+def test_skipped_nodes_do_not_break_the_parent_chain():
+    tree = flatten_ui_tree(TREE)
+    # The switch sits in a container without an index
+    assert tree["by_index"][2]["parentIndex"] == 0
+    assert "grandparentIndex" not in tree["by_index"][2]
+    # Children of a dropped root still point to it
+    assert tree["by_index"][4]["parentIndex"] == 3
+
+def test_tappable_indices_and_text_summary():
+    tree = flatten_ui_tree(TREE)
+    assert tree["tappable_indices"] == [0, 2]
+    assert tree["text_summary"] == ["🔘 Element 0 (android.widget.LinearLayout): Wi-Fi"]
+
+def test_deep_trees_are_flattened_without_recursion():
+    node = {"index": 0, "type": "clickable", "bounds": "0,0,1,1"}
+    root = node
+    for index in range(1, 5000):
+        child = {"index": index, "type": "text", "text": f"t{index}"}
+        node["children"] = [child]
+        node = child
+    tree = flatten_ui_tree([root])
+    assert len(tree["elements"]) == 5000
+    assert tree["by_index"][4999]["parentIndex"] == 4998
+    assert tree["by_index"][4999]["grandparentIndex"] == 4997
+
+def test_old_format():
+    tree = flatten_ui_tree({"clickable_elements": [
+        {"index": 5, "type": "clickable", "bounds": "0,0,1,1", "isClickable": True},
+        {"index": 6, "type": "text", "text": "OK", "parentIndex": 5},
+        {"index": -1, "text": "ignored"},
+    ]})
+    assert [element["index"] for element in tree["elements"]] == [5, 6]
+    assert "isClickable" not in tree["by_index"][5]
+    assert tree["tappable_indices"] == [5]